@@ -3,13 +3,14 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from .models import CustomUser, Department , Profile, Site
 from .forms import CustomUserCreationForm, CustomUserChangeForm
+from rh.recherche import RechercheEmployesAdminMixin
 
 @admin.register(Department)
 class DepartmentAdmin(ModelAdmin):
     list_display = ('name', 'code')
     list_per_page = 20
 
-class CustomUserAdmin(UserAdmin, ModelAdmin):
+class CustomUserAdmin(RechercheEmployesAdminMixin, UserAdmin, ModelAdmin):
     add_form = CustomUserCreationForm
     form = CustomUserChangeForm
     model = CustomUser
@@ -36,8 +37,10 @@ admin.site.register(CustomUser, CustomUserAdmin)
 # =============================================================================
 # Ajoute du profil
 # =============================================================================
-class ProfileAdmin(ModelAdmin):
+class ProfileAdmin(RechercheEmployesAdminMixin, ModelAdmin):
     list_display = ('user', 'full_name', 'date_of_birth', 'gender', 'nationality', 'marital_status', 'photo', 'address', 'phone_number', 'secondary_phone')
+    search_fields = ('full_name', 'phone_number', 'id_number')
+    champ_utilisateur_recherche = 'user_id'
     list_per_page = 20
 
 admin.site.register(Profile, ProfileAdmin)
@@ -112,3 +112,35 @@ HANDLER403 = "entreprise.views.custom_permission_denied"
 LOGIN_URL = '/login/'
 LOGIN_REDIRECT_URL = '/redirect-after-login/'
 LOGOUT_REDIRECT_URL = '/login/'
+
+# Jeton partagé des terminaux de pointage (badgeuses, kiosques) pour l'API de synchronisation
+POINTAGE_TERMINAL_TOKEN = os.environ.get('POINTAGE_TERMINAL_TOKEN')
+
+# Journal LogConnexion tamponné (gestion_Horraire/audit.py) : taille de lot et délai
+# maximal avant écriture. AUDIT_LOG_SYNCHRONE = True écrit chaque événement tout de suite (tests).
+AUDIT_LOG_TAILLE_LOT = 100
+AUDIT_LOG_DELAI = 5
+AUDIT_LOG_SYNCHRONE = False
+
+# Rétention du journal LogConnexion : au-delà, les logs sont archivés (manage.py archiver_logs)
+LOG_RETENTION_JOURS = 90
+LOG_ARCHIVE_DIR = BASE_DIR / 'archives' / 'logs'
+
+# Cache (tableaux de bord RH et stock, résolution des SKU). Partagé par tous les
+# workers et les commandes pour voir préchauffage et invalidations : table en base
+# (python manage.py createcachetable), ou Redis / Memcached. LocMemCache est refusé
+# par le contrôle rh.E001.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'cache_entreprise',
+    }
+}
+# Durée de fraîcheur (secondes) d'un widget du tableau de bord RH
+RH_DASHBOARD_CACHE_TIMEOUT = 300
+# Bulletins de paie DOCX en cache, rangés par empreinte (rh/bulletins.py)
+RH_BULLETINS_DIR = BASE_DIR / 'archives' / 'bulletins'
+# Jours de congé acquis chaque mois par type (rh/soldes_conges.py, manage.py acquerir_conges)
+RH_CONGES_ACQUIS_PAR_MOIS = {'paid': '2.5'}
+# Types de congé débités du solde à l'approbation (None : les types ci-dessus)
+RH_CONGES_DECOMPTES = None
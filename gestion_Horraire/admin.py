@@ -1,6 +1,11 @@
+from datetime import datetime
 from unfold.admin import ModelAdmin
+from unfold.decorators import action
 from django.contrib import admin
-from .models import PointageHoraire, LogConnexion, ParametresHoraires
+from django.template.response import TemplateResponse
+from accounts.models import CustomUser
+from .archives import rechercher_logs
+from .models import PointageHoraire, LogConnexion, ParametresHoraires, PointageTerminal, DailyAttendanceSummary, Timesheet
 
 
 @admin.register(PointageHoraire)
@@ -20,6 +25,71 @@ class LogConnexionAdmin(ModelAdmin):
     search_fields = ('employe__username', 'ip', 'device')
     list_per_page = 20
     date_hierarchy = 'date_heure'
+    actions_list = ['rechercher_archives']
+    # Nombre maximal de logs affichés par la recherche archives comprises
+    LIMITE_RECHERCHE = 500
+
+    @action(description="Rechercher (archives comprises)", url_path="recherche-archives", permissions=['view'])
+    def rechercher_archives(self, request):
+        """La liste ne montre que la table ; cette recherche lit aussi les fichiers d'archive (archives.py)"""
+        criteres = {
+            'debut': request.GET.get('debut', ''), 'fin': request.GET.get('fin', ''),
+            'employe': request.GET.get('employe', '').strip(), 'type_action': request.GET.get('type_action', ''),
+        }
+        logs, erreur = None, None
+        if any(criteres.values()):
+            try:
+                debut = datetime.strptime(criteres['debut'], '%Y-%m-%d').date() if criteres['debut'] else None
+                fin = datetime.strptime(criteres['fin'], '%Y-%m-%d').date() if criteres['fin'] else None
+            except ValueError:
+                erreur = "Dates attendues au format AAAA-MM-JJ."
+            else:
+                employe_id = None
+                if criteres['employe']:
+                    employe_id = CustomUser.objects.filter(username=criteres['employe']).values_list('id', flat=True).first()
+                    if employe_id is None:
+                        erreur = f"Utilisateur inconnu : {criteres['employe']}"
+                if erreur is None:
+                    logs = rechercher_logs(
+                        debut, fin, employe_id=employe_id, type_action=criteres['type_action'] or None,
+                        limite=self.LIMITE_RECHERCHE,
+                    )
+                    usernames = CustomUser.objects.in_bulk({log['employe_id'] for log in logs} - {None})
+                    for log in logs:
+                        log['employe'] = usernames.get(log['employe_id'])
+        return TemplateResponse(request, 'admin/gestion_Horraire/logconnexion/recherche_archives.html', {
+            **self.admin_site.each_context(request),
+            'title': "Recherche dans les logs (archives comprises)",
+            'opts': self.model._meta,
+            'criteres': criteres,
+            'types': LogConnexion.TYPE_CHOICES,
+            'logs': logs,
+            'erreur': erreur,
+            'limite': self.LIMITE_RECHERCHE,
+        })
+
+@admin.register(PointageTerminal)
+class PointageTerminalAdmin(ModelAdmin):
+    list_display = ('cle', 'employe', 'horodatage', 'action', 'device', 'resultat', 'recu_le')
+    list_filter = ('resultat', 'action')
+    search_fields = ('cle', 'employe__username', 'device')
+    list_per_page = 20
+
+@admin.register(DailyAttendanceSummary)
+class DailyAttendanceSummaryAdmin(ModelAdmin):
+    list_display = ('date', 'department', 'site', 'presents', 'retards', 'absents', 'conges')
+    list_filter = ('department', 'site')
+    ordering = ('-date',)
+    list_per_page = 20
+    date_hierarchy = 'date'
+
+@admin.register(Timesheet)
+class TimesheetAdmin(ModelAdmin):
+    list_display = ('employe', 'periode', 'jours_presents', 'get_temps_travail_formate', 'jours_retard', 'minutes_retard', 'jours_absence', 'jours_conge', 'minutes_supplementaires')
+    list_filter = ('periode',)
+    search_fields = ('employe__username', 'employe__first_name', 'employe__last_name')
+    readonly_fields = ('calcule_le',)
+    list_per_page = 20
 
 @admin.register(ParametresHoraires)
 class ParametresHorairesAdmin(ModelAdmin):
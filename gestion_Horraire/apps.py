@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class GestionHorraireConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'gestion_Horraire'
+
+    def ready(self):
+        # Enregistrement des signaux
+        from . import signals  # noqa: F401
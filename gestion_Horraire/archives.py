@@ -0,0 +1,149 @@
+"""
+Rétention du journal LogConnexion et archive froide compressée.
+
+Les logs plus anciens que LOG_RETENTION_JOURS sont déplacés, par lots bornés,
+dans des fichiers JSONL gzip partitionnés par jour (logs-AAAA-MM-JJ.jsonl.gz)
+sous LOG_ARCHIVE_DIR, puis supprimés de la table. rechercher_logs() lit la
+table et les fichiers d'archive existants des jours demandés : un log archivé
+plus tôt que la rétention (archiver_logs --jours) reste trouvable. Elle sert
+l'historique des pointages et la recherche de l'admin des logs.
+"""
+import gzip
+import json
+import os
+from datetime import datetime, time, timedelta
+from pathlib import Path
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .models import LogConnexion
+
+CHAMPS_ARCHIVES = ('id', 'employe_id', 'date_heure', 'ip', 'device', 'type_action', 'details', 'success', 'error')
+
+
+def get_dossier_archives():
+    return Path(getattr(settings, 'LOG_ARCHIVE_DIR', settings.BASE_DIR / 'archives' / 'logs'))
+
+
+def get_limite_retention():
+    """Date/heure avant laquelle les logs ne sont plus en ligne"""
+    return timezone.now() - timedelta(days=getattr(settings, 'LOG_RETENTION_JOURS', 90))
+
+
+def _fichier_du_jour(jour):
+    return get_dossier_archives() / f"logs-{jour:%Y-%m-%d}.jsonl.gz"
+
+
+def archiver_logs(avant, taille_lot=1000):
+    """
+    Archive puis supprime les logs antérieurs à `avant`, lot par lot.
+    Chaque lot est écrit (et synchronisé sur disque) avant d'être supprimé ;
+    une reprise après incident peut donc dupliquer des lignes dans l'archive,
+    que rechercher_logs() élimine grâce à l'id. Retourne le nombre archivé.
+    """
+    dossier = get_dossier_archives()
+    dossier.mkdir(parents=True, exist_ok=True)
+    total = 0
+    while True:
+        lot = list(
+            LogConnexion.objects.filter(date_heure__lt=avant)
+            .order_by('date_heure', 'id')
+            .values(*CHAMPS_ARCHIVES)[:taille_lot]
+        )
+        if not lot:
+            return total
+
+        par_jour = {}
+        for log in lot:
+            jour = timezone.localtime(log['date_heure']).date()
+            log['date_heure'] = log['date_heure'].isoformat()
+            par_jour.setdefault(jour, []).append(log)
+
+        # Ajout d'un membre gzip par lot : le fichier reste lisible d'un seul tenant
+        for jour, logs in par_jour.items():
+            with open(_fichier_du_jour(jour), 'ab') as brut:
+                with gzip.GzipFile(fileobj=brut, mode='ab') as fichier:
+                    for log in logs:
+                        fichier.write((json.dumps(log, ensure_ascii=False) + '\n').encode('utf-8'))
+                brut.flush()
+                os.fsync(brut.fileno())
+
+        # Suppression courte : le verrou d'écriture n'est tenu que le temps d'un lot
+        with transaction.atomic():
+            LogConnexion.objects.filter(id__in=[log['id'] for log in lot]).delete()
+        total += len(lot)
+
+
+def jours_archives():
+    """Jours qui ont un fichier d'archive, du plus récent au plus ancien"""
+    jours = []
+    for chemin in get_dossier_archives().glob('logs-*.jsonl.gz'):
+        try:
+            jours.append(datetime.strptime(chemin.name[5:15], '%Y-%m-%d').date())
+        except ValueError:
+            continue
+    return sorted(jours, reverse=True)
+
+
+def _lire_fichier(jour):
+    """Logs archivés d'un jour, sans doublons (reprise après incident)"""
+    vus = set()
+    with gzip.open(_fichier_du_jour(jour), 'rt', encoding='utf-8') as fichier:
+        for ligne in fichier:
+            log = json.loads(ligne)
+            if log['id'] not in vus:
+                vus.add(log['id'])
+                log['date_heure'] = datetime.fromisoformat(log['date_heure'])
+                yield log
+
+
+def rechercher_logs(debut=None, fin=None, employe_id=None, type_action=None, limite=None):
+    """
+    Logs entre les dates `debut` et `fin` (incluses, ouvertes si None), du plus
+    récent au plus ancien, sous forme de dicts (avec type_action_display).
+    type_action : un type ou une liste de types. L'archive est lue pour chaque
+    jour de la période qui a un fichier, quelle que soit la limite d'archivage
+    utilisée à l'époque ; avec `limite`, la lecture s'arrête dès que les jours
+    restants ne peuvent plus entrer dans les résultats.
+    """
+    types = [type_action] if isinstance(type_action, str) else list(type_action or [])
+    # Bornes en date/heure (et non date_heure__date) : l'index sur date_heure est utilisé
+    logs = LogConnexion.objects.all()
+    if debut:
+        logs = logs.filter(date_heure__gte=timezone.make_aware(datetime.combine(debut, time.min)))
+    if fin:
+        logs = logs.filter(date_heure__lt=timezone.make_aware(datetime.combine(fin + timedelta(days=1), time.min)))
+    if employe_id is not None:
+        logs = logs.filter(employe_id=employe_id)
+    if types:
+        logs = logs.filter(type_action__in=types)
+    logs = logs.order_by('-date_heure', '-id').values(*CHAMPS_ARCHIVES)
+    resultats = list(logs[:limite] if limite else logs)
+
+    def cle(log):
+        return (log['date_heure'], log['id'])
+
+    ids_en_ligne = {log['id'] for log in resultats}
+    for jour in jours_archives():
+        if (fin and jour > fin) or (debut and jour < debut):
+            continue
+        if limite and len(resultats) >= limite and timezone.localtime(resultats[limite - 1]['date_heure']).date() > jour:
+            # Tous les jours restants sont plus anciens que les `limite` logs retenus
+            break
+        for log in _lire_fichier(jour):
+            if log['id'] in ids_en_ligne:
+                # Lot écrit dans l'archive mais pas encore supprimé de la table (reprise après incident)
+                continue
+            if employe_id is not None and log['employe_id'] != employe_id:
+                continue
+            if types and log['type_action'] not in types:
+                continue
+            resultats.append(log)
+        resultats.sort(key=cle, reverse=True)
+        if limite:
+            del resultats[limite:]
+
+    libelles = dict(LogConnexion.TYPE_CHOICES)
+    for log in resultats:
+        log['type_action_display'] = libelles.get(log['type_action'], log['type_action'])
+    return resultats
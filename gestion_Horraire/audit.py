@@ -0,0 +1,94 @@
+"""
+Écriture tamponnée du journal LogConnexion.
+
+Les événements sont mis en file en mémoire puis écrits par bulk_create, dès que
+le lot atteint AUDIT_LOG_TAILLE_LOT événements ou au plus tard après
+AUDIT_LOG_DELAI secondes. Un dernier vidage a lieu à l'arrêt du processus.
+Avec AUDIT_LOG_SYNCHRONE = True (tests), chaque événement est écrit tout de suite.
+Les pointages passent par ecrire() : leur log est écrit dans la transaction du
+pointage, validé ou annulé avec lui.
+"""
+import atexit
+import logging
+import threading
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+from .models import LogConnexion
+
+logger = logging.getLogger(__name__)
+
+
+def get_client_ip(request):
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if x_forwarded_for:
+        ip = x_forwarded_for.split(',')[0]
+    else:
+        ip = request.META.get('REMOTE_ADDR')
+    return ip
+
+
+class JournalAudit:
+    """File d'attente des événements LogConnexion, vidée par lots"""
+
+    def __init__(self):
+        self._tampon = []
+        self._verrou = threading.Lock()
+        self._minuteur = None
+
+    @property
+    def synchrone(self):
+        return getattr(settings, 'AUDIT_LOG_SYNCHRONE', False)
+
+    def enregistrer(self, **champs):
+        """Même signature que LogConnexion.objects.create()"""
+        log = LogConnexion(date_heure=timezone.now(), **champs)
+        if self.synchrone:
+            log.save()
+            return
+        # Dans une transaction, l'événement n'est mis en file qu'après le commit
+        transaction.on_commit(lambda: self._ajouter(log))
+
+    def ecrire(self, **champs):
+        """Écrit l'événement tout de suite, dans la transaction courante, sans passer par la file"""
+        return LogConnexion.objects.create(date_heure=timezone.now(), **champs)
+
+    def _ajouter(self, log):
+        with self._verrou:
+            self._tampon.append(log)
+            plein = len(self._tampon) >= getattr(settings, 'AUDIT_LOG_TAILLE_LOT', 100)
+            if not plein and self._minuteur is None:
+                self._minuteur = threading.Timer(getattr(settings, 'AUDIT_LOG_DELAI', 5), self._vider_en_arriere_plan)
+                self._minuteur.daemon = True
+                self._minuteur.start()
+        if plein:
+            self.vider()
+
+    def _vider_en_arriere_plan(self):
+        try:
+            self.vider()
+        finally:
+            # Connexion propre au thread du minuteur
+            connections.close_all()
+
+    def vider(self):
+        """Écrit tous les événements en attente ; retourne le nombre écrit"""
+        with self._verrou:
+            logs, self._tampon = self._tampon, []
+            if self._minuteur is not None:
+                self._minuteur.cancel()
+                self._minuteur = None
+        if not logs:
+            return 0
+        try:
+            LogConnexion.objects.bulk_create(logs, batch_size=500)
+        except Exception:
+            logger.exception("Écriture du journal LogConnexion impossible, %d événement(s) remis en file", len(logs))
+            with self._verrou:
+                self._tampon[:0] = logs
+            return 0
+        return len(logs)
+
+
+journal_audit = JournalAudit()
+atexit.register(journal_audit.vider)
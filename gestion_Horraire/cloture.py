@@ -0,0 +1,116 @@
+"""
+Clôture de fin de journée des pointages.
+
+- Crée en masse une ligne ABSENT (ou CONGE si un congé approuvé couvre le jour)
+  pour chaque employé actif sans pointage un jour travaillé.
+- Ferme en masse les pointages dont le départ n'a pas été pointé, selon une politique.
+
+Quelques requêtes ensemblistes par lot, sans boucle de save() par employé.
+"""
+import uuid
+from collections import Counter
+from datetime import datetime
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from rh.models import LeaveRequest
+from .models import PointageHoraire, ParametresHoraires, DailyAttendanceSummary, employes_actifs
+
+TAILLE_LOT = 1000
+
+# Politiques de fermeture des pointages sans départ
+POLITIQUES = {
+    'heure_fin': "Départ fixé à l'heure de fin standard",
+    'aucune': "Départ laissé vide, pointage signalé en commentaire",
+}
+
+COMMENTAIRE_CLOTURE = "Départ non pointé (clôture automatique)"
+
+
+def creer_absences(jour):
+    """Crée les lignes manquantes du jour ; retourne le nombre de lignes créées"""
+    en_conge = set(
+        LeaveRequest.objects.filter(
+            status='approved', start_date__lte=jour, end_date__gte=jour,
+        ).values_list('employee_id', flat=True)
+    )
+
+    with transaction.atomic():
+        manquants = {
+            employe_id: (department_id, site_id)
+            for employe_id, department_id, site_id in employes_actifs().exclude(
+                pointages__date=jour
+            ).values_list('id', 'department_id', 'site_id')
+        }
+        if not manquants:
+            return 0
+
+        # Un pointage posé entre la lecture et l'insertion est ignoré (ignore_conflicts) :
+        # seules les lignes réellement insérées ici, reconnues à leur jeton, sont comptées.
+        jeton = f"cloture:{uuid.uuid4().hex}"
+        PointageHoraire.objects.bulk_create([
+            PointageHoraire(
+                employe_id=employe_id, date=jour, status='CONGE' if employe_id in en_conge else 'ABSENT',
+                commentaire=jeton,
+            )
+            for employe_id in manquants
+        ], batch_size=TAILLE_LOT, ignore_conflicts=True)
+        inseres = PointageHoraire.objects.filter(date=jour, commentaire=jeton)
+
+        variations = Counter()
+        for employe_id, status in inseres.values_list('employe_id', 'status').iterator(chunk_size=TAILLE_LOT):
+            department_id, site_id = manquants[employe_id]
+            variations[(jour, department_id, site_id, status)] += 1
+        inseres.update(commentaire=None)
+        # bulk_create n'émet pas post_save : résumé journalier mis à jour ici
+        DailyAttendanceSummary.objects.appliquer(variations)
+    return sum(variations.values())
+
+
+def fermer_pointages_ouverts(jour, politique='heure_fin'):
+    """Ferme les pointages du jour sans départ ; retourne le nombre de lignes fermées"""
+    if politique not in POLITIQUES:
+        raise ValueError(f"Politique inconnue : {politique}")
+    ouverts = PointageHoraire.objects.filter(date=jour, heure_arrivee__isnull=False, heure_depart__isnull=True)
+
+    if politique == 'aucune':
+        # Un commentaire déjà saisi sur le pointage est conservé
+        return ouverts.filter(Q(commentaire__isnull=True) | Q(commentaire='')).update(
+            commentaire=COMMENTAIRE_CLOTURE, updated_at=timezone.now()
+        )
+
+    parametres = ParametresHoraires.get_actifs(creer=True)
+    heure_fin = parametres.heure_fin_standard
+    ouverts = ouverts.filter(heure_arrivee__lt=heure_fin)
+    total = 0
+    while True:
+        # Lot suivant : les lignes fermées sortent du filtre, pas besoin d'OFFSET
+        lot = list(ouverts.only('id', 'date', 'heure_arrivee', 'heure_depart', 'status', 'commentaire')[:TAILLE_LOT])
+        if not lot:
+            return total
+        maintenant = timezone.now()
+        for pointage in lot:
+            pointage.heure_depart = heure_fin
+            pointage.calculer_statut(parametres)
+            pointage.commentaire = pointage.commentaire or COMMENTAIRE_CLOTURE
+            pointage.updated_at = maintenant
+        # Le statut reste inchangé une fois le départ posé : pas de variation du résumé
+        PointageHoraire.objects.bulk_update(
+            lot, ['heure_depart', 'duree_travail_minutes', 'commentaire', 'updated_at'], batch_size=TAILLE_LOT
+        )
+        total += len(lot)
+
+
+def cloturer_journee(jour, politique='heure_fin'):
+    """Clôture complète d'une journée ; retourne (lignes créées, pointages fermés)"""
+    parametres = ParametresHoraires.get_actifs(creer=True)
+    if not parametres.est_jour_travaille(jour):
+        return 0, 0
+    return creer_absences(jour), fermer_pointages_ouverts(jour, politique)
+
+
+def heure_cloture_atteinte(jour):
+    """True si l'heure de fin standard du jour est passée"""
+    parametres = ParametresHoraires.get_actifs(creer=True)
+    fin = timezone.make_aware(datetime.combine(jour, parametres.heure_fin_standard))
+    return timezone.now() >= fin
@@ -0,0 +1,201 @@
+"""
+Report des congés approuvés dans les pointages (statut CONGE).
+
+- Une demande approuvée pose une ligne CONGE sur chaque jour travaillé de sa
+  période (ParametresHoraires.jours_travailles) : les lignes ABSENT jamais
+  pointées passent en CONGE par un UPDATE, les jours sans ligne sont créés
+  par un bulk_create. Un jour réellement pointé reste tel quel.
+- Une demande qui cesse d'être approuvée (ou change de période) retire ses
+  lignes CONGE non pointées : ABSENT pour les jours passés, supprimées sinon.
+- Le résumé journalier est mis à jour par variations, comme la clôture.
+
+Les signaux de rh/signals.py appellent synchroniser_demande() ;
+python manage.py reconcilier_conges resynchronise l'historique par lots.
+"""
+import uuid
+from collections import Counter, defaultdict
+from django.db import transaction
+from django.utils import timezone
+from accounts.models import CustomUser
+from rh.models import LeaveRequest
+from .feuilles_temps import jours_ouvres_periode
+from .models import PointageHoraire, ParametresHoraires, DailyAttendanceSummary
+
+TAILLE_LOT = 500
+
+
+def jours_demande(parametres, employe_id, statut, date_debut, date_fin):
+    """Jours travaillés couverts par une demande approuvée (ensemble vide sinon)"""
+    if statut != 'approved' or not date_debut or not date_fin:
+        return set()
+    return jours_ouvres_periode(parametres, date_debut, date_fin)
+
+
+def _lignes_existantes(jours_par_employe):
+    """Pointages des jours demandés : {(employe_id, date): (id, status, heure_arrivee)}"""
+    dates = set().union(*jours_par_employe.values())
+    pointages = PointageHoraire.objects.filter(
+        employe_id__in=list(jours_par_employe), date__range=(min(dates), max(dates))
+    ).values_list('id', 'employe_id', 'date', 'status', 'heure_arrivee')
+    return {
+        (employe_id, jour): (id_, status, heure_arrivee)
+        for id_, employe_id, jour, status, heure_arrivee in pointages.iterator(chunk_size=2000)
+        if jour in jours_par_employe[employe_id]
+    }
+
+
+def poser_conges(jours_par_employe):
+    """
+    Pose le statut CONGE sur les jours donnés {employe_id: {dates}}.
+    Retourne le nombre de lignes créées ou passées en CONGE.
+    """
+    jours_par_employe = {e: jours for e, jours in jours_par_employe.items() if jours}
+    if not jours_par_employe:
+        return 0
+    employes = dict(
+        (id_, (department_id, site_id))
+        for id_, department_id, site_id in CustomUser.objects.filter(
+            id__in=list(jours_par_employe)
+        ).values_list('id', 'department_id', 'site_id')
+    )
+
+    with transaction.atomic():
+        existantes = _lignes_existantes(jours_par_employe)
+        # Seules les absences jamais pointées deviennent des congés
+        a_passer = [
+            id_ for id_, status, heure_arrivee in existantes.values()
+            if status == 'ABSENT' and heure_arrivee is None
+        ]
+        # Un employé qui pointe entre la lecture et l'écriture garde son pointage : l'UPDATE
+        # re-vérifie l'absence, et les lignes réellement modifiées sont relues à leur horodatage
+        maintenant = timezone.now()
+        for debut in range(0, len(a_passer), TAILLE_LOT):
+            PointageHoraire.objects.filter(
+                id__in=a_passer[debut:debut + TAILLE_LOT], status='ABSENT', heure_arrivee__isnull=True,
+            ).update(status='CONGE', updated_at=maintenant)
+        passees = []
+        for debut in range(0, len(a_passer), TAILLE_LOT):
+            passees += PointageHoraire.objects.filter(
+                id__in=a_passer[debut:debut + TAILLE_LOT], status='CONGE', updated_at=maintenant,
+            ).values_list('employe_id', 'date')
+
+        # Une ligne créée entre-temps est ignorée (ignore_conflicts) : seules les lignes
+        # réellement insérées ici, reconnues à leur jeton, sont comptées
+        jeton = f"conge:{uuid.uuid4().hex}"
+        PointageHoraire.objects.bulk_create([
+            PointageHoraire(employe_id=employe_id, date=jour, status='CONGE', commentaire=jeton)
+            for employe_id, jours in jours_par_employe.items()
+            for jour in jours if (employe_id, jour) not in existantes
+        ], batch_size=TAILLE_LOT, ignore_conflicts=True)
+        dates = set().union(*jours_par_employe.values())
+        inserees = PointageHoraire.objects.filter(date__range=(min(dates), max(dates)), commentaire=jeton)
+        creees = list(inserees.values_list('employe_id', 'date'))
+        inserees.update(commentaire=None)
+
+        variations = Counter()
+        for employe_id, jour in passees:
+            variations[(jour, *employes[employe_id], 'ABSENT')] -= 1
+            variations[(jour, *employes[employe_id], 'CONGE')] += 1
+        for employe_id, jour in creees:
+            variations[(jour, *employes[employe_id], 'CONGE')] += 1
+        # update() et bulk_create n'émettent pas post_save : résumé journalier mis à jour ici
+        DailyAttendanceSummary.objects.appliquer(variations)
+    return len(passees) + len(creees)
+
+
+def retirer_conges(jours_par_employe):
+    """
+    Retire le statut CONGE des jours donnés {employe_id: {dates}} quand ils
+    n'ont pas été pointés. Retourne le nombre de lignes modifiées ou supprimées.
+    """
+    jours_par_employe = {e: jours for e, jours in jours_par_employe.items() if jours}
+    if not jours_par_employe:
+        return 0
+    aujourd_hui = timezone.localdate()
+    existantes = _lignes_existantes(jours_par_employe)
+    a_retirer = [
+        (id_, jour) for (_, jour), (id_, status, heure_arrivee) in existantes.items()
+        if status == 'CONGE' and heure_arrivee is None
+    ]
+    passes = [id_ for id_, jour in a_retirer if jour < aujourd_hui]
+    futurs = [id_ for id_, jour in a_retirer if jour >= aujourd_hui]
+
+    with transaction.atomic():
+        # save() par ligne : le signal du pointage corrige le résumé (cas rare, peu de lignes)
+        for pointage in PointageHoraire.objects.filter(id__in=passes).select_related('employe'):
+            pointage.status = 'ABSENT'
+            pointage.save(update_fields=['status', 'updated_at'])
+        # Jours à venir : la clôture recréera une absence si besoin
+        PointageHoraire.objects.filter(id__in=futurs).delete()
+    return len(a_retirer)
+
+
+def synchroniser_demande(ancienne, nouvelle):
+    """
+    Aligne les pointages sur le changement d'une demande de congé.
+    ancienne, nouvelle : (employe_id, statut, date_debut, date_fin), ancienne
+    vaut None pour une demande créée, nouvelle None pour une demande supprimée.
+    """
+    parametres = ParametresHoraires.get_actifs(creer=True)
+    avant = defaultdict(set)
+    apres = defaultdict(set)
+    if ancienne:
+        avant[ancienne[0]] = jours_demande(parametres, *ancienne)
+    if nouvelle:
+        apres[nouvelle[0]] = jours_demande(parametres, *nouvelle)
+    if avant == apres:
+        return
+    employes = set(avant) | set(apres)
+    retirer_conges({e: avant[e] - apres[e] for e in employes})
+    poser_conges({e: apres[e] - avant[e] for e in employes})
+
+
+def reconcilier_conges(depuis=None, taille_lot=TAILLE_LOT):
+    """
+    Resynchronise l'historique par lots : pose CONGE pour les demandes
+    approuvées, puis retire les lignes CONGE non pointées qu'aucune demande
+    approuvée ne couvre. depuis : date de début de la resynchronisation.
+    Retourne (lignes posées, lignes retirées).
+    """
+    demandes = LeaveRequest.objects.all()
+    orphelines = PointageHoraire.objects.filter(status='CONGE', heure_arrivee__isnull=True)
+    if depuis:
+        demandes = demandes.filter(end_date__gte=depuis)
+        orphelines = orphelines.filter(date__gte=depuis)
+    parametres = ParametresHoraires.get_actifs(creer=True)
+    posees = 0
+    dernier_id = 0
+    approuvees = demandes.filter(status='approved').order_by('id')
+    while True:
+        lot = list(approuvees.filter(id__gt=dernier_id).values_list(
+            'id', 'employee_id', 'status', 'start_date', 'end_date'
+        )[:taille_lot])
+        if not lot:
+            break
+        dernier_id = lot[-1][0]
+        jours_par_employe = defaultdict(set)
+        for _, employe_id, statut, date_debut, date_fin in lot:
+            jours_par_employe[employe_id] |= jours_demande(parametres, employe_id, statut, date_debut, date_fin)
+        posees += poser_conges(jours_par_employe)
+
+    retirees = 0
+    dernier_id = 0
+    orphelines = orphelines.order_by('id')
+    while True:
+        lot = list(orphelines.filter(id__gt=dernier_id).values_list('id', 'employe_id', 'date')[:taille_lot])
+        if not lot:
+            break
+        dernier_id = lot[-1][0]
+        couverts = defaultdict(set)
+        dates = [jour for _, _, jour in lot]
+        for employe_id, date_debut, date_fin in demandes.filter(
+            status='approved', employee_id__in={e for _, e, _ in lot},
+            start_date__lte=max(dates), end_date__gte=min(dates),
+        ).values_list('employee_id', 'start_date', 'end_date'):
+            couverts[employe_id].add((date_debut, date_fin))
+        jours_par_employe = defaultdict(set)
+        for _, employe_id, jour in lot:
+            if not any(debut <= jour <= fin for debut, fin in couverts[employe_id]):
+                jours_par_employe[employe_id].add(jour)
+        retirees += retirer_conges(jours_par_employe)
+    return posees, retirees
@@ -0,0 +1,141 @@
+"""
+Calcul des feuilles de temps mensuelles de tous les employés.
+
+Deux requêtes de lecture pour toute la période (pointages du mois, congés
+approuvés qui la chevauchent), un passage en mémoire, puis écriture des
+lignes Timesheet par bulk_create ... ON CONFLICT. Aucun calcul ligne par
+ligne avec ParametresHoraires.calculer_retard().
+"""
+import calendar
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from django.db import transaction
+from django.utils import timezone
+from rh.models import LeaveRequest
+from .models import PointageHoraire, ParametresHoraires, Timesheet, employes_actifs
+
+CHAMPS_CALCULES = [
+    'jours_ouvres', 'jours_presents', 'minutes_travaillees', 'jours_retard', 'minutes_retard',
+    'jours_absence', 'jours_conge', 'minutes_supplementaires', 'calcule_le',
+]
+
+
+def bornes_periode(periode):
+    """Premier et dernier jour du mois contenant `periode`"""
+    debut = periode.replace(day=1)
+    return debut, debut.replace(day=calendar.monthrange(debut.year, debut.month)[1])
+
+
+def minutes_du_jour(heure):
+    return heure.hour * 60 + heure.minute + heure.second / 60
+
+
+def jours_ouvres_periode(parametres, debut, fin):
+    """Ensemble des jours travaillés entre debut et fin inclus"""
+    jours_ouvres = set()
+    jour = debut
+    while jour <= fin:
+        if parametres.est_jour_travaille(jour):
+            jours_ouvres.add(jour)
+        jour += timedelta(days=1)
+    return jours_ouvres
+
+
+def seuils_journee(parametres):
+    """
+    (seuil de retard, durée standard) en minutes, précalculés une fois
+    au lieu de calculer_retard() par ligne
+    """
+    seuil_retard = minutes_du_jour(parametres.heure_debut_standard) + parametres.marge_retard
+    duree_standard = max(
+        0,
+        int((datetime.combine(date.min, parametres.heure_fin_standard)
+             - datetime.combine(date.min, parametres.heure_debut_standard)).total_seconds() // 60)
+        - parametres.temps_pause_dejeuner
+    )
+    return seuil_retard, duree_standard
+
+
+def calculer_feuilles_temps(periode, employes=None):
+    """
+    Calcule et enregistre les feuilles de temps du mois de `periode`.
+    employes : queryset de CustomUser (par défaut employes_actifs()).
+    Pour le mois en cours, seuls les jours écoulés sont comptés.
+    Retourne la liste des Timesheet enregistrées.
+    """
+    parametres = ParametresHoraires.get_actifs(creer=True)
+    debut, fin = bornes_periode(periode)
+    fin_comptee = min(fin, timezone.localdate())
+
+    # Jours ouvrés écoulés de la période, selon jours_travailles
+    jours_ouvres = jours_ouvres_periode(parametres, debut, fin_comptee)
+    seuil_retard, duree_standard = seuils_journee(parametres)
+
+    if employes is None:
+        employes = employes_actifs()
+    feuilles = {
+        employe_id: Timesheet(employe_id=employe_id, periode=debut, jours_ouvres=len(jours_ouvres))
+        for employe_id in employes.values_list('id', flat=True)
+    }
+    # Sous-requête plutôt qu'une liste d'ids : pas de limite de paramètres SQL
+    ids = employes.values('id')
+    jours_presents = defaultdict(set)
+    jours_conge = defaultdict(set)
+
+    # Requête 1 : tous les pointages du mois
+    pointages = PointageHoraire.objects.filter(
+        employe_id__in=ids, date__range=(debut, fin_comptee)
+    ).values_list('employe_id', 'date', 'status', 'heure_arrivee', 'duree_travail_minutes')
+    for employe_id, jour, status, heure_arrivee, duree in pointages.iterator(chunk_size=2000):
+        feuille = feuilles[employe_id]
+        if status == 'CONGE':
+            jours_conge[employe_id].add(jour)
+            continue
+        if not heure_arrivee:
+            continue
+        jours_presents[employe_id].add(jour)
+        feuille.minutes_travaillees += duree
+        feuille.minutes_supplementaires += max(0, duree - duree_standard)
+        retard = int(minutes_du_jour(heure_arrivee) - seuil_retard)
+        if retard > 0:
+            feuille.jours_retard += 1
+            feuille.minutes_retard += retard
+
+    # Requête 2 : congés approuvés qui chevauchent la période
+    conges = LeaveRequest.objects.filter(
+        employee_id__in=ids, status='approved', start_date__lte=fin_comptee, end_date__gte=debut
+    ).values_list('employee_id', 'start_date', 'end_date')
+    for employe_id, date_debut, date_fin in conges.iterator(chunk_size=2000):
+        jour = max(date_debut, debut)
+        while jour <= min(date_fin, fin_comptee):
+            if jour in jours_ouvres:
+                jours_conge[employe_id].add(jour)
+            jour += timedelta(days=1)
+
+    maintenant = timezone.now()
+    for employe_id, feuille in feuilles.items():
+        presents = jours_presents[employe_id]
+        conge = jours_conge[employe_id] - presents
+        feuille.jours_presents = len(presents)
+        feuille.jours_conge = len(conge)
+        feuille.jours_absence = len(jours_ouvres - presents - conge)
+        feuille.calcule_le = maintenant
+
+    with transaction.atomic():
+        return Timesheet.objects.bulk_create(
+            feuilles.values(),
+            batch_size=500,
+            update_conflicts=True,
+            unique_fields=['employe', 'periode'],
+            update_fields=CHAMPS_CALCULES,
+        )
+
+
+def periode_depuis_texte(texte):
+    """Convertit 'AAAA-MM' en date du premier jour du mois"""
+    return datetime.strptime(texte, '%Y-%m').date()
+
+
+def mois_precedent(jour=None):
+    jour = jour or timezone.localdate()
+    return (jour.replace(day=1) - timedelta(days=1)).replace(day=1)
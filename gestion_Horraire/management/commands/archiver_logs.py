@@ -0,0 +1,23 @@
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from gestion_Horraire.archives import archiver_logs, get_limite_retention, get_dossier_archives
+
+
+class Command(BaseCommand):
+    help = "Déplacer les logs de connexion anciens vers l'archive compressée (JSONL gzip par jour)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--jours', type=int, help="Âge maximal des logs en ligne (par défaut LOG_RETENTION_JOURS)")
+        parser.add_argument('--taille-lot', type=int, default=1000, help="Nombre de logs supprimés par transaction")
+
+    def handle(self, *args, **options):
+        if options['jours'] is not None:
+            avant = timezone.now() - timedelta(days=options['jours'])
+        else:
+            avant = get_limite_retention()
+
+        total = archiver_logs(avant, taille_lot=options['taille_lot'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} log(s) antérieur(s) au {timezone.localtime(avant):%d/%m/%Y %H:%M} archivé(s) dans {get_dossier_archives()}."
+        ))
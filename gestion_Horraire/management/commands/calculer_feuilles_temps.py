@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+from gestion_Horraire.feuilles_temps import calculer_feuilles_temps, periode_depuis_texte, mois_precedent
+
+
+class Command(BaseCommand):
+    help = "Calculer les feuilles de temps mensuelles de tous les employés actifs"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mois', help="Mois à calculer (AAAA-MM), par défaut le mois précédent")
+
+    def handle(self, *args, **options):
+        if options['mois']:
+            try:
+                periode = periode_depuis_texte(options['mois'])
+            except ValueError:
+                raise CommandError("Format de mois attendu : AAAA-MM")
+        else:
+            periode = mois_precedent()
+
+        feuilles = calculer_feuilles_temps(periode)
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(feuilles)} feuille(s) de temps calculée(s) pour {periode:%m/%Y}."
+        ))
@@ -0,0 +1,35 @@
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from gestion_Horraire.cloture import cloturer_journee, heure_cloture_atteinte, POLITIQUES
+
+
+class Command(BaseCommand):
+    help = (
+        "Clôturer une journée de pointage : lignes ABSENT/CONGE pour les employés sans pointage "
+        "et fermeture des pointages sans départ. À planifier après l'heure de fin standard "
+        "(ex. cron : 30 18 * * * python manage.py cloturer_journee)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help="Jour à clôturer (AAAA-MM-JJ), par défaut aujourd'hui")
+        parser.add_argument('--politique', choices=sorted(POLITIQUES), default='heure_fin',
+                            help="Traitement des pointages sans départ")
+        parser.add_argument('--force', action='store_true', help="Clôturer avant l'heure de fin standard")
+
+    def handle(self, *args, **options):
+        if options['date']:
+            try:
+                jour = datetime.strptime(options['date'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError("Format de date attendu : AAAA-MM-JJ")
+        else:
+            jour = timezone.localdate()
+
+        if not options['force'] and not heure_cloture_atteinte(jour):
+            raise CommandError("L'heure de fin standard n'est pas encore passée (utiliser --force).")
+
+        crees, fermes = cloturer_journee(jour, options['politique'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{jour:%d/%m/%Y} : {crees} ligne(s) d'absence/congé créée(s), {fermes} pointage(s) fermé(s)."
+        ))
@@ -0,0 +1,36 @@
+import json
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from gestion_Horraire.synchro import synchroniser_pointages, TAILLE_MAX_LOT
+
+
+class Command(BaseCommand):
+    help = "Importer un lot de pointages de terminaux (fichier JSON, ou '-' pour l'entrée standard)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('fichier', help="Fichier JSON : liste de pointages ou {\"pointages\": [...]}")
+
+    def handle(self, *args, **options):
+        try:
+            if options['fichier'] == '-':
+                data = json.load(sys.stdin)
+            else:
+                with open(options['fichier'], encoding='utf-8') as f:
+                    data = json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Lecture du fichier impossible : {e}")
+
+        pointages = data.get('pointages', []) if isinstance(data, dict) else data
+        totaux = {'APPLIQUE': 0, 'IGNORE': 0, 'REJETE': 0}
+
+        # Découpage en lots de la taille acceptée par l'API
+        for debut in range(0, len(pointages), TAILLE_MAX_LOT):
+            for resultat in synchroniser_pointages(pointages[debut:debut + TAILLE_MAX_LOT]):
+                totaux[resultat['resultat']] += 1
+                if resultat['resultat'] == 'REJETE':
+                    self.stdout.write(self.style.WARNING(f"{resultat['cle']} : {resultat['erreur']}"))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{totaux['APPLIQUE']} pointage(s) appliqué(s), "
+            f"{totaux['IGNORE']} ignoré(s), {totaux['REJETE']} rejeté(s)."
+        ))
@@ -0,0 +1,24 @@
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from gestion_Horraire.conges import reconcilier_conges
+
+
+class Command(BaseCommand):
+    help = "Reporter les congés approuvés dans les pointages (statut CONGE) et retirer les CONGE orphelins"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--depuis', help="Date de début (AAAA-MM-JJ), par défaut tout l'historique")
+        parser.add_argument('--taille-lot', type=int, default=500, help="Demandes ou pointages traités par lot")
+
+    def handle(self, *args, **options):
+        depuis = None
+        if options['depuis']:
+            try:
+                depuis = datetime.strptime(options['depuis'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError("Format de date attendu : AAAA-MM-JJ")
+
+        posees, retirees = reconcilier_conges(depuis, taille_lot=options['taille_lot'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{posees} ligne(s) CONGE posée(s), {retirees} ligne(s) CONGE orpheline(s) retirée(s)."
+        ))
@@ -0,0 +1,48 @@
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Q
+from gestion_Horraire.models import PointageHoraire, DailyAttendanceSummary, resume_presence_modifie
+
+
+class Command(BaseCommand):
+    help = "Reconstruire le résumé journalier des présences à partir des pointages"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--depuis', help="Date de début (AAAA-MM-JJ), par défaut tout l'historique")
+
+    def handle(self, *args, **options):
+        pointages = PointageHoraire.objects.all()
+        resumes = DailyAttendanceSummary.objects.all()
+        if options['depuis']:
+            try:
+                depuis = datetime.strptime(options['depuis'], '%Y-%m-%d').date()
+            except ValueError:
+                raise CommandError("Format de date attendu : AAAA-MM-JJ")
+            pointages = pointages.filter(date__gte=depuis)
+            resumes = resumes.filter(date__gte=depuis)
+
+        # Une seule requête groupée par (date, département, site)
+        compteurs = {
+            champ: Count('id', filter=Q(status=status))
+            for status, champ in DailyAttendanceSummary.objects.CHAMPS_STATUTS.items()
+        }
+        lignes = pointages.values('date', 'employe__department', 'employe__site').annotate(**compteurs).order_by()
+
+        with transaction.atomic():
+            resumes.delete()
+            crees = DailyAttendanceSummary.objects.bulk_create(
+                (
+                    DailyAttendanceSummary(
+                        date=ligne['date'],
+                        department_id=ligne['employe__department'],
+                        site_id=ligne['employe__site'],
+                        **{champ: ligne[champ] for champ in compteurs},
+                    )
+                    for ligne in lignes.iterator()
+                ),
+                batch_size=500,
+            )
+            resume_presence_modifie.send(sender=DailyAttendanceSummary, dates=None)
+
+        self.stdout.write(self.style.SUCCESS(f"{len(crees)} ligne(s) de résumé reconstruite(s)."))
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.5 on 2026-10-18 07:58
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_Horraire', '0005_alter_parametreshoraires_options_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='pointagehoraire',
+            name='date',
+            field=models.DateField(default=django.utils.timezone.localdate, editable=False, verbose_name='Date de pointage'),
+        ),
+        migrations.CreateModel(
+            name='PointageTerminal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cle', models.CharField(max_length=100, unique=True, verbose_name="Clé d'idempotence")),
+                ('horodatage', models.DateTimeField(verbose_name='Horodatage du pointage')),
+                ('action', models.CharField(choices=[('arrivee', 'Arrivée'), ('depart', 'Départ')], max_length=10)),
+                ('device', models.CharField(blank=True, max_length=255, null=True)),
+                ('resultat', models.CharField(choices=[('APPLIQUE', 'Appliqué'), ('IGNORE', 'Ignoré'), ('REJETE', 'Rejeté')], max_length=10)),
+                ('erreur', models.CharField(blank=True, max_length=255, null=True)),
+                ('recu_le', models.DateTimeField(auto_now_add=True, verbose_name='Reçu le')),
+                ('employe', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='pointages_terminal', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Pointage terminal',
+                'verbose_name_plural': 'Pointages terminaux',
+                'ordering': ['-horodatage'],
+            },
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.5 on 2026-10-18 08:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def remplir_resume(apps, schema_editor):
+    PointageHoraire = apps.get_model('gestion_Horraire', 'PointageHoraire')
+    DailyAttendanceSummary = apps.get_model('gestion_Horraire', 'DailyAttendanceSummary')
+    champs = {'PRESENT': 'presents', 'ABSENT': 'absents', 'RETARD': 'retards', 'CONGE': 'conges'}
+    lignes = PointageHoraire.objects.values('date', 'employe__department', 'employe__site').annotate(
+        **{champ: Count('id', filter=Q(status=status)) for status, champ in champs.items()}
+    ).order_by()
+    DailyAttendanceSummary.objects.bulk_create([
+        DailyAttendanceSummary(
+            date=ligne['date'],
+            department_id=ligne['employe__department'],
+            site_id=ligne['employe__site'],
+            **{champ: ligne[champ] for champ in champs.values()},
+        )
+        for ligne in lignes
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_userpermission'),
+        ('gestion_Horraire', '0006_pointageterminal'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyAttendanceSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('presents', models.IntegerField(default=0, verbose_name='Présents')),
+                ('absents', models.IntegerField(default=0, verbose_name='Absents')),
+                ('retards', models.IntegerField(default=0, verbose_name='En retard')),
+                ('conges', models.IntegerField(default=0, verbose_name='En congé')),
+                ('department', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='accounts.department')),
+                ('site', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='accounts.site')),
+            ],
+            options={
+                'verbose_name': 'Résumé journalier des présences',
+                'verbose_name_plural': 'Résumés journaliers des présences',
+                'ordering': ['-date'],
+                'indexes': [models.Index(fields=['date', 'department', 'site'], name='gestion_Hor_date_aa8a97_idx')],
+            },
+        ),
+        migrations.RunPython(remplir_resume, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-18 08:01
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_Horraire', '0007_dailyattendancesummary'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='logconnexion',
+            name='date_heure',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-18 08:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_Horraire', '0008_logconnexion_date_heure_default'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='logconnexion',
+            index=models.Index(fields=['date_heure'], name='gestion_Hor_date_he_3f8a60_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='logconnexion',
+            index=models.Index(fields=['success', 'date_heure'], name='gestion_Hor_success_151db5_idx'),
+        ),
+    ]
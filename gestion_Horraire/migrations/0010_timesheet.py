@@ -0,0 +1,40 @@
+# Generated by Django 5.2.5 on 2026-10-18 08:03
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('gestion_Horraire', '0009_logconnexion_index_retention'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Timesheet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('periode', models.DateField(help_text='Premier jour du mois', verbose_name='Mois')),
+                ('jours_ouvres', models.PositiveIntegerField(default=0, verbose_name='Jours ouvrés')),
+                ('jours_presents', models.PositiveIntegerField(default=0, verbose_name='Jours de présence')),
+                ('minutes_travaillees', models.PositiveIntegerField(default=0, verbose_name='Minutes travaillées')),
+                ('jours_retard', models.PositiveIntegerField(default=0, verbose_name='Jours de retard')),
+                ('minutes_retard', models.PositiveIntegerField(default=0, verbose_name='Minutes de retard')),
+                ('jours_absence', models.PositiveIntegerField(default=0, verbose_name="Jours d'absence")),
+                ('jours_conge', models.PositiveIntegerField(default=0, verbose_name='Jours de congé')),
+                ('minutes_supplementaires', models.PositiveIntegerField(default=0, verbose_name='Heures supplémentaires (minutes)')),
+                ('calcule_le', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Calculé le')),
+                ('employe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feuilles_temps', to=settings.AUTH_USER_MODEL, verbose_name='Employé')),
+            ],
+            options={
+                'verbose_name': 'Feuille de temps',
+                'verbose_name_plural': 'Feuilles de temps',
+                'ordering': ['-periode', 'employe'],
+                'unique_together': {('employe', 'periode')},
+            },
+        ),
+    ]
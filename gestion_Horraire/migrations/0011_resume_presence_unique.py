@@ -0,0 +1,40 @@
+# Generated by Django 5.2.5 on 2026-10-18 08:40
+
+import django.db.models.functions.comparison
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+CHAMPS = ('presents', 'absents', 'retards', 'conges')
+
+
+def fusionner_doublons(apps, schema_editor):
+    """Regroupe les lignes en double d'un même (jour, département, site) avant la contrainte"""
+    DailyAttendanceSummary = apps.get_model('gestion_Horraire', 'DailyAttendanceSummary')
+    doublons = DailyAttendanceSummary.objects.values('date', 'department_id', 'site_id').annotate(
+        nombre=Count('id'), **{f'total_{champ}': Sum(champ) for champ in CHAMPS}
+    ).filter(nombre__gt=1).order_by()
+    for groupe in list(doublons):
+        lignes = DailyAttendanceSummary.objects.filter(
+            date=groupe['date'], department_id=groupe['department_id'], site_id=groupe['site_id']
+        ).order_by('id')
+        conservee = lignes.first()
+        lignes.exclude(id=conservee.id).delete()
+        DailyAttendanceSummary.objects.filter(id=conservee.id).update(
+            **{champ: groupe[f'total_{champ}'] for champ in CHAMPS}
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_userpermission'),
+        ('gestion_Horraire', '0010_timesheet'),
+    ]
+
+    operations = [
+        migrations.RunPython(fusionner_doublons, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='dailyattendancesummary',
+            constraint=models.UniqueConstraint(models.F('date'), django.db.models.functions.comparison.Coalesce('department', models.Value(0)), django.db.models.functions.comparison.Coalesce('site', models.Value(0)), name='resume_presence_unique'),
+        ),
+    ]
@@ -1,8 +1,26 @@
-from django.db import models
+from django.db import models, connections, router, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce
 from django.core.exceptions import ValidationError
+from django.dispatch import Signal
 from django.utils import timezone
+from collections import Counter, defaultdict
 from datetime import timedelta
-from accounts.models import CustomUser
+from accounts.models import CustomUser, Department, Site
+
+HEURE_LIMITE_DEFAUT = timezone.datetime.strptime("09:00", "%H:%M").time()
+
+# Cache des paramètres horaires, partagé par tout le processus.
+# Vidé par les signaux post_save / post_delete (voir signals.py).
+_parametres_cache = {}
+
+# Envoyé après chaque modification du résumé journalier des présences ;
+# argument `dates` : ensemble des jours modifiés (None = tout l'historique)
+resume_presence_modifie = Signal()
+
+def employes_actifs():
+    """Utilisateurs actifs dont le profil RH (s'il existe) n'est pas désactivé"""
+    return CustomUser.objects.filter(is_active=True).exclude(employee_profile__is_active=False)
 
 def default_jours_travailles():
     return {"1": True, "2": True, "3": True, "4": True, "5": True, "6": False, "7": False}
@@ -27,6 +45,91 @@ class PointageManager(models.Manager):
         """Retourne uniquement les employés présents"""
         return self.filter(status='PRESENT')
 
+    def pointer_arrivee(self, employe, jour, heure, status):
+        """
+        Enregistre l'arrivée : INSERT ... ON CONFLICT (employe, date) DO NOTHING,
+        puis, si la ligne existe déjà (ABSENT de la clôture, CONGE...), lecture
+        verrouillée de son statut et UPDATE gardé. L'INSERT prend le verrou
+        d'écriture (SQLite) et le SELECT FOR UPDATE celui de la ligne (PostgreSQL) :
+        le statut remplacé, retiré du résumé, ne peut pas changer avant le commit.
+        Une heure d'arrivée déjà enregistrée n'est jamais écrasée, un nouvel essai
+        du client est donc sans effet. Retourne True si la ligne a été créée ou modifiée.
+        """
+        connection = connections[router.db_for_write(self.model)]
+        meta = self.model._meta
+        qn = connection.ops.quote_name
+        now = timezone.now()
+        valeurs = {
+            'employe': employe.pk,
+            'date': jour,
+            'heure_arrivee': heure,
+            'heure_depart': None,
+            'status': status,
+            'commentaire': None,
+            'duree_travail_minutes': 0,
+            'created_at': now,
+            'updated_at': now,
+        }
+        colonnes, params = [], []
+        for nom, valeur in valeurs.items():
+            field = meta.get_field(nom)
+            colonnes.append(field.column)
+            params.append(field.get_db_prep_save(valeur, connection))
+
+        unicite = ', '.join(qn(meta.get_field(nom).column) for nom in ('employe', 'date'))
+        sql = (
+            f"INSERT INTO {qn(meta.db_table)} ({', '.join(qn(c) for c in colonnes)}) "
+            f"VALUES ({', '.join(['%s'] * len(colonnes))}) "
+            f"ON CONFLICT ({unicite}) DO NOTHING"
+        )
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+                cree = cursor.rowcount == 1
+            ancien_status = None
+            if not cree:
+                existant = (
+                    self.using(connection.alias).select_for_update()
+                    .filter(employe=employe, date=jour).values_list('id', 'status', 'heure_arrivee').first()
+                )
+                if existant is None or existant[2] is not None:
+                    return False
+                pk, ancien_status, _ = existant
+                if not self.using(connection.alias).filter(pk=pk, heure_arrivee__isnull=True).update(
+                    heure_arrivee=heure, status=status, updated_at=now,
+                ):
+                    return False
+            # Pas de signal post_save sur ces requêtes : mise à jour explicite du résumé
+            variations = Counter({(jour, employe.department_id, employe.site_id, status): 1})
+            if ancien_status:
+                variations[(jour, employe.department_id, employe.site_id, ancien_status)] -= 1
+            DailyAttendanceSummary.objects.appliquer(variations)
+            return True
+
+    def pointer_depart(self, pointage, heure, params=None):
+        """
+        Enregistre le départ par un UPDATE conditionnel : sans effet si le départ
+        est déjà pointé. Retourne True si la ligne a été modifiée.
+        """
+        ancien_status = pointage.status
+        pointage.heure_depart = heure
+        pointage.calculer_statut(params)
+        with transaction.atomic():
+            modifie = self.filter(pk=pointage.pk, heure_depart__isnull=True).update(
+                heure_depart=heure,
+                status=pointage.status,
+                duree_travail_minutes=pointage.duree_travail_minutes,
+                updated_at=timezone.now(),
+            ) == 1
+            if modifie and pointage.status != ancien_status:
+                employe = pointage.employe
+                DailyAttendanceSummary.objects.appliquer(Counter({
+                    (pointage.date, employe.department_id, employe.site_id, ancien_status): -1,
+                    (pointage.date, employe.department_id, employe.site_id, pointage.status): 1,
+                }))
+        pointage._status_initial = pointage.status
+        return modifie
+
 
 # =============================================================================
 # Modèle de PointageHoraire
@@ -45,7 +148,8 @@ class PointageHoraire(models.Model):
         related_name='pointages',
         verbose_name="Employé"
     )
-    date = models.DateField(auto_now_add=True, verbose_name="Date de pointage")
+    # Pas de auto_now_add : les terminaux de badge envoient des pointages de jours passés
+    date = models.DateField(default=timezone.localdate, editable=False, verbose_name="Date de pointage")
     heure_arrivee = models.TimeField(null=True, blank=True, verbose_name="Heure d'arrivée")
     heure_depart = models.TimeField(null=True, blank=True, verbose_name="Heure de départ")
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='ABSENT', verbose_name="Statut")
@@ -70,26 +174,38 @@ class PointageHoraire(models.Model):
             models.Index(fields=['status']),
         ]
 
+    # Champs dont la modification déclenche le recalcul du statut et de la durée
+    CHAMPS_HORAIRES = ('heure_arrivee', 'heure_depart')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._heures_initiales = instance._get_heures()
+        instance._status_initial = instance.__dict__.get('status')
+        return instance
+
+    def _get_heures(self):
+        # Lecture via __dict__ pour ne pas charger un champ différé
+        return tuple(self.__dict__.get(champ, models.DEFERRED) for champ in self.CHAMPS_HORAIRES)
+
+    def _verifier_heures(self):
+        """Vérifie la cohérence des heures (sans requête)"""
+        if self.heure_arrivee and self.heure_depart:
+            if self.heure_depart < self.heure_arrivee:
+                raise ValidationError("L'heure de départ doit être après l'heure d'arrivée.")
+
     def clean(self):
         super().clean()
         # Vérifier qu'un seul pointage existe par jour
         if PointageHoraire.objects.filter(employe=self.employe, date=self.date).exclude(pk=self.pk).exists():
             raise ValidationError("Un pointage existe déjà pour cet employé à cette date.")
         # Vérifier cohérence des heures
-        if self.heure_arrivee and self.heure_depart:
-            if self.heure_depart < self.heure_arrivee:
-                raise ValidationError("L'heure de départ doit être après l'heure d'arrivée.")
+        self._verifier_heures()
 
-    def save(self, *args, **kwargs):
-        # Éviter les imports circulaires
-        try:
-            from .models import ParametresHoraires
-            params = ParametresHoraires.objects.first()
-            heure_limite = params.heure_debut_standard if params else timezone.datetime.strptime("09:00", "%H:%M").time()
-            pause_dejeuner = params.temps_pause_dejeuner if params else 60
-        except:
-            heure_limite = timezone.datetime.strptime("09:00", "%H:%M").time()
-            pause_dejeuner = 60
+    def calculer_statut(self, params=None):
+        """Recalcule le statut et la durée de travail à partir des heures pointées"""
+        heure_limite = params.heure_debut_standard if params else HEURE_LIMITE_DEFAUT
+        pause_dejeuner = params.temps_pause_dejeuner if params else 60
 
         # Mise à jour automatique du statut
         if self.heure_depart:
@@ -109,8 +225,9 @@ class PointageHoraire(models.Model):
 
         # Calcul automatique de la durée de travail
         if self.heure_arrivee and self.heure_depart:
-            arrivee_dt = timezone.datetime.combine(self.date, self.heure_arrivee)
-            depart_dt = timezone.datetime.combine(self.date, self.heure_depart)
+            jour = self.date or timezone.localdate()
+            arrivee_dt = timezone.datetime.combine(jour, self.heure_arrivee)
+            depart_dt = timezone.datetime.combine(jour, self.heure_depart)
             
             if depart_dt < arrivee_dt:
                 depart_dt += timezone.timedelta(days=1)
@@ -124,8 +241,37 @@ class PointageHoraire(models.Model):
         else:
             self.duree_travail_minutes = 0
 
-        self.full_clean()
+    def save(self, *args, **kwargs):
+        """
+        Sauvegarde rapide : l'unicité (employe, date) est garantie par la contrainte
+        en base, on ne relance donc ni validate_unique() ni la requête de clean().
+        Le statut et la durée ne sont recalculés que si les heures ont changé.
+        """
+        update_fields = kwargs.get('update_fields')
+        heures = self._get_heures()
+        heures_modifiees = self._state.adding or heures != getattr(self, '_heures_initiales', None)
+        if update_fields is not None:
+            update_fields = set(update_fields)
+            heures_modifiees = heures_modifiees and bool(update_fields & set(self.CHAMPS_HORAIRES))
+
+        if heures_modifiees:
+            self.calculer_statut(ParametresHoraires.get_actifs())
+            if update_fields is not None:
+                update_fields |= {'status', 'duree_travail_minutes'}
+
+        # Validation des champs sans requête (la FK employe est vérifiée par la base)
+        differes = self.get_deferred_fields()
+        self.clean_fields(exclude=['employe', *differes])
+        if not differes & set(self.CHAMPS_HORAIRES):
+            self._verifier_heures()
+
+        if update_fields is not None:
+            # auto_now n'est appliqué que si le champ figure dans update_fields
+            update_fields.add('updated_at')
+            kwargs['update_fields'] = update_fields
         super().save(*args, **kwargs)
+        self._heures_initiales = self._get_heures()
+        self._status_initial = self.__dict__.get('status')
 
     def get_duree_travail(self):
         """Retourne la durée travaillée en timedelta"""
@@ -143,20 +289,136 @@ class PointageHoraire(models.Model):
 
     def est_en_retard(self):
         """Retourne True si l'employé est en retard selon la configuration"""
-        # Importer ici pour éviter les imports circulaires
-        try:
-            from .models import ParametresHoraires
-            params = ParametresHoraires.objects.first()
-            heure_limite = params.heure_debut_standard if params else timezone.datetime.strptime("09:00", "%H:%M").time()
-        except:
-            # En cas d'erreur, utiliser une valeur par défaut
-            heure_limite = timezone.datetime.strptime("09:00", "%H:%M").time()
+        params = ParametresHoraires.get_actifs()
+        heure_limite = params.heure_debut_standard if params else HEURE_LIMITE_DEFAUT
         return self.heure_arrivee and self.heure_arrivee > heure_limite
 
     def __str__(self):
         return f"{self.employe.username} - {self.date} ({self.get_status_display()})"
 
 
+# =============================================================================
+# Résumé journalier des présences (tableau de bord RH)
+# =============================================================================
+class ResumePresenceManager(models.Manager):
+    # Compteur du résumé correspondant à chaque statut de pointage
+    CHAMPS_STATUTS = {
+        'PRESENT': 'presents',
+        'ABSENT': 'absents',
+        'RETARD': 'retards',
+        'CONGE': 'conges',
+    }
+
+    def appliquer(self, variations):
+        """
+        Applique des variations de compteurs, une requête UPDATE par groupe.
+        variations : {(date, department_id, site_id, status): delta}
+        """
+        groupes = defaultdict(Counter)
+        for (jour, department_id, site_id, status), delta in variations.items():
+            if delta and status in self.CHAMPS_STATUTS:
+                groupes[(jour, department_id, site_id)][self.CHAMPS_STATUTS[status]] += delta
+
+        groupes = {
+            cle: {champ: delta for champ, delta in deltas.items() if delta}
+            for cle, deltas in groupes.items()
+        }
+        groupes = {cle: deltas for cle, deltas in groupes.items() if deltas}
+        with transaction.atomic():
+            # Lignes créées si absentes (la contrainte d'unicité départage deux créations concurrentes),
+            # puis variations par UPDATE dans un ordre fixe
+            self.bulk_create([
+                self.model(date=jour, department_id=department_id, site_id=site_id)
+                for jour, department_id, site_id in groupes
+            ], ignore_conflicts=True)
+            for (jour, department_id, site_id), deltas in sorted(groupes.items(), key=lambda g: tuple(
+                (valeur is None, valeur or 0) for valeur in g[0]
+            )):
+                self.filter(date=jour, department_id=department_id, site_id=site_id).update(
+                    **{champ: F(champ) + delta for champ, delta in deltas.items()}
+                )
+        if groupes:
+            resume_presence_modifie.send(sender=self.model, dates={jour for jour, _, _ in groupes})
+
+    def totaux(self, **filtres):
+        """Somme des compteurs (toutes lignes confondues) pour les filtres donnés"""
+        totaux = self.filter(**filtres).aggregate(
+            **{champ: models.Sum(champ) for champ in self.CHAMPS_STATUTS.values()}
+        )
+        return {champ: valeur or 0 for champ, valeur in totaux.items()}
+
+
+class DailyAttendanceSummary(models.Model):
+    """
+    Compteurs de pointages par jour, département et site, maintenus au fil des
+    enregistrements (signaux et chemins d'écriture en masse). Les tableaux de
+    bord lisent ces lignes au lieu de compter la table des pointages.
+    Réparation : python manage.py reconstruire_resume_presence
+    """
+    date = models.DateField(verbose_name="Date")
+    department = models.ForeignKey(Department, on_delete=models.SET_NULL, null=True, blank=True)
+    site = models.ForeignKey(Site, on_delete=models.SET_NULL, null=True, blank=True)
+    presents = models.IntegerField(default=0, verbose_name="Présents")
+    absents = models.IntegerField(default=0, verbose_name="Absents")
+    retards = models.IntegerField(default=0, verbose_name="En retard")
+    conges = models.IntegerField(default=0, verbose_name="En congé")
+
+    objects = ResumePresenceManager()
+
+    class Meta:
+        verbose_name = "Résumé journalier des présences"
+        verbose_name_plural = "Résumés journaliers des présences"
+        ordering = ['-date']
+        indexes = [
+            models.Index(fields=['date', 'department', 'site']),
+        ]
+        constraints = [
+            # Une seule ligne par (jour, département, site), « sans département/site » compris
+            models.UniqueConstraint(
+                F('date'), Coalesce('department', Value(0)), Coalesce('site', Value(0)),
+                name='resume_presence_unique',
+            ),
+        ]
+
+    @property
+    def total(self):
+        return self.presents + self.absents + self.retards + self.conges
+
+    def __str__(self):
+        return f"{self.date} - {self.department or 'Sans département'} / {self.site or 'Sans site'}"
+
+
+# =============================================================================
+# Feuilles de temps mensuelles (calculées par feuilles_temps.py)
+# =============================================================================
+class Timesheet(models.Model):
+    employe = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='feuilles_temps', verbose_name="Employé")
+    periode = models.DateField(verbose_name="Mois", help_text="Premier jour du mois")
+    jours_ouvres = models.PositiveIntegerField(default=0, verbose_name="Jours ouvrés")
+    jours_presents = models.PositiveIntegerField(default=0, verbose_name="Jours de présence")
+    minutes_travaillees = models.PositiveIntegerField(default=0, verbose_name="Minutes travaillées")
+    jours_retard = models.PositiveIntegerField(default=0, verbose_name="Jours de retard")
+    minutes_retard = models.PositiveIntegerField(default=0, verbose_name="Minutes de retard")
+    jours_absence = models.PositiveIntegerField(default=0, verbose_name="Jours d'absence")
+    jours_conge = models.PositiveIntegerField(default=0, verbose_name="Jours de congé")
+    minutes_supplementaires = models.PositiveIntegerField(default=0, verbose_name="Heures supplémentaires (minutes)")
+    calcule_le = models.DateTimeField(default=timezone.now, verbose_name="Calculé le")
+
+    class Meta:
+        verbose_name = "Feuille de temps"
+        verbose_name_plural = "Feuilles de temps"
+        ordering = ['-periode', 'employe']
+        unique_together = ['employe', 'periode']
+
+    def __str__(self):
+        return f"{self.employe.username} - {self.periode:%m/%Y}"
+
+    def get_temps_travail_formate(self):
+        """Retourne le temps travaillé du mois formaté en heures et minutes"""
+        heures, minutes = divmod(self.minutes_travaillees, 60)
+        return f"{heures}h{minutes:02d}"
+
+
 # =============================================================================
 # Logs de Connexion
 # =============================================================================
@@ -170,7 +432,8 @@ class LogConnexion(models.Model):
     ]
 
     employe = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, related_name='logs_connexion')
-    date_heure = models.DateTimeField(auto_now_add=True)
+    # Horodaté à l'émission de l'événement, pas à l'écriture différée du lot (voir audit.py)
+    date_heure = models.DateTimeField(default=timezone.now, editable=False)
     ip = models.GenericIPAddressField(null=True, blank=True)
     device = models.CharField(max_length=255, null=True, blank=True)
     type_action = models.CharField(max_length=50, choices=TYPE_CHOICES)
@@ -185,12 +448,47 @@ class LogConnexion(models.Model):
         indexes = [
             models.Index(fields=['employe', 'date_heure']),
             models.Index(fields=['type_action']),
+            models.Index(fields=['date_heure']),
+            models.Index(fields=['success', 'date_heure']),
         ]
 
     def __str__(self):
         return f"{self.employe.username if self.employe else 'Inconnu'} - {self.date_heure:%Y-%m-%d %H:%M:%S} - {self.get_type_action_display()}"
 
 
+# =============================================================================
+# Pointages reçus des terminaux (badgeuses, tablettes) — clés d'idempotence
+# =============================================================================
+class PointageTerminal(models.Model):
+    ACTION_CHOICES = [
+        ('arrivee', 'Arrivée'),
+        ('depart', 'Départ'),
+    ]
+
+    RESULTAT_CHOICES = [
+        ('APPLIQUE', 'Appliqué'),
+        ('IGNORE', 'Ignoré'),
+        ('REJETE', 'Rejeté'),
+    ]
+
+    cle = models.CharField(max_length=100, unique=True, verbose_name="Clé d'idempotence")
+    employe = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='pointages_terminal')
+    horodatage = models.DateTimeField(verbose_name="Horodatage du pointage")
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    device = models.CharField(max_length=255, null=True, blank=True)
+    resultat = models.CharField(max_length=10, choices=RESULTAT_CHOICES)
+    erreur = models.CharField(max_length=255, null=True, blank=True)
+    recu_le = models.DateTimeField(auto_now_add=True, verbose_name="Reçu le")
+
+    class Meta:
+        verbose_name = "Pointage terminal"
+        verbose_name_plural = "Pointages terminaux"
+        ordering = ['-horodatage']
+
+    def __str__(self):
+        return f"{self.cle} - {self.get_action_display()} ({self.get_resultat_display()})"
+
+
 # =============================================================================
 # Paramètres des horaires
 # =============================================================================
@@ -211,6 +509,23 @@ class ParametresHoraires(models.Model):
     def __str__(self):
         return f"Config horaire ({self.heure_debut_standard:%H:%M}-{self.heure_fin_standard:%H:%M})"
 
+    @classmethod
+    def get_actifs(cls, creer=False):
+        """Retourne les paramètres actifs depuis le cache du processus (une requête au plus)"""
+        if 'actifs' not in _parametres_cache:
+            _parametres_cache['actifs'] = cls.objects.first()
+        params = _parametres_cache['actifs']
+        if params is None and creer:
+            # post_save vide le cache : on le remplit après la création
+            params = cls.objects.create()
+            _parametres_cache['actifs'] = params
+        return params
+
+    @staticmethod
+    def invalider_cache():
+        """Vide le cache des paramètres (appelé par les signaux)"""
+        _parametres_cache.clear()
+
     def est_jour_travaille(self, date):
         """Vérifie si le jour donné est un jour travaillé"""
         return self.jours_travailles.get(str(date.isoweekday()), False)
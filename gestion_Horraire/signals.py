@@ -0,0 +1,130 @@
+from collections import Counter
+from django.contrib.auth.signals import user_logged_in, user_logged_out, user_login_failed
+from django.db.models import Count
+from django.db.models.signals import post_save, post_delete, pre_save, pre_delete
+from django.dispatch import receiver
+from accounts.models import CustomUser, Department, Site
+from .models import ParametresHoraires, PointageHoraire, DailyAttendanceSummary
+from .audit import journal_audit, get_client_ip
+
+
+# =============================================================================
+# Invalidation du cache des paramètres horaires
+# =============================================================================
+@receiver(post_save, sender=ParametresHoraires)
+@receiver(post_delete, sender=ParametresHoraires)
+def invalider_parametres_horaires(sender, **kwargs):
+    ParametresHoraires.invalider_cache()
+
+
+# =============================================================================
+# Mise à jour incrémentale du résumé journalier des présences
+# =============================================================================
+@receiver(post_save, sender=PointageHoraire)
+def resume_pointage_enregistre(sender, instance, created, **kwargs):
+    if 'status' in instance.get_deferred_fields():
+        return
+    ancien_status = None if created else getattr(instance, '_status_initial', None)
+    if ancien_status == instance.status:
+        return
+    employe = instance.employe
+    variations = Counter({(instance.date, employe.department_id, employe.site_id, instance.status): 1})
+    if ancien_status:
+        variations[(instance.date, employe.department_id, employe.site_id, ancien_status)] -= 1
+    DailyAttendanceSummary.objects.appliquer(variations)
+
+
+@receiver(post_delete, sender=PointageHoraire)
+def resume_pointage_supprime(sender, instance, **kwargs):
+    employe = instance.employe
+    DailyAttendanceSummary.objects.appliquer(Counter({
+        (instance.date, employe.department_id, employe.site_id, instance.status): -1,
+    }))
+
+
+# Les lignes du résumé suivent l'affectation actuelle de l'employé (comme
+# reconstruire_resume_presence) : une mutation déplace ses pointages d'une ligne à l'autre
+@receiver(pre_save, sender=CustomUser)
+def affectation_avant_enregistrement(sender, instance, update_fields=None, **kwargs):
+    instance._affectation_initiale = None
+    if instance.pk is None:
+        return
+    # Enregistrement partiel sans département ni site (ex. last_login à la connexion) : rien à relire
+    if update_fields is not None and not {'department', 'department_id', 'site', 'site_id'} & set(update_fields):
+        return
+    instance._affectation_initiale = CustomUser.objects.filter(pk=instance.pk).values_list(
+        'department_id', 'site_id'
+    ).first()
+
+
+@receiver(post_save, sender=CustomUser)
+def resume_affectation_modifiee(sender, instance, created, **kwargs):
+    ancienne = getattr(instance, '_affectation_initiale', None)
+    nouvelle = (instance.department_id, instance.site_id)
+    if created or ancienne is None or ancienne == nouvelle:
+        return
+    variations = Counter()
+    for jour, status, nombre in PointageHoraire.objects.filter(employe=instance).values(
+        'date', 'status'
+    ).annotate(nombre=Count('id')).values_list('date', 'status', 'nombre').order_by():
+        variations[(jour, *ancienne, status)] -= nombre
+        variations[(jour, *nouvelle, status)] += nombre
+    DailyAttendanceSummary.objects.appliquer(variations)
+
+
+def _fusionner_resumes(lignes, **affectation):
+    """Reporte les lignes données sur l'affectation de remplacement (department_id / site_id) puis les supprime"""
+    variations = Counter()
+    for ligne in lignes:
+        cle = (ligne.date, affectation.get('department_id', ligne.department_id), affectation.get('site_id', ligne.site_id))
+        for status, champ in DailyAttendanceSummary.objects.CHAMPS_STATUTS.items():
+            variations[(*cle, status)] += getattr(ligne, champ)
+    lignes.delete()
+    DailyAttendanceSummary.objects.appliquer(variations)
+
+
+# Suppression d'un département ou d'un site : ses employés passent « sans département / site »
+# (SET_NULL) ; les lignes du résumé sont fusionnées avec celles sans affectation
+@receiver(pre_delete, sender=Department)
+def resume_departement_supprime(sender, instance, **kwargs):
+    _fusionner_resumes(DailyAttendanceSummary.objects.filter(department=instance), department_id=None)
+
+
+@receiver(pre_delete, sender=Site)
+def resume_site_supprime(sender, instance, **kwargs):
+    _fusionner_resumes(DailyAttendanceSummary.objects.filter(site=instance), site_id=None)
+
+
+# =============================================================================
+# Journal des connexions (via l'écriture tamponnée de audit.py)
+# =============================================================================
+def _contexte_requete(request):
+    if request is None:
+        return {}
+    return {'ip': get_client_ip(request), 'device': request.META.get('HTTP_USER_AGENT')}
+
+
+@receiver(user_logged_in)
+def journal_connexion(sender, request, user, **kwargs):
+    journal_audit.enregistrer(employe_id=user.pk, type_action='LOGIN', **_contexte_requete(request))
+
+
+@receiver(user_logged_out)
+def journal_deconnexion(sender, request, user, **kwargs):
+    journal_audit.enregistrer(
+        employe_id=user.pk if user is not None else None,
+        type_action='LOGOUT',
+        **_contexte_requete(request)
+    )
+
+
+@receiver(user_login_failed)
+def journal_echec_connexion(sender, credentials, request=None, **kwargs):
+    # Pas de recherche de l'utilisateur : le nom saisi suffit et évite une requête
+    journal_audit.enregistrer(
+        type_action='FAILED',
+        success=False,
+        error="Identifiants invalides",
+        details={'username': credentials.get('username')},
+        **_contexte_requete(request)
+    )
@@ -0,0 +1,232 @@
+"""
+Synchronisation par lots des pointages envoyés par les terminaux (badgeuses,
+tablettes kiosque) qui ont mis leurs pointages en mémoire hors connexion.
+
+Chaque pointage porte une clé d'idempotence fournie par le terminal : un lot
+renvoyé après une coupure réseau n'est jamais appliqué deux fois, même quand
+deux envois du même lot se croisent (clés réservées dans la transaction).
+Les règles sont celles de la vue pointage_employe ; les écritures se font par
+bulk_create / bulk_update et non par un save() par ligne.
+"""
+import uuid
+from collections import Counter
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from accounts.models import CustomUser
+from rh.models import EmployeeProfile, ActivityEvent
+from .models import PointageHoraire, PointageTerminal, LogConnexion, ParametresHoraires, DailyAttendanceSummary
+
+TAILLE_MAX_LOT = 1000
+# Statut provisoire d'une ligne créée par la synchronisation, jamais visible hors de sa transaction
+STATUT_RESERVE = ''
+
+
+def _resoudre_employes(identifiants):
+    """Associe matricule ou nom d'utilisateur -> id employé (deux requêtes au total)"""
+    employes = dict(
+        EmployeeProfile.objects.filter(employee_id__in=identifiants).values_list('employee_id', 'user_id')
+    )
+    restants = set(identifiants) - set(employes)
+    if restants:
+        employes.update(CustomUser.objects.filter(username__in=restants).values_list('username', 'id'))
+    return employes
+
+
+def _lire_pointage(brut):
+    """Valide un pointage brut et retourne (cle, employe, horodatage local, action, device)"""
+    cle = str(brut.get('cle') or '').strip()
+    if not cle:
+        raise ValueError("Clé d'idempotence manquante.")
+    horodatage = parse_datetime(str(brut.get('horodatage') or ''))
+    if horodatage is None:
+        raise ValueError("Horodatage invalide.")
+    if timezone.is_naive(horodatage):
+        horodatage = timezone.make_aware(horodatage)
+    action = brut.get('action')
+    if action not in dict(PointageTerminal.ACTION_CHOICES):
+        raise ValueError("Action de pointage inconnue.")
+    return cle, str(brut.get('employe') or ''), timezone.localtime(horodatage), action, brut.get('device')
+
+
+def synchroniser_pointages(pointages_bruts, ip=None):
+    """
+    Applique un lot de pointages de terminaux.
+
+    pointages_bruts : liste de dicts {cle, employe (matricule ou username),
+    horodatage (ISO 8601), action ('arrivee' | 'depart'), device}.
+    Retourne la liste des résultats, dans l'ordre du lot : {cle, resultat, erreur}.
+    """
+    if len(pointages_bruts) > TAILLE_MAX_LOT:
+        raise ValueError(f"Lot trop volumineux (maximum {TAILLE_MAX_LOT} pointages).")
+
+    parametres = ParametresHoraires.get_actifs(creer=True)
+    resultats = {}
+    valides = []
+    vus = set()
+    for index, brut in enumerate(pointages_bruts):
+        try:
+            cle, identifiant, horodatage, action, device = _lire_pointage(brut)
+        except (ValueError, AttributeError) as e:
+            cle = str(brut.get('cle', index)) if isinstance(brut, dict) else str(index)
+            resultats[index] = {'cle': cle, 'resultat': 'REJETE', 'erreur': str(e)}
+            continue
+        if cle in vus:
+            resultats[index] = {'cle': cle, 'resultat': 'IGNORE', 'erreur': "Clé en double dans le lot."}
+            continue
+        vus.add(cle)
+        valides.append((index, cle, identifiant, horodatage, action, device))
+
+    employes = _resoudre_employes({v[2] for v in valides})
+    maintenant = timezone.now()
+
+    with transaction.atomic():
+        # Réservation des clés dans la transaction : un envoi concurrent du même lot
+        # bute sur la contrainte d'unicité (ignorée) au lieu d'échouer ; seules les
+        # lignes réellement insérées ici, reconnues à leur jeton, sont traitées.
+        jeton = f"reservation:{uuid.uuid4().hex}"
+        PointageTerminal.objects.bulk_create([
+            PointageTerminal(cle=cle, horodatage=horodatage, action=action, device=device, resultat='IGNORE', erreur=jeton)
+            for index, cle, identifiant, horodatage, action, device in valides
+        ], batch_size=TAILLE_MAX_LOT, ignore_conflicts=True)
+        reservees = dict(PointageTerminal.objects.filter(cle__in=vus, erreur=jeton).values_list('cle', 'id'))
+
+        a_appliquer = []
+        for index, cle, identifiant, horodatage, action, device in valides:
+            if cle not in reservees:
+                resultats[index] = {'cle': cle, 'resultat': 'IGNORE', 'erreur': "Pointage déjà synchronisé."}
+            elif identifiant not in employes:
+                resultats[index] = {'cle': cle, 'resultat': 'REJETE', 'erreur': "Employé inconnu."}
+            else:
+                a_appliquer.append((index, cle, employes[identifiant], horodatage, action, device))
+
+        # Lignes des jours concernés : créées vides si absentes (sans écraser une ligne créée
+        # entre-temps par la page de pointage), puis verrouillées et relues
+        a_appliquer.sort(key=lambda p: p[3])
+        couples = {(p[2], p[3].date()) for p in a_appliquer}
+        pointages = {}
+        if couples:
+            PointageHoraire.objects.bulk_create([
+                PointageHoraire(employe_id=employe_id, date=jour, status=STATUT_RESERVE, created_at=maintenant, updated_at=maintenant)
+                for employe_id, jour in couples
+            ], batch_size=TAILLE_MAX_LOT, ignore_conflicts=True)
+            existants = PointageHoraire.objects.select_for_update().filter(
+                employe_id__in={c[0] for c in couples},
+                date__in={c[1] for c in couples},
+            )
+            pointages = {(p.employe_id, p.date): p for p in existants if (p.employe_id, p.date) in couples}
+
+        modifies = {}
+        logs, traces, activites = [], [], []
+        for index, cle, employe_id, horodatage, action, device in a_appliquer:
+            jour, heure = horodatage.date(), horodatage.time()
+            pointage = pointages[(employe_id, jour)]
+            erreur, details = None, {'horodatage': horodatage.isoformat(), 'cle': cle}
+
+            if not parametres.est_jour_travaille(jour):
+                erreur = "Impossible de pointer un jour non travaillé."
+            elif action == 'arrivee':
+                if pointage.heure_arrivee:
+                    erreur = "Arrivée déjà pointée."
+                elif heure >= parametres.heure_fin_standard:
+                    erreur = "Arrivée après l'heure de fin"
+                    details.update({
+                        'heure_tentative': heure.strftime('%H:%M:%S'),
+                        'heure_fin_standard': parametres.heure_fin_standard.strftime('%H:%M:%S')
+                    })
+                else:
+                    retard_minutes = parametres.calculer_retard(heure)
+                    pointage.heure_arrivee = heure
+                    pointage.calculer_statut(parametres)
+                    details.update({
+                        'retard_minutes': retard_minutes if retard_minutes > 0 else None,
+                        'heure_exacte': heure.strftime('%H:%M:%S')
+                    })
+            else:
+                if not pointage.heure_arrivee:
+                    erreur = "Vous devez d'abord pointer votre arrivée."
+                elif pointage.heure_depart:
+                    erreur = "Départ déjà pointé."
+                elif heure <= pointage.heure_arrivee:
+                    erreur = "L'heure de départ doit être après l'heure d'arrivée."
+                else:
+                    pointage.heure_depart = heure
+                    pointage.calculer_statut(parametres)
+                    details.update({
+                        'temps_travail': pointage.get_temps_travail_formate(),
+                        'heure_exacte': heure.strftime('%H:%M:%S'),
+                        'statut_final': pointage.status
+                    })
+
+            if erreur is None:
+                modifies[(employe_id, jour)] = pointage
+                activites.append((employe_id, horodatage, action, pointage))
+            if erreur is None or 'heure_tentative' in details:
+                logs.append(LogConnexion(
+                    employe_id=employe_id,
+                    type_action='POINTAGE_ARRIVEE' if action == 'arrivee' else 'POINTAGE_DEPART',
+                    ip=ip,
+                    device=device,
+                    success=erreur is None,
+                    error=erreur,
+                    details=details,
+                ))
+            resultat = 'APPLIQUE' if erreur is None else 'REJETE'
+            resultats[index] = {'cle': cle, 'resultat': resultat, 'erreur': erreur}
+            traces.append(PointageTerminal(
+                id=reservees[cle], cle=cle, employe_id=employe_id, horodatage=horodatage, action=action,
+                device=device, resultat=resultat, erreur=erreur,
+            ))
+
+        # Clés rejetées (employé inconnu) : aussi mémorisées pour ne pas les rejouer
+        for index, cle, identifiant, horodatage, action, device in valides:
+            if cle in reservees and identifiant not in employes:
+                traces.append(PointageTerminal(
+                    id=reservees[cle], cle=cle, horodatage=horodatage, action=action, device=device,
+                    resultat='REJETE', erreur=resultats[index]['erreur'],
+                ))
+
+        # Variations du résumé journalier (bulk_update n'émet pas de signaux), à partir
+        # des statuts lus sous verrou ; une ligne réservée ici n'était pas comptée
+        variations = Counter()
+        ecrits = list(modifies.values())
+        evenements = []
+        if ecrits:
+            employes_ecrits = CustomUser.objects.only('id', 'department_id', 'site_id').in_bulk(
+                {p.employe_id for p in ecrits}
+            )
+            affectations = {
+                id_: (employe.department_id, employe.site_id) for id_, employe in employes_ecrits.items()
+            }
+            for pointage in ecrits:
+                department_id, site_id = affectations[pointage.employe_id]
+                ancien_status = getattr(pointage, '_status_initial', None)
+                if ancien_status != pointage.status:
+                    variations[(pointage.date, department_id, site_id, pointage.status)] += 1
+                    if ancien_status and ancien_status != STATUT_RESERVE:
+                        variations[(pointage.date, department_id, site_id, ancien_status)] -= 1
+            # Fil d'activité RH, à l'heure réelle du pointage sur le terminal
+            for employe_id, horodatage, action, pointage in activites:
+                evenements.append(ActivityEvent.objects.construire(
+                    employes_ecrits[employe_id], 'pointage',
+                    'Pointage arrivée' if action == 'arrivee' else 'Pointage départ',
+                    pointage.status, timestamp=horodatage,
+                ))
+
+        if modifies:
+            for pointage in modifies.values():
+                pointage.updated_at = maintenant
+            PointageHoraire.objects.bulk_update(
+                modifies.values(),
+                ['heure_arrivee', 'heure_depart', 'status', 'duree_travail_minutes', 'updated_at'],
+            )
+        # Lignes réservées pour des pointages tous rejetés : retirées
+        PointageHoraire.objects.filter(
+            id__in=[p.id for cle_jour, p in pointages.items() if p.status == STATUT_RESERVE and cle_jour not in modifies]
+        ).delete()
+        DailyAttendanceSummary.objects.appliquer(variations)
+        LogConnexion.objects.bulk_create(logs)
+        ActivityEvent.objects.bulk_create(evenements)
+        PointageTerminal.objects.bulk_update(traces, ['employe', 'horodatage', 'action', 'device', 'resultat', 'erreur'])
+
+    return [resultats[index] for index in sorted(resultats)]
@@ -1,3 +1,287 @@
-from django.test import TestCase
+import tempfile
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import CustomUser, Department
+from . import conges
+from .synchro import synchroniser_pointages
+from .archives import archiver_logs, rechercher_logs
+from .models import DailyAttendanceSummary, LogConnexion, ParametresHoraires, PointageHoraire
+
+LUNDI = date(2024, 1, 1)
+MARDI = date(2024, 1, 2)
+MERCREDI = date(2024, 1, 3)
+
+
+def compter_pointages(jour):
+    """Compteurs attendus du résumé, recomptés depuis la table des pointages"""
+    champs = DailyAttendanceSummary.objects.CHAMPS_STATUTS
+    compteurs = Counter(PointageHoraire.objects.filter(date=jour).values_list('status', flat=True))
+    return {champ: compteurs[status] for status, champ in champs.items()}
+
+
+class EmployesMixin:
+    def setUp(self):
+        self.departement = Department.objects.create(name="Production", code='PROD')
+        self.employe = CustomUser.objects.create_user('employe', password='x', department=self.departement)
+
+
+# =============================================================================
+# Report des congés dans les pointages
+# =============================================================================
+class PoserCongesTests(EmployesMixin, TestCase):
+    def test_absence_et_jour_sans_ligne_passent_en_conge(self):
+        PointageHoraire.objects.create(employe=self.employe, date=LUNDI, status='ABSENT')
+        PointageHoraire.objects.create(employe=self.employe, date=MARDI, heure_arrivee=time(8, 30))
+
+        poses = conges.poser_conges({self.employe.pk: {LUNDI, MARDI, MERCREDI}})
+
+        self.assertEqual(poses, 2)
+        statuts = dict(PointageHoraire.objects.values_list('date', 'status'))
+        self.assertEqual(statuts, {LUNDI: 'CONGE', MARDI: 'PRESENT', MERCREDI: 'CONGE'})
+        self.assertFalse(PointageHoraire.objects.filter(commentaire__startswith='conge:').exists())
+        for jour in (LUNDI, MARDI, MERCREDI):
+            self.assertEqual(DailyAttendanceSummary.objects.totaux(date=jour), compter_pointages(jour))
+
+    def test_pointage_arrive_entre_la_lecture_et_l_ecriture(self):
+        absence = PointageHoraire.objects.create(employe=self.employe, date=LUNDI, status='ABSENT')
+        lire = conges._lignes_existantes
+
+        def lecture_puis_pointage(jours_par_employe):
+            existantes = lire(jours_par_employe)
+            # L'employé pointe le lundi et le mardi juste après la lecture
+            absence.heure_arrivee = time(8, 30)
+            absence.save()
+            PointageHoraire.objects.create(employe=self.employe, date=MARDI, heure_arrivee=time(8, 45))
+            return existantes
+
+        with mock.patch.object(conges, '_lignes_existantes', lecture_puis_pointage):
+            poses = conges.poser_conges({self.employe.pk: {LUNDI, MARDI, MERCREDI}})
+
+        self.assertEqual(poses, 1)
+        statuts = dict(PointageHoraire.objects.values_list('date', 'status'))
+        self.assertEqual(statuts, {LUNDI: 'PRESENT', MARDI: 'PRESENT', MERCREDI: 'CONGE'})
+        for jour in (LUNDI, MARDI, MERCREDI):
+            self.assertEqual(DailyAttendanceSummary.objects.totaux(date=jour), compter_pointages(jour))
+
+
+# =============================================================================
+# Pointage d'arrivée (INSERT ... ON CONFLICT puis UPDATE gardé)
+# =============================================================================
+class PointerArriveeTests(EmployesMixin, TestCase):
+    def pointer(self, heure=time(8, 30), status='PRESENT'):
+        return PointageHoraire.objects.pointer_arrivee(self.employe, LUNDI, heure, status)
+
+    def test_creation_puis_rejeu_sans_effet(self):
+        self.assertTrue(self.pointer())
+        self.assertFalse(self.pointer(time(9, 15), 'RETARD'))
+        pointage = PointageHoraire.objects.get(employe=self.employe, date=LUNDI)
+        self.assertEqual((pointage.heure_arrivee, pointage.status), (time(8, 30), 'PRESENT'))
+        self.assertEqual(DailyAttendanceSummary.objects.totaux(date=LUNDI), compter_pointages(LUNDI))
+
+    def test_absence_de_la_cloture_remplacee_et_retiree_du_resume(self):
+        PointageHoraire.objects.create(employe=self.employe, date=LUNDI, status='ABSENT')
+        self.assertTrue(self.pointer(time(9, 15), 'RETARD'))
+        self.assertEqual(PointageHoraire.objects.get(employe=self.employe, date=LUNDI).status, 'RETARD')
+        self.assertEqual(DailyAttendanceSummary.objects.totaux(date=LUNDI), compter_pointages(LUNDI))
+
+    def test_statut_remplace_lu_apres_la_prise_du_verrou(self):
+        # Une lecture avant la première écriture laisserait la clôture changer le statut entre les deux
+        PointageHoraire.objects.create(employe=self.employe, date=LUNDI, status='ABSENT')
+        with CaptureQueriesContext(connection) as requetes:
+            self.pointer()
+        sql = [q['sql'] for q in requetes.captured_queries if 'gestion_horraire_pointagehoraire' in q['sql'].lower()]
+        self.assertTrue(sql[0].startswith('INSERT'))
+        self.assertIn('DO NOTHING', sql[0])
+
+
+class ApiPointageTests(EmployesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        ParametresHoraires.objects.create(jours_travailles={str(jour): True for jour in range(1, 8)})
+        self.addCleanup(ParametresHoraires.invalider_cache)
+        self.client.force_login(self.employe)
+
+    def arrivee(self):
+        return self.client.post(reverse('gestion_Horraire:pointage_api'), {'action': 'arrivee', 'server_time': '08:00:00'})
+
+    def test_log_ecrit_avec_le_pointage(self):
+        # AUDIT_LOG_SYNCHRONE est False : le log ne doit pas attendre le vidage de la file
+        self.assertEqual(self.arrivee().json()['success'], True)
+        self.assertEqual(list(LogConnexion.objects.values_list('type_action', flat=True)), ['POINTAGE_ARRIVEE'])
+        self.assertTrue(self.arrivee().json()['deja_pointe'])
+        self.assertEqual(LogConnexion.objects.count(), 1)
+
+    def test_log_annule_avec_le_pointage(self):
+        with mock.patch('gestion_Horraire.views.ActivityEvent.objects.enregistrer', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.arrivee()
+        self.assertFalse(PointageHoraire.objects.exists())
+        self.assertFalse(LogConnexion.objects.exists())
+
+
+# =============================================================================
+# Résumé journalier (upsert puis UPDATE ... F())
+# =============================================================================
+class ResumePresenceTests(EmployesMixin, TestCase):
+    def test_une_seule_ligne_par_jour_sans_site(self):
+        resume = DailyAttendanceSummary.objects
+        resume.appliquer({(LUNDI, self.departement.pk, None, 'PRESENT'): 2})
+        resume.appliquer({(LUNDI, self.departement.pk, None, 'PRESENT'): -1, (LUNDI, self.departement.pk, None, 'RETARD'): 1})
+        resume.appliquer({(LUNDI, None, None, 'ABSENT'): 1})
+        self.assertEqual(resume.filter(date=LUNDI).count(), 2)
+        totaux = resume.totaux(date=LUNDI)
+        champs = resume.CHAMPS_STATUTS
+        self.assertEqual(
+            (totaux[champs['PRESENT']], totaux[champs['RETARD']], totaux[champs['ABSENT']]), (1, 1, 1)
+        )
+
+
+# =============================================================================
+# Synchronisation des terminaux (clés d'idempotence)
+# =============================================================================
+class SynchroTerminalTests(EmployesMixin, TestCase):
+    def lot(self):
+        return [
+            {'cle': 'k1', 'employe': 'employe', 'horodatage': '2024-01-01T08:00:00', 'action': 'arrivee'},
+            {'cle': 'k2', 'employe': 'employe', 'horodatage': '2024-01-01T17:30:00', 'action': 'depart'},
+            {'cle': 'k3', 'employe': 'inconnu', 'horodatage': '2024-01-01T08:00:00', 'action': 'arrivee'},
+            {'cle': 'k1', 'employe': 'employe', 'horodatage': '2024-01-01T08:05:00', 'action': 'arrivee'},
+            {'employe': 'employe', 'horodatage': '2024-01-01T08:00:00', 'action': 'arrivee'},
+        ]
+
+    def test_lot_rejoue_sans_double_application(self):
+        premier = [resultat['resultat'] for resultat in synchroniser_pointages(self.lot())]
+        self.assertEqual(premier, ['APPLIQUE', 'APPLIQUE', 'REJETE', 'IGNORE', 'REJETE'])
+        pointage = PointageHoraire.objects.get(employe=self.employe, date=LUNDI)
+        self.assertEqual((pointage.heure_arrivee, pointage.heure_depart), (time(8, 0), time(17, 30)))
+
+        rejoue = synchroniser_pointages(self.lot())
+        self.assertEqual([resultat['resultat'] for resultat in rejoue[:3]], ['IGNORE', 'IGNORE', 'IGNORE'])
+        self.assertEqual(LogConnexion.objects.filter(type_action__startswith='POINTAGE').count(), 2)
+        self.assertEqual(DailyAttendanceSummary.objects.totaux(date=LUNDI), compter_pointages(LUNDI))
+
+    def test_absence_de_la_cloture_remplacee_dans_le_resume(self):
+        PointageHoraire.objects.create(employe=self.employe, date=LUNDI, status='ABSENT')
+        synchroniser_pointages(self.lot()[:1])
+        self.assertEqual(PointageHoraire.objects.get(employe=self.employe, date=LUNDI).heure_arrivee, time(8, 0))
+        self.assertEqual(DailyAttendanceSummary.objects.totaux(date=LUNDI), compter_pointages(LUNDI))
+
+    def test_lignes_reservees_retirees_si_tout_est_rejete(self):
+        synchroniser_pointages([
+            {'cle': 'k9', 'employe': 'employe', 'horodatage': '2024-01-01T17:30:00', 'action': 'depart'},
+        ])
+        self.assertFalse(PointageHoraire.objects.exists())
+
+
+# =============================================================================
+# Archive des logs et recherche archives comprises
+# =============================================================================
+class ArchivesLogsTests(EmployesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        dossier = tempfile.TemporaryDirectory()
+        self.addCleanup(dossier.cleanup)
+        reglages = override_settings(LOG_ARCHIVE_DIR=dossier.name)
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+
+    def log(self, jour, heure, type_action='POINTAGE_ARRIVEE', employe=None):
+        return LogConnexion.objects.create(
+            employe=employe or self.employe, type_action=type_action,
+            date_heure=timezone.make_aware(datetime.combine(jour, heure)),
+        )
+
+    def test_logs_archives_retrouves(self):
+        arrivee = self.log(LUNDI, time(8, 30))
+        depart = self.log(LUNDI, time(17, 0), 'POINTAGE_DEPART')
+        self.log(MARDI, time(9, 0), 'LOGIN')
+        recent = self.log(MERCREDI, time(8, 0))
+
+        archives = archiver_logs(avant=timezone.make_aware(datetime.combine(MERCREDI, time.min)))
+
+        self.assertEqual(archives, 3)
+        self.assertEqual(list(LogConnexion.objects.values_list('id', flat=True)), [recent.pk])
+        trouves = rechercher_logs(LUNDI, MERCREDI, employe_id=self.employe.pk)
+        self.assertEqual(len(trouves), 4)
+        self.assertEqual([trouves[0]['id'], trouves[2]['id'], trouves[3]['id']], [recent.pk, depart.pk, arrivee.pk])
+        self.assertEqual(trouves[1]['type_action'], 'LOGIN')
+        self.assertEqual(trouves[-1]['type_action_display'], "Pointage arrivée")
+        pointages = rechercher_logs(LUNDI, LUNDI, type_action=['POINTAGE_ARRIVEE', 'POINTAGE_DEPART'])
+        self.assertEqual([log['id'] for log in pointages], [depart.pk, arrivee.pk])
+
+    def test_limite_et_bornes_ouvertes(self):
+        ids = [self.log(jour, time(8, 0)).pk for jour in (LUNDI, MARDI, MERCREDI)]
+        archiver_logs(avant=timezone.now())
+        self.assertFalse(LogConnexion.objects.exists())
+        self.assertEqual([log['id'] for log in rechercher_logs(limite=2)], ids[:0:-1])
+        self.assertEqual([log['id'] for log in rechercher_logs(debut=MARDI)], ids[:0:-1])
+
+    def test_ligne_archivee_mais_pas_encore_supprimee_non_dupliquee(self):
+        log = self.log(LUNDI, time(8, 0))
+        archiver_logs(avant=timezone.now())
+        # Arrêt entre l'écriture de l'archive et la suppression du lot : la ligne est aux deux endroits
+        log.save(force_insert=True)
+        self.assertEqual([trouve['id'] for trouve in rechercher_logs(LUNDI, LUNDI)], [log.pk])
+
+    def test_historique_affiche_les_pointages_archives(self):
+        self.log(LUNDI, time(8, 30))
+        archiver_logs(avant=timezone.now())
+        self.client.force_login(self.employe)
+        reponse = self.client.get(reverse('gestion_Horraire:historique'), {'date_debut': '2024-01-01'})
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual(len(reponse.context['logs']), 1)
+        self.assertContains(reponse, "Pointage arrivée")
+
+    def test_recherche_archives_dans_l_admin(self):
+        self.log(LUNDI, time(8, 30))
+        autre = CustomUser.objects.create_user('autre', password='x', department=self.departement)
+        self.log(LUNDI, time(9, 0), employe=autre)
+        archiver_logs(avant=timezone.now())
+        admin = CustomUser.objects.create_superuser('admin', password='x')
+        self.client.force_login(admin)
+        url = reverse('admin:gestion_Horraire_logconnexion_rechercher_archives')
+
+        reponse = self.client.get(url, {'debut': '2024-01-01', 'employe': 'autre'})
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual([log['employe'] for log in reponse.context['logs']], [autre])
+
+        reponse = self.client.get(url, {'debut': '01/01/2024'})
+        self.assertIsNone(reponse.context['logs'])
+        self.assertTrue(reponse.context['erreur'])
+
+
+# =============================================================================
+# Pagination par curseur de l'historique
+# =============================================================================
+class HistoriquePaginationTests(EmployesMixin, TestCase):
+    def test_curseur_parcourt_tout_l_historique_sans_doublon(self):
+        from . import views
+        debut = date(2024, 1, 1)
+        for n in range(views.TAILLE_PAGE_HISTORIQUE * 2 + 3):
+            PointageHoraire.objects.create(employe=self.employe, date=debut + timedelta(days=n), status='ABSENT')
+        self.client.force_login(self.employe)
+
+        vus, params = [], {}
+        while True:
+            reponse = self.client.get(reverse('gestion_Horraire:historique'), params)
+            vus += [pointage.pk for pointage in reponse.context['pointages']]
+            if not reponse.context['curseur_suivant']:
+                break
+            params = {'apres': reponse.context['curseur_suivant']}
+
+        attendus = list(PointageHoraire.objects.order_by('-date', '-id').values_list('pk', flat=True))
+        self.assertEqual(vus, attendus)
+
+    def test_curseur_invalide_ignore(self):
+        PointageHoraire.objects.create(employe=self.employe, date=LUNDI, status='ABSENT')
+        self.client.force_login(self.employe)
+        reponse = self.client.get(reverse('gestion_Horraire:historique'), {'apres': 'nimportequoi'})
+        self.assertEqual(len(reponse.context['pointages']), 1)
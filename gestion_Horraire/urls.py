@@ -5,11 +5,14 @@ app_name = 'gestion_Horraire'
 
 urlpatterns_pointage_employe = [
     path('home/', views.pointage_employe, name='pointage_home'),
+    path('api/', views.api_pointage, name='pointage_api'),
+    path('api/synchro/', views.api_synchro_terminal, name='pointage_synchro'),
 ]
 
 urlpatterns = [
     path('', views.index, name='index'),
     path('pointage_employe/', include(urlpatterns_pointage_employe)),
     path('historique/', views.historique, name='historique'),
+    path('historique/api/', views.api_historique, name='historique_api'),
     path('profil/', views.profil, name='profil'),
 ]
\ No newline at end of file
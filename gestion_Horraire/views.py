@@ -2,17 +2,31 @@ from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
 from django.utils import timezone
 from django.contrib import messages
-from .models import PointageHoraire, LogConnexion, ParametresHoraires
+from django.db import transaction
+from django.http import JsonResponse
+from django.views.decorators.http import require_POST
+from django.views.decorators.csrf import csrf_exempt
+from django.conf import settings
+import hmac
+import json
+from rh.models import ActivityEvent
+from .models import PointageHoraire, ParametresHoraires
+from .synchro import synchroniser_pointages
+from .archives import rechercher_logs
+from .audit import journal_audit, get_client_ip
 from datetime import date
 from accounts.decorators import user_is_active
 
-def get_client_ip(request):
-    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-    if x_forwarded_for:
-        ip = x_forwarded_for.split(',')[0]
-    else:
-        ip = request.META.get('REMOTE_ADDR')
-    return ip
+def get_heure_pointage(request, now):
+    """Heure de pointage envoyée par le client (server_time), sinon heure courante"""
+    server_time_str = request.POST.get('server_time')
+    if server_time_str:
+        try:
+            h, m, s = map(int, server_time_str.split(':'))
+            return now.replace(hour=h, minute=m, second=s).time()
+        except (ValueError, TypeError):
+            pass
+    return now.time()
 
 # =============================================================================
 # Views pour la page d'accueil de gestion_horraire
@@ -32,13 +46,10 @@ def index(request):
 def pointage_employe(request):
     now = timezone.localtime(timezone.now())
     today = now.date()
-    current_time = now.time()
     user = request.user
 
     # Récupération des paramètres horaires
-    parametres = ParametresHoraires.objects.first()
-    if not parametres:
-        parametres = ParametresHoraires.objects.create()
+    parametres = ParametresHoraires.get_actifs(creer=True)
 
     # Vérification si c'est un jour travaillé
     if not parametres.est_jour_travaille(today):
@@ -64,15 +75,7 @@ def pointage_employe(request):
             
         elif action == 'arrivee' and not pointage.heure_arrivee:
             # Récupérer l'heure exacte du serveur
-            server_time_str = request.POST.get('server_time')
-            if server_time_str:
-                try:
-                    h, m, s = map(int, server_time_str.split(':'))
-                    pointage_time = now.replace(hour=h, minute=m, second=s).time()
-                except (ValueError, TypeError):
-                    pointage_time = current_time
-            else:
-                pointage_time = current_time
+            pointage_time = get_heure_pointage(request, now)
 
             # Vérifier si l'arrivée est après l'heure de fin standard
             if pointage_time >= parametres.heure_fin_standard:
@@ -80,7 +83,7 @@ def pointage_employe(request):
                 pointage.status = 'ABSENT'
                 pointage.save()
                 
-                LogConnexion.objects.create(
+                journal_audit.enregistrer(
                     employe=user,
                     type_action='POINTAGE_ARRIVEE',
                     ip=get_client_ip(request),
@@ -105,7 +108,7 @@ def pointage_employe(request):
                     messages.success(request, "Pointage d'arrivée enregistré à l'heure.")
                 
                 pointage.save()
-                LogConnexion.objects.create(
+                journal_audit.enregistrer(
                     employe=user,
                     type_action='POINTAGE_ARRIVEE',
                     ip=get_client_ip(request),
@@ -123,24 +126,15 @@ def pointage_employe(request):
                 messages.error(request, "Vous avez déjà pointé votre départ aujourd'hui.")
             else:
                 # Récupérer l'heure exacte
-                server_time_str = request.POST.get('server_time')
-                if server_time_str:
-                    try:
-                        h, m, s = map(int, server_time_str.split(':'))
-                        pointage_time = now.replace(hour=h, minute=m, second=s).time()
-                    except (ValueError, TypeError):
-                        pointage_time = current_time
-                else:
-                    pointage_time = current_time
+                pointage_time = get_heure_pointage(request, now)
 
                 # Vérifier si l'utilisateur essaie de pointer l'arrivée et le départ en même temps
                 if pointage.heure_arrivee and pointage_time <= pointage.heure_arrivee:
                     messages.error(request, "L'heure de départ doit être après l'heure d'arrivée.")
                 else:
                     pointage.heure_depart = pointage_time
-                    pointage.save()
+                    pointage.save(update_fields=['heure_depart'])
                     
-                    pointage.refresh_from_db()
                     temps_travail_formate = pointage.get_temps_travail_formate()
                     
                     if pointage.status == 'ABSENT':
@@ -148,7 +142,7 @@ def pointage_employe(request):
                     else:
                         messages.success(request, f"Pointage de départ enregistré à {pointage_time.strftime('%H:%M')}. Temps de travail : {temps_travail_formate}")
                     
-                    LogConnexion.objects.create(
+                    journal_audit.enregistrer(
                         employe=user,
                         type_action='POINTAGE_DEPART',
                         ip=get_client_ip(request),
@@ -172,12 +166,150 @@ def pointage_employe(request):
     }
     return render(request, 'gestion_horraire/pointage_employe.html', context)
 
+# =============================================================================
+# API JSON de pointage (arrivée / départ sans rechargement de page)
+# =============================================================================
+
+def _pointage_json(pointage, deja_pointe=False, **extra):
+    return JsonResponse({
+        'success': True,
+        'deja_pointe': deja_pointe,
+        'status': pointage.status,
+        'status_display': pointage.get_status_display(),
+        'heure_arrivee': pointage.heure_arrivee.strftime('%H:%M:%S') if pointage.heure_arrivee else None,
+        'heure_depart': pointage.heure_depart.strftime('%H:%M:%S') if pointage.heure_depart else None,
+        'temps_travail': pointage.get_temps_travail_formate(),
+        **extra,
+    })
+
 @login_required(login_url='accounts:login')
 @user_is_active
-def historique(request):
-    from django.core.paginator import Paginator
-    from django.db.models import Q, Avg, Count
-    from datetime import datetime, timedelta
+@require_POST
+def api_pointage(request):
+    """
+    Pointage arrivée / départ en JSON.
+    L'arrivée est un INSERT ... ON CONFLICT suivi d'un UPDATE gardé et le départ
+    un UPDATE conditionnel : un client qui renvoie la même requête ne crée ni
+    doublon ni IntegrityError, il reçoit simplement l'état courant. Le log du
+    pointage est écrit dans la même transaction.
+    """
+    now = timezone.localtime(timezone.now())
+    today = now.date()
+    user = request.user
+    action = request.POST.get('action')
+    parametres = ParametresHoraires.get_actifs(creer=True)
+
+    if action not in ('arrivee', 'depart'):
+        return JsonResponse({'success': False, 'error': "Action de pointage inconnue."}, status=400)
+    if not parametres.est_jour_travaille(today):
+        return JsonResponse({'success': False, 'error': "Impossible de pointer un jour non travaillé."}, status=400)
+
+    pointage_time = get_heure_pointage(request, now)
+    log = {
+        'employe': user,
+        'ip': get_client_ip(request),
+        'device': request.META.get('HTTP_USER_AGENT'),
+    }
+
+    if action == 'arrivee':
+        if pointage_time >= parametres.heure_fin_standard:
+            journal_audit.enregistrer(
+                type_action='POINTAGE_ARRIVEE',
+                success=False,
+                error="Arrivée après l'heure de fin",
+                details={
+                    'heure_tentative': pointage_time.strftime('%H:%M:%S'),
+                    'heure_fin_standard': parametres.heure_fin_standard.strftime('%H:%M:%S')
+                },
+                **log
+            )
+            return JsonResponse({'success': False, 'error': "Impossible de pointer l'arrivée après l'heure de fin standard."}, status=400)
+
+        retard_minutes = parametres.calculer_retard(pointage_time)
+        pointage = PointageHoraire(employe=user, date=today, heure_arrivee=pointage_time)
+        pointage.calculer_statut(parametres)
+
+        with transaction.atomic():
+            if not PointageHoraire.objects.pointer_arrivee(user, today, pointage_time, pointage.status):
+                # Arrivée déjà enregistrée : requête rejouée par le client
+                return _pointage_json(PointageHoraire.objects.get(employe=user, date=today), deja_pointe=True)
+            # Log écrit dans la transaction : pas de pointage sans sa trace, ni l'inverse
+            journal_audit.ecrire(
+                type_action='POINTAGE_ARRIVEE',
+                details={
+                    'retard_minutes': retard_minutes if retard_minutes > 0 else None,
+                    'heure_exacte': pointage_time.strftime('%H:%M:%S')
+                },
+                **log
+            )
+            # L'upsert ne passe pas par save() : pas de signal, événement écrit ici
+            ActivityEvent.objects.enregistrer(user, 'pointage', 'Pointage arrivée', pointage.status)
+        return _pointage_json(pointage, retard_minutes=retard_minutes if retard_minutes > 0 else None)
+
+    with transaction.atomic():
+        pointage = PointageHoraire.objects.filter(employe=user, date=today).first()
+        if pointage is None or not pointage.heure_arrivee:
+            return JsonResponse({'success': False, 'error': "Vous devez d'abord pointer votre arrivée."}, status=400)
+        if pointage.heure_depart:
+            return _pointage_json(pointage, deja_pointe=True)
+        if pointage_time <= pointage.heure_arrivee:
+            return JsonResponse({'success': False, 'error': "L'heure de départ doit être après l'heure d'arrivée."}, status=400)
+
+        if not PointageHoraire.objects.pointer_depart(pointage, pointage_time, parametres):
+            # Départ enregistré entre-temps par une requête concurrente
+            pointage.refresh_from_db()
+            return _pointage_json(pointage, deja_pointe=True)
+        journal_audit.ecrire(
+            type_action='POINTAGE_DEPART',
+            details={
+                'temps_travail': pointage.get_temps_travail_formate(),
+                'heure_exacte': pointage_time.strftime('%H:%M:%S'),
+                'statut_final': pointage.status
+            },
+            **log
+        )
+        ActivityEvent.objects.enregistrer(user, 'pointage', 'Pointage départ', pointage.status)
+    return _pointage_json(pointage)
+
+# =============================================================================
+# Synchronisation par lots des terminaux de pointage (badgeuses, kiosques)
+# =============================================================================
+
+@csrf_exempt
+@require_POST
+def api_synchro_terminal(request):
+    """
+    Reçoit un lot de pointages mis en attente par un terminal hors connexion.
+    Authentification par le jeton partagé settings.POINTAGE_TERMINAL_TOKEN
+    (en-tête X-Terminal-Token).
+    """
+    jeton = getattr(settings, 'POINTAGE_TERMINAL_TOKEN', None)
+    if not jeton or not hmac.compare_digest(request.headers.get('X-Terminal-Token', ''), jeton):
+        return JsonResponse({'success': False, 'error': "Terminal non autorisé."}, status=403)
+
+    try:
+        data = json.loads(request.body)
+        pointages = data['pointages']
+        if not isinstance(pointages, list):
+            raise TypeError
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'success': False, 'error': "Format attendu : {\"pointages\": [...]}"}, status=400)
+
+    try:
+        resultats = synchroniser_pointages(pointages, ip=get_client_ip(request))
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    return JsonResponse({'success': True, 'resultats': resultats})
+
+# =============================================================================
+# Historique : pagination par curseur (date, id) au lieu d'OFFSET
+# =============================================================================
+
+TAILLE_PAGE_HISTORIQUE = 10
+
+def _filtrer_historique(request):
+    """Applique les filtres GET à l'historique de l'utilisateur connecté"""
+    from datetime import datetime
 
     # Récupération des paramètres de filtrage
     date_debut = request.GET.get('date_debut')
@@ -205,39 +337,99 @@ def historique(request):
     if status:
         pointages = pointages.filter(status=status)
 
-    # Calcul des statistiques
-    stats = {
-        'total_jours': pointages.count(),
-        'retards': pointages.filter(status='RETARD').count(),
-        'absences': pointages.filter(status='ABSENT').count(),
-        'presences': pointages.filter(status='PRESENT').count(),
-    }
+    return pointages, {'date_debut': date_debut, 'date_fin': date_fin, 'status': status}
+
+def _page_historique(request, pointages):
+    """
+    Retourne (pointages de la page, curseur de la page suivante ou None).
+    Le curseur "AAAA-MM-JJ_id" désigne la dernière ligne affichée : la page
+    suivante est lue par l'index, quelle que soit la profondeur dans l'historique.
+    """
+    from datetime import datetime
+    from django.db.models import Q
 
-    # Récupération des logs associés
-    logs = LogConnexion.objects.filter(
-        employe=request.user,
-        type_action__in=['POINTAGE_ARRIVEE', 'POINTAGE_DEPART']
-    ).order_by('-date_heure')[:10]
+    curseur = request.GET.get('apres')
+    if curseur:
+        try:
+            date_str, id_str = curseur.split('_')
+            date_curseur = datetime.strptime(date_str, '%Y-%m-%d').date()
+            pointages = pointages.filter(Q(date__lt=date_curseur) | Q(date=date_curseur, id__lt=int(id_str)))
+        except ValueError:
+            pass
 
-    # Tri final et pagination
-    pointages = pointages.order_by('-date')
-    paginator = Paginator(pointages, 10)  # 10 entrées par page
-    page_number = request.GET.get('page', 1)
-    page_obj = paginator.get_page(page_number)
+    page = list(pointages.order_by('-date', '-id')[:TAILLE_PAGE_HISTORIQUE + 1])
+    suivant = None
+    if len(page) > TAILLE_PAGE_HISTORIQUE:
+        page = page[:TAILLE_PAGE_HISTORIQUE]
+        suivant = f"{page[-1].date:%Y-%m-%d}_{page[-1].id}"
+    return page, suivant
+
+@login_required(login_url='accounts:login')
+@user_is_active
+def historique(request):
+    from django.db.models import Q, Count
+
+    pointages, filtres = _filtrer_historique(request)
+
+    # Calcul des statistiques en une seule requête
+    stats = pointages.aggregate(
+        total_jours=Count('id'),
+        retards=Count('id', filter=Q(status='RETARD')),
+        absences=Count('id', filter=Q(status='ABSENT')),
+        presences=Count('id', filter=Q(status='PRESENT')),
+    )
+
+    # Logs associés sur la période filtrée, archives comprises
+    logs = rechercher_logs(
+        filtres['date_debut'] if isinstance(filtres['date_debut'], date) else None,
+        filtres['date_fin'] if isinstance(filtres['date_fin'], date) else None,
+        employe_id=request.user.pk,
+        type_action=['POINTAGE_ARRIVEE', 'POINTAGE_DEPART'],
+        limite=10,
+    )
+
+    # Pagination par curseur
+    page, suivant = _page_historique(request, pointages)
+    params_suivant = None
+    if suivant:
+        params = request.GET.copy()
+        params['apres'] = suivant
+        params_suivant = params.urlencode()
 
     context = {
-        'page_obj': page_obj,
+        'pointages': page,
+        'curseur_suivant': suivant,
+        'params_suivant': params_suivant,
+        'premiere_page': not request.GET.get('apres'),
         'stats': stats,
         'logs': logs,
-        'filtres': {
-            'date_debut': date_debut,
-            'date_fin': date_fin,
-            'status': status
-        },
+        'filtres': filtres,
         'status_choices': PointageHoraire.STATUS_CHOICES
     }
     return render(request, 'gestion_horraire/historique.html', context)
 
+@login_required(login_url='accounts:login')
+@user_is_active
+def api_historique(request):
+    """Page suivante de l'historique en JSON (défilement infini)"""
+    pointages, filtres = _filtrer_historique(request)
+    page, suivant = _page_historique(request, pointages)
+    return JsonResponse({
+        'success': True,
+        'pointages': [
+            {
+                'date': p.date.strftime('%d/%m/%Y'),
+                'heure_arrivee': p.heure_arrivee.strftime('%H:%M') if p.heure_arrivee else None,
+                'heure_depart': p.heure_depart.strftime('%H:%M') if p.heure_depart else None,
+                'temps_travail': p.get_temps_travail_formate(),
+                'status': p.status,
+                'status_display': p.get_status_display(),
+            }
+            for p in page
+        ],
+        'suivant': suivant,
+    })
+
 @login_required(login_url='accounts:login')
 @user_is_active
 def profil(request):
@@ -1,14 +1,19 @@
 from unfold.admin import ModelAdmin
 from django.contrib import admin
-from .models import EmployeeProfile, LeaveRequest, Payroll, PerformanceReview, Recruitment
+from .recherche import RechercheEmployesAdminMixin
+from .models import (
+    EmployeeProfile, LeaveRequest, LeaveLedgerEntry, LeaveBalance, Payroll, PayrollRun, PerformanceReview,
+    Recruitment, ActivityEvent,
+)
 
 # =============================================================================
 # Admin pour EmployeeProfile
 # =============================================================================
-class EmployeeProfileAdmin(ModelAdmin):
+class EmployeeProfileAdmin(RechercheEmployesAdminMixin, ModelAdmin):
     list_display = ('user', 'employee_id', 'department', 'position', 'hire_date', 'salary', 'is_active')
     list_filter = ('department', 'is_active')
     search_fields = ('user__username', 'employee_id', 'department__name', 'position')
+    champ_utilisateur_recherche = 'user_id'
     ordering = ('user__username', 'employee_id')
     
 # =============================================================================
@@ -20,6 +25,33 @@ class LeaveRequestAdmin(ModelAdmin):
     search_fields = ('employee__username', 'employee__employee_profile__employee_id', 'leave_type', 'reason')
     ordering = ('employee__username', 'employee__employee_profile__employee_id')
 
+# =============================================================================
+# Admin pour LeaveLedgerEntry et LeaveBalance (lecture seule : tenus par rh/soldes_conges.py)
+# =============================================================================
+class LeaveLedgerEntryAdmin(ModelAdmin):
+    list_display = ('created_at', 'employee', 'leave_type', 'kind', 'days', 'period', 'leave_request')
+    list_filter = ('kind', 'leave_type')
+    search_fields = ('employee__username', 'employee__employee_profile__employee_id')
+    ordering = ('-created_at', '-id')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+class LeaveBalanceAdmin(ModelAdmin):
+    list_display = ('employee', 'leave_type', 'balance', 'updated_at')
+    list_filter = ('leave_type',)
+    search_fields = ('employee__username', 'employee__employee_profile__employee_id')
+    ordering = ('employee__username', 'leave_type')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
 # =============================================================================
 # Admin pour Payroll
 # =============================================================================
@@ -28,6 +60,21 @@ class PayrollAdmin(ModelAdmin):
     list_filter = ('month',)
     search_fields = ('employee__username', 'employee__employee_profile__employee_id', 'month')
     ordering = ('employee__username', 'employee__employee_profile__employee_id')
+    readonly_fields = ('run', 'details', 'inputs_hash')
+
+# =============================================================================
+# Admin pour PayrollRun (lecture seule : créé par python manage.py calculer_paie)
+# =============================================================================
+class PayrollRunAdmin(ModelAdmin):
+    list_display = ('month', 'status', 'started_at', 'finished_at', 'employee_count', 'computed_count', 'unchanged_count')
+    list_filter = ('status',)
+    ordering = ('-month',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
 
 # =============================================================================
 # Admin pour PerformanceReview
@@ -47,8 +94,28 @@ class RecruitmentAdmin(ModelAdmin):
     search_fields = ('title', 'department__name', 'description', 'requirements', 'location', 'job_type', 'salary_range', 'posted_date', 'closing_date')
     ordering = ('title', 'department__name')
 
+# =============================================================================
+# Admin pour ActivityEvent (lecture seule : table en ajout seul)
+# =============================================================================
+class ActivityEventAdmin(ModelAdmin):
+    list_display = ('timestamp', 'event_type', 'employee', 'department', 'site', 'action', 'status')
+    list_filter = ('event_type', 'department', 'site')
+    search_fields = ('employee__username', 'action', 'status')
+    date_hierarchy = 'timestamp'
+    ordering = ('-timestamp', '-id')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
 admin.site.register(EmployeeProfile, EmployeeProfileAdmin)
 admin.site.register(LeaveRequest, LeaveRequestAdmin)
+admin.site.register(LeaveLedgerEntry, LeaveLedgerEntryAdmin)
+admin.site.register(LeaveBalance, LeaveBalanceAdmin)
 admin.site.register(Payroll, PayrollAdmin)
+admin.site.register(PayrollRun, PayrollRunAdmin)
 admin.site.register(PerformanceReview, PerformanceReviewAdmin)
-admin.site.register(Recruitment, RecruitmentAdmin)
\ No newline at end of file
+admin.site.register(Recruitment, RecruitmentAdmin)
+admin.site.register(ActivityEvent, ActivityEventAdmin)
@@ -2,3 +2,6 @@ from django.apps import AppConfig
 class RhConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'rh'
+
+    def ready(self):
+        from . import checks, signals  # noqa: F401
@@ -0,0 +1,233 @@
+"""
+Bulletins de paie DOCX générés depuis les fiches Payroll.
+
+- Le corps du document est un template Django (templates/rh/bulletin_paie/document.xml)
+  compilé une fois par processus puis réutilisé ; le reste du paquet DOCX est fixe.
+- Le rendu en masse (manage.py generer_bulletins) tourne dans le pool de
+  rh/parallele.py : les processus reçoivent les données du bulletin
+  (chaînes) et retournent le fichier DOCX (octets). Les téléchargements
+  rendent à la demande, un bulletin à la fois, ceux qui manquent au cache.
+- Chaque fichier est rangé sous l'empreinte de ses données et du template :
+  un bulletin inchangé n'est jamais rendu deux fois.
+- Les bulletins d'un mois sont envoyés en ZIP construit au fil de l'eau,
+  sans archive complète en mémoire : chaque bulletin manquant est rendu
+  au moment où l'archive l'atteint.
+"""
+import hashlib
+import io
+import json
+import os
+import zipfile
+from functools import lru_cache
+from pathlib import Path
+from django.conf import settings
+from django.template.loader import get_template
+from django.utils import formats
+from .parallele import creer_pool, executer
+
+TEMPLATE_BULLETIN = 'rh/bulletin_paie/document.xml'
+TAILLE_LOT = 100
+TAILLE_MORCEAU = 64 * 1024
+ENTETES = ['Libellé de la rubrique', 'Nbre de jours', 'Gain', 'Retenue']
+
+# Parties fixes du paquet DOCX
+CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '</Types>'
+)
+RELATIONS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="word/document.xml"/>'
+    '</Relationships>'
+)
+
+
+def get_dossier_bulletins():
+    return Path(getattr(settings, 'RH_BULLETINS_DIR', settings.BASE_DIR / 'archives' / 'bulletins'))
+
+
+# =============================================================================
+# Données d'un bulletin
+# =============================================================================
+def _montant(valeur):
+    """266000.00 -> '266 000' (FCFA, séparateur de milliers)"""
+    return f"{round(float(valeur or 0)):,}".replace(',', ' ')
+
+
+def donnees_bulletin(payroll):
+    """
+    Données (chaînes uniquement) du bulletin d'une fiche. La fiche doit être
+    chargée avec select_related('employee__employee_profile__department').
+    """
+    employe = payroll.employee
+    profil = getattr(employe, 'employee_profile', None)
+    details = payroll.details or {}
+
+    def jours(cle):
+        # Nombre de jours enregistré par le calcul de paie (vide pour une fiche antérieure)
+        return str(details.get(cle, ''))
+
+    lignes = [['Salaire de base', '', _montant(payroll.base_salary), '']]
+    if details:
+        lignes += [
+            ['Heures supplémentaires', '', _montant(details.get('prime_heures_supplementaires')), ''],
+            ['Absences', jours('jours_absence'), '', _montant(details.get('deduction_absences'))],
+            ['Congés sans solde', jours('jours_sans_solde'), '',
+             _montant(details.get('deduction_conges_sans_solde'))],
+            ['Retards', '', '', _montant(details.get('deduction_retards'))],
+            ['Hors contrat', jours('jours_hors_contrat'), '', _montant(details.get('deduction_hors_contrat'))],
+        ]
+    else:
+        # Fiche saisie à la main : totaux seulement
+        lignes += [
+            ['Primes', '', _montant(payroll.bonuses), ''],
+            ['Déductions', '', '', _montant(payroll.deductions)],
+        ]
+    return {
+        'periode': formats.date_format(payroll.month, 'F Y'),
+        'nom': employe.get_full_name() or employe.username,
+        'matricule': profil.employee_id if profil else '',
+        'poste': (profil.position if profil else '') or '',
+        'departement': profil.department.name if profil and profil.department else '',
+        'date_entree': formats.date_format(profil.hire_date, 'd/m/Y') if profil and profil.hire_date else '',
+        'entetes': ENTETES,
+        'lignes': lignes,
+        'total_gains': _montant(payroll.base_salary + payroll.bonuses),
+        'total_retenues': _montant(payroll.deductions),
+        'net': _montant(payroll.total_salary),
+    }
+
+
+@lru_cache(maxsize=None)
+def _modele():
+    """Template compilé une fois par processus"""
+    return get_template(TEMPLATE_BULLETIN)
+
+
+@lru_cache(maxsize=None)
+def _signature_modele():
+    return hashlib.sha256(_modele().template.source.encode()).hexdigest()
+
+
+def empreinte_bulletin(donnees):
+    """Empreinte des données et du template : nom du fichier en cache"""
+    contenu = json.dumps([donnees, _signature_modele()], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(contenu.encode()).hexdigest()
+
+
+def chemin_bulletin(empreinte):
+    return get_dossier_bulletins() / empreinte[:2] / f"{empreinte}.docx"
+
+
+def nom_bulletin(payroll):
+    profil = getattr(payroll.employee, 'employee_profile', None)
+    identifiant = profil.employee_id if profil else payroll.employee.username
+    return f"bulletin_{identifiant}_{payroll.month:%Y-%m}.docx"
+
+
+# =============================================================================
+# Rendu (exécuté dans le pool de processus)
+# =============================================================================
+def rendre_bulletin(donnees):
+    """Fichier DOCX (octets) d'un bulletin"""
+    tampon = io.BytesIO()
+    with zipfile.ZipFile(tampon, 'w', zipfile.ZIP_DEFLATED) as docx:
+        docx.writestr('[Content_Types].xml', CONTENT_TYPES)
+        docx.writestr('_rels/.rels', RELATIONS)
+        docx.writestr('word/document.xml', _modele().render(donnees))
+    return tampon.getvalue()
+
+
+def _enregistrer(chemin, contenu):
+    # Écriture dans un fichier temporaire puis renommage : jamais de fichier tronqué en cache
+    chemin.parent.mkdir(parents=True, exist_ok=True)
+    temporaire = chemin.with_suffix(f'.{os.getpid()}.tmp')
+    temporaire.write_bytes(contenu)
+    os.replace(temporaire, chemin)
+
+
+def bulletin(payroll):
+    """Chemin du bulletin d'une fiche, rendu dans le processus courant s'il n'est pas en cache"""
+    donnees = donnees_bulletin(payroll)
+    chemin = chemin_bulletin(empreinte_bulletin(donnees))
+    if not chemin.exists():
+        _enregistrer(chemin, rendre_bulletin(donnees))
+    return chemin
+
+
+def generer_bulletins(payrolls, processus=None):
+    """
+    Rend les bulletins absents du cache ; retourne [(payroll, chemin)] dans l'ordre.
+    payrolls : fiches chargées avec select_related('employee__employee_profile__department').
+    """
+    bulletins = []
+    a_rendre = []
+    for payroll in payrolls:
+        donnees = donnees_bulletin(payroll)
+        chemin = chemin_bulletin(empreinte_bulletin(donnees))
+        bulletins.append((payroll, chemin))
+        if not chemin.exists():
+            a_rendre.append((chemin, donnees))
+
+    if a_rendre:
+        pool = creer_pool(min(processus or os.cpu_count() or 1, len(a_rendre)))
+        try:
+            # Par lots : seuls TAILLE_LOT fichiers rendus sont en mémoire à la fois
+            for debut in range(0, len(a_rendre), TAILLE_LOT):
+                lot = a_rendre[debut:debut + TAILLE_LOT]
+                contenus = executer(pool, rendre_bulletin, [donnees for _, donnees in lot], taille_morceau=10)
+                for (chemin, _), contenu in zip(lot, contenus):
+                    _enregistrer(chemin, contenu)
+        finally:
+            if pool is not None:
+                pool.shutdown()
+    return bulletins
+
+
+# =============================================================================
+# Archive ZIP en flux
+# =============================================================================
+class _FluxSortie(io.RawIOBase):
+    """Sortie non positionnable : zipfile écrit alors des descripteurs de données"""
+
+    def __init__(self):
+        self.morceaux = []
+
+    def writable(self):
+        return True
+
+    def write(self, donnees):
+        self.morceaux.append(bytes(donnees))
+        return len(donnees)
+
+    def vider(self):
+        morceaux, self.morceaux = self.morceaux, []
+        return b''.join(morceaux)
+
+
+def flux_zip(fichiers):
+    """
+    Génère l'archive ZIP morceau par morceau.
+    fichiers : itérable de (nom dans l'archive, chemin du fichier).
+    """
+    sortie = _FluxSortie()
+    # Les DOCX sont déjà compressés : stockés tels quels
+    with zipfile.ZipFile(sortie, 'w', zipfile.ZIP_STORED) as archive:
+        for nom, chemin in fichiers:
+            with open(chemin, 'rb') as source, archive.open(nom, 'w') as destination:
+                while True:
+                    morceau = source.read(TAILLE_MORCEAU)
+                    if not morceau:
+                        break
+                    destination.write(morceau)
+                    yield sortie.vider()
+            yield sortie.vider()
+    yield sortie.vider()
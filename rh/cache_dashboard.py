@@ -0,0 +1,90 @@
+"""
+Cache du tableau de bord RH, une entrée par widget.
+
+Chaque widget est lu via obtenir_widget() et n'est invalidé que par les
+modèles dont il dépend (voir rh/signals.py). Protection contre la ruée :
+quand une entrée expire, un seul processus la recalcule (verrou cache.add) ;
+les autres servent la valeur périmée, ou attendent brièvement si l'entrée a
+été invalidée. Préchauffage : python manage.py prechauffer_dashboard_rh
+
+Le cache doit être partagé entre processus (base de données, Redis,
+Memcached) pour que les workers voient le préchauffage et les
+invalidations faits ailleurs : le contrôle rh.E001 (rh/checks.py) refuse
+LocMemCache, propre à chaque processus.
+"""
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+# Widgets du tableau de bord -> True si la valeur dépend du jour courant
+WIDGETS = {
+    'employee_count': False,
+    'leave_count': False,
+    'attendance_stats': True,
+    'weekly_trend': True,
+    'status_stats': False,
+    'payroll_this_month': True,
+}
+
+DUREE_VERROU = 30        # secondes : durée maximale d'un recalcul
+ATTENTE_MAX = 2          # secondes : attente d'un recalcul en cours avant de calculer soi-même
+PAS_ATTENTE = 0.05
+
+
+def get_duree_cache():
+    return getattr(settings, 'RH_DASHBOARD_CACHE_TIMEOUT', 300)
+
+
+def cle_widget(nom):
+    if WIDGETS[nom]:
+        # Clé datée : le passage à minuit change de clé sans invalidation
+        return f"rh:dashboard:{nom}:{timezone.localdate():%Y-%m-%d}"
+    return f"rh:dashboard:{nom}"
+
+
+def rafraichir_widget(nom, calcul, verrou_pris=False):
+    """
+    Recalcule un widget et le met en cache ; retourne la valeur.
+    verrou_pris : l'appelant détient le verrou du widget, libéré à la fin ;
+    sinon le verrou, peut-être tenu par un autre processus, n'est pas touché.
+    """
+    cle = cle_widget(nom)
+    try:
+        valeur = calcul()
+        duree = get_duree_cache()
+        # Conservée deux fois plus longtemps que sa fraîcheur pour pouvoir servir du périmé
+        cache.set(cle, (valeur, time.time() + duree), duree * 2)
+        return valeur
+    finally:
+        if verrou_pris:
+            cache.delete(f"{cle}:verrou")
+
+
+def obtenir_widget(nom, calcul):
+    """Valeur du widget depuis le cache, recalculée par un seul appelant à l'expiration"""
+    cle = cle_widget(nom)
+    entree = cache.get(cle)
+    if entree is not None:
+        valeur, expire_le = entree
+        if expire_le > time.time() or not cache.add(f"{cle}:verrou", 1, DUREE_VERROU):
+            return valeur
+        return rafraichir_widget(nom, calcul, verrou_pris=True)
+
+    if cache.add(f"{cle}:verrou", 1, DUREE_VERROU):
+        return rafraichir_widget(nom, calcul, verrou_pris=True)
+    # Recalcul en cours ailleurs : attendre son résultat plutôt que recalculer en parallèle
+    limite = time.monotonic() + ATTENTE_MAX
+    while time.monotonic() < limite:
+        time.sleep(PAS_ATTENTE)
+        entree = cache.get(cle)
+        if entree is not None:
+            return entree[0]
+    return calcul()
+
+
+def invalider_widgets(*noms):
+    """Supprime les entrées des widgets, après le commit de la transaction en cours"""
+    cles = [cle_widget(nom) for nom in noms]
+    transaction.on_commit(lambda: cache.delete_many(cles))
@@ -0,0 +1,22 @@
+"""
+Contrôles système de l'application RH (python manage.py check).
+"""
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+# Caches propres à chaque processus : ni le préchauffage ni les invalidations n'y sont partagés
+CACHES_NON_PARTAGES = {'django.core.cache.backends.locmem.LocMemCache'}
+
+
+@register(Tags.caches)
+def verifier_cache_partage(app_configs, **kwargs):
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if backend not in CACHES_NON_PARTAGES:
+        return []
+    return [Error(
+        f"Le cache par défaut ({backend}) n'est pas partagé entre processus.",
+        hint="Le tableau de bord RH (rh/cache_dashboard.py) exige un cache partagé : "
+             "DatabaseCache (manage.py createcachetable), Redis ou Memcached.",
+        obj='CACHES',
+        id='rh.E001',
+    )]
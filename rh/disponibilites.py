@@ -0,0 +1,82 @@
+"""
+Matrice de disponibilité d'une équipe sur un mois.
+
+Une ligne par employé du département, un caractère par jour du mois :
+les congés approuvés et les pointages sont lus en deux requêtes (plus la
+liste des employés) puis posés dans un tableau d'octets, sans requête par
+employé ni par jour. Le calendrier reçoit une chaîne par employé.
+"""
+from datetime import timedelta
+from gestion_Horraire.feuilles_temps import bornes_periode
+from gestion_Horraire.models import PointageHoraire, ParametresHoraires, employes_actifs
+from .models import LeaveRequest
+
+# Code d'un jour dans la matrice
+NON_TRAVAILLE = '-'
+NON_RENSEIGNE = '.'
+CODES_POINTAGE = {
+    'PRESENT': 'P',
+    'RETARD': 'R',
+    'ABSENT': 'A',
+    'CONGE': 'C',
+}
+CODE_CONGE = 'C'
+LEGENDE = {
+    NON_TRAVAILLE: 'Jour non travaillé',
+    NON_RENSEIGNE: 'Non renseigné',
+    'P': 'Présent',
+    'R': 'En retard',
+    'A': 'Absent',
+    'C': 'En congé',
+}
+
+
+def matrice_disponibilites(department_id, mois):
+    """
+    Disponibilités des employés actifs du département pour le mois de `mois`.
+    Retourne un dictionnaire sérialisable en JSON :
+    {'month', 'days', 'legend', 'employees': [{'id', 'name', 'days': 'PPR-..C'}]}
+    """
+    parametres = ParametresHoraires.get_actifs(creer=True)
+    debut, fin = bornes_periode(mois)
+    nb_jours = (fin - debut).days + 1
+    # Modèle de ligne : jours non travaillés marqués d'avance
+    modele = bytearray(''.join(
+        NON_RENSEIGNE if parametres.est_jour_travaille(debut + timedelta(days=i)) else NON_TRAVAILLE
+        for i in range(nb_jours)
+    ).encode())
+
+    employes = employes_actifs().filter(department_id=department_id)
+    lignes = {}
+    noms = {}
+    for employe_id, username, prenom, nom in employes.order_by('last_name', 'first_name', 'username').values_list(
+        'id', 'username', 'first_name', 'last_name'
+    ):
+        lignes[employe_id] = bytearray(modele)
+        noms[employe_id] = f"{prenom} {nom}".strip() or username
+    ids = employes.values('id')
+
+    # Requête 1 : pointages du mois
+    for employe_id, jour, status in PointageHoraire.objects.filter(
+        employe_id__in=ids, date__range=(debut, fin)
+    ).values_list('employe_id', 'date', 'status').iterator(chunk_size=5000):
+        lignes[employe_id][(jour - debut).days] = ord(CODES_POINTAGE.get(status, NON_RENSEIGNE))
+
+    # Requête 2 : congés approuvés qui chevauchent le mois (priment sur les pointages)
+    for employe_id, date_debut, date_fin in LeaveRequest.objects.filter(
+        employee_id__in=ids, status='approved', start_date__lte=fin, end_date__gte=debut
+    ).values_list('employee_id', 'start_date', 'end_date'):
+        ligne = lignes[employe_id]
+        for i in range((max(date_debut, debut) - debut).days, (min(date_fin, fin) - debut).days + 1):
+            if ligne[i] != ord(NON_TRAVAILLE):
+                ligne[i] = ord(CODE_CONGE)
+
+    return {
+        'month': f"{debut:%Y-%m}",
+        'days': nb_jours,
+        'legend': LEGENDE,
+        'employees': [
+            {'id': employe_id, 'name': noms[employe_id], 'days': ligne.decode()}
+            for employe_id, ligne in lignes.items()
+        ],
+    }
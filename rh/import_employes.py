@@ -0,0 +1,329 @@
+"""
+Import en masse d'employés depuis un fichier CSV ou XLSX.
+
+Les lignes sont lues et validées au fil de l'eau, puis créées par lots :
+les mots de passe d'un lot sont hachés dans un pool de processus et
+CustomUser, Profile et EmployeeProfile sont insérés par bulk_create dans une
+transaction par lot. Une ligne invalide est signalée dans le rapport sans
+interrompre l'import.
+
+Colonnes reconnues (en-tête, mêmes noms que CustomUserCreationForm) :
+username, email, password, first_name, last_name, full_name, department
+(code ou nom), site (code ou nom), employee_id, position, hire_date,
+contract_type, salary_base, date_of_birth, gender, nationality,
+marital_status, address, phone_number, secondary_phone, id_type, id_number,
+id_issue_date, id_expiry_date, manager_name.
+"""
+import csv
+import io
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from accounts.models import CustomUser, Department, Profile, Site
+from .cache_dashboard import invalider_widgets
+from .models import EmployeeProfile
+from .parallele import creer_pool, executer, hacher_mot_de_passe
+from .recherche import indexer_utilisateurs
+
+TAILLE_LOT = 500
+FORMATS_DATE = ('%Y-%m-%d', '%d/%m/%Y')
+
+CHAMPS_PROFIL_TEXTE = (
+    'nationality', 'marital_status', 'address', 'phone_number', 'secondary_phone', 'id_number', 'manager_name',
+)
+CHAMPS_PROFIL_DATE = ('date_of_birth', 'id_issue_date', 'id_expiry_date', 'hire_date')
+
+
+# =============================================================================
+# Lecture des fichiers (itérateurs : le fichier n'est jamais chargé en entier)
+# =============================================================================
+def _lire_csv(fichier):
+    texte = io.TextIOWrapper(fichier, encoding='utf-8-sig', newline='')
+    debut = texte.read(4096)
+    texte.seek(0)
+    try:
+        dialecte = csv.Sniffer().sniff(debut, delimiters=',;\t')
+    except csv.Error:
+        dialecte = csv.excel
+    for numero, ligne in enumerate(csv.DictReader(texte, dialect=dialecte), start=2):
+        yield numero, ligne
+
+
+def _lire_xlsx(fichier):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ValueError("La lecture des fichiers XLSX nécessite le paquet openpyxl.")
+    classeur = load_workbook(fichier, read_only=True, data_only=True)
+    try:
+        lignes = classeur.active.iter_rows(values_only=True)
+        entetes = [str(valeur or '').strip() for valeur in next(lignes, ())]
+        for numero, valeurs in enumerate(lignes, start=2):
+            if any(valeur not in (None, '') for valeur in valeurs):
+                yield numero, dict(zip(entetes, valeurs))
+    finally:
+        classeur.close()
+
+
+def lire_lignes(fichier, nom):
+    """Itère sur (numéro de ligne, dict des colonnes) d'un fichier binaire CSV ou XLSX"""
+    if nom.lower().endswith('.xlsx'):
+        return _lire_xlsx(fichier)
+    return _lire_csv(fichier)
+
+
+# =============================================================================
+# Validation d'une ligne
+# =============================================================================
+def _texte(ligne, champ):
+    valeur = ligne.get(champ)
+    return str(valeur).strip() if valeur not in (None, '') else ''
+
+
+def _date(ligne, champ):
+    valeur = ligne.get(champ)
+    if isinstance(valeur, datetime):
+        return valeur.date()
+    if isinstance(valeur, date):
+        return valeur
+    valeur = _texte(ligne, champ)
+    if not valeur:
+        return None
+    for format_date in FORMATS_DATE:
+        try:
+            return datetime.strptime(valeur, format_date).date()
+        except ValueError:
+            pass
+    raise ValidationError(f"{champ} : date invalide « {valeur} » (AAAA-MM-JJ ou JJ/MM/AAAA).")
+
+
+def _references():
+    """Départements et sites indexés par code et par nom (en minuscules)"""
+    references = {}
+    for nom, modele in (('department', Department), ('site', Site)):
+        index = {}
+        for id_, code, libelle in modele.objects.values_list('id', 'code', 'name'):
+            index[code.lower()] = id_
+            index[libelle.lower()] = id_
+        references[nom] = index
+    return references
+
+
+def _verifier_longueurs(modele, valeurs):
+    for champ, valeur in valeurs.items():
+        longueur_max = getattr(modele._meta.get_field(champ), 'max_length', None)
+        if longueur_max and isinstance(valeur, str) and len(valeur) > longueur_max:
+            raise ValidationError(f"{champ} : {longueur_max} caractères maximum.")
+
+
+def _verifier_choix(modele, champ, valeur, cible):
+    """Refuse une valeur absente des choix du champ de ce modèle (chaque modèle a ses propres choix)"""
+    choix = dict(modele._meta.get_field(champ).flatchoices)
+    if valeur and valeur not in choix:
+        raise ValidationError(
+            f"{champ} : « {valeur} » non accepté pour {cible} ({', '.join(choix)})."
+        )
+
+
+def valider_ligne(ligne, references):
+    """Retourne la ligne nettoyée ou lève ValidationError"""
+    username = _texte(ligne, 'username')
+    if not username:
+        raise ValidationError("username : obligatoire.")
+    try:
+        CustomUser.username_validator(username)
+    except ValidationError as e:
+        raise ValidationError(f"username : {' '.join(e.messages)}")
+
+    email = _texte(ligne, 'email')
+    if email:
+        try:
+            validate_email(email)
+        except ValidationError:
+            raise ValidationError(f"email : adresse invalide « {email} ».")
+
+    department = _texte(ligne, 'department')
+    department_id = references['department'].get(department.lower())
+    if department_id is None:
+        raise ValidationError(f"department : « {department} » inconnu." if department else "department : obligatoire.")
+    site = _texte(ligne, 'site')
+    site_id = references['site'].get(site.lower()) if site else None
+    if site and site_id is None:
+        raise ValidationError(f"site : « {site} » inconnu.")
+
+    contract_type = _texte(ligne, 'contract_type') or None
+    _verifier_choix(Profile, 'contract_type', contract_type, 'le profil')
+    gender = _texte(ligne, 'gender') or None
+    if gender and gender not in dict(Profile.GENDER_CHOICES):
+        raise ValidationError(f"gender : « {gender} » inconnu (M ou F).")
+    id_type = _texte(ligne, 'id_type') or None
+    if id_type and id_type not in dict(Profile.ID_TYPE_CHOICES):
+        raise ValidationError(f"id_type : « {id_type} » inconnu.")
+
+    salaire = _texte(ligne, 'salary_base') or _texte(ligne, 'salary')
+    try:
+        salaire = Decimal(salaire.replace(' ', '').replace(',', '.')) if salaire else None
+    except InvalidOperation:
+        raise ValidationError(f"salary_base : montant invalide « {salaire} ».")
+
+    first_name, last_name = _texte(ligne, 'first_name'), _texte(ligne, 'last_name')
+    profil = {champ: _texte(ligne, champ) or None for champ in CHAMPS_PROFIL_TEXTE}
+    profil.update({champ: _date(ligne, champ) for champ in CHAMPS_PROFIL_DATE})
+    profil.update({
+        'full_name': _texte(ligne, 'full_name') or f"{first_name} {last_name}".strip() or username,
+        'gender': gender,
+        'id_type': id_type,
+        'contract_type': contract_type,
+        'salary_base': salaire,
+    })
+
+    employee_id = _texte(ligne, 'employee_id')
+    profil_rh = None
+    if employee_id:
+        profil_rh = {
+            'employee_id': employee_id,
+            'department_id': department_id,
+            'position': _texte(ligne, 'position') or None,
+            'hire_date': profil['hire_date'],
+            'salary': salaire,
+            'contract_type': contract_type,
+            'is_active': True,
+        }
+        _verifier_choix(EmployeeProfile, 'contract_type', contract_type, 'la fiche RH')
+
+    utilisateur = {
+        'username': username, 'email': email, 'first_name': first_name, 'last_name': last_name,
+        'department_id': department_id, 'site_id': site_id,
+    }
+    _verifier_longueurs(CustomUser, utilisateur)
+    _verifier_longueurs(Profile, profil)
+    if profil_rh:
+        _verifier_longueurs(EmployeeProfile, profil_rh)
+
+    # Mêmes règles que le formulaire de création (AUTH_PASSWORD_VALIDATORS)
+    mot_de_passe = _texte(ligne, 'password') or None
+    if mot_de_passe:
+        try:
+            validate_password(mot_de_passe, CustomUser(**utilisateur))
+        except ValidationError as e:
+            raise ValidationError(f"password : {' '.join(e.messages)}")
+
+    return {
+        'utilisateur': utilisateur,
+        'mot_de_passe': mot_de_passe,
+        'profil': profil,
+        'profil_rh': profil_rh,
+    }
+
+
+# =============================================================================
+# Création par lots
+# =============================================================================
+def _erreur(rapport, numero, ligne, message):
+    rapport['erreurs'].append({'ligne': numero, 'username': ligne.get('username'), 'erreur': message})
+
+
+def _inserer(lignes, maintenant):
+    """Insère un lot valide (dans la transaction courante) ; retourne les ids créés"""
+    utilisateurs = CustomUser.objects.bulk_create([
+        CustomUser(password=ligne['hash'], date_joined=maintenant, **ligne['utilisateur'])
+        for ligne in lignes
+    ])
+    Profile.objects.bulk_create([
+        Profile(user_id=utilisateur.pk, **ligne['profil'])
+        for utilisateur, ligne in zip(utilisateurs, lignes)
+    ])
+    EmployeeProfile.objects.bulk_create([
+        EmployeeProfile(user_id=utilisateur.pk, **ligne['profil_rh'])
+        for utilisateur, ligne in zip(utilisateurs, lignes) if ligne['profil_rh']
+    ])
+    return [utilisateur.pk for utilisateur in utilisateurs]
+
+
+def _creer_lot(lot, pool, rapport):
+    # Conflits avec la base : une requête IN par colonne unique
+    existants = set(CustomUser.objects.filter(
+        username__in=[ligne['utilisateur']['username'] for _, ligne in lot]
+    ).values_list('username', flat=True))
+    matricules = set(EmployeeProfile.objects.filter(
+        employee_id__in=[ligne['profil_rh']['employee_id'] for _, ligne in lot if ligne['profil_rh']]
+    ).values_list('employee_id', flat=True))
+    valides = []
+    for numero, ligne in lot:
+        if ligne['utilisateur']['username'] in existants:
+            _erreur(rapport, numero, ligne['utilisateur'], "username : déjà utilisé.")
+        elif ligne['profil_rh'] and ligne['profil_rh']['employee_id'] in matricules:
+            _erreur(rapport, numero, ligne['utilisateur'], "employee_id : matricule déjà utilisé.")
+        else:
+            valides.append((numero, ligne))
+    if not valides:
+        return
+
+    # Hachage en parallèle ; sans mot de passe fourni, le compte est inutilisable jusqu'à réinitialisation
+    a_hacher = [ligne['mot_de_passe'] for _, ligne in valides if ligne['mot_de_passe']]
+    hashes = iter(executer(pool, hacher_mot_de_passe, a_hacher, taille_morceau=max(1, len(a_hacher) // 32)))
+    for _, ligne in valides:
+        ligne['hash'] = next(hashes) if ligne['mot_de_passe'] else make_password(None)
+
+    maintenant = timezone.now()
+    crees = []
+    try:
+        with transaction.atomic():
+            crees = _inserer([ligne for _, ligne in valides], maintenant)
+    except IntegrityError:
+        # Conflit apparu entre la vérification et l'insertion : ligne par ligne pour isoler les fautives
+        for numero, ligne in valides:
+            try:
+                with transaction.atomic():
+                    crees += _inserer([ligne], maintenant)
+            except IntegrityError as e:
+                _erreur(rapport, numero, ligne['utilisateur'], f"Conflit à l'enregistrement : {e}")
+    rapport['crees'] += len(crees)
+
+    # bulk_create n'émet pas de signaux : index de recherche et cache du tableau de bord mis à jour ici
+    indexer_utilisateurs(crees)
+    invalider_widgets('employee_count', 'status_stats')
+
+
+def importer_employes(lignes, processus=None, taille_lot=TAILLE_LOT):
+    """
+    Importe des employés depuis un itérable de (numéro de ligne, dict des colonnes).
+    processus : taille du pool de hachage (par défaut le nombre de processeurs).
+    Retourne {'crees': nombre, 'erreurs': [{ligne, username, erreur}]}.
+    """
+    rapport = {'crees': 0, 'erreurs': []}
+    references = _references()
+    usernames, matricules = set(), set()
+    pool = creer_pool(processus)
+    try:
+        lot = []
+        for numero, brut in lignes:
+            try:
+                ligne = valider_ligne(brut, references)
+                username = ligne['utilisateur']['username']
+                if username in usernames:
+                    raise ValidationError("username : en double dans le fichier.")
+                matricule = ligne['profil_rh']['employee_id'] if ligne['profil_rh'] else None
+                if matricule and matricule in matricules:
+                    raise ValidationError("employee_id : en double dans le fichier.")
+            except ValidationError as e:
+                _erreur(rapport, numero, brut, ' '.join(e.messages))
+                continue
+            usernames.add(username)
+            if matricule:
+                matricules.add(matricule)
+            lot.append((numero, ligne))
+            if len(lot) >= taille_lot:
+                _creer_lot(lot, pool, rapport)
+                lot = []
+        if lot:
+            _creer_lot(lot, pool, rapport)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return rapport
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from gestion_Horraire.feuilles_temps import periode_depuis_texte, mois_precedent
+from rh.soldes_conges import acquerir_conges
+
+
+class Command(BaseCommand):
+    help = "Créditer les congés acquis du mois à tous les employés actifs"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mois', help="Mois d'acquisition (AAAA-MM), par défaut le mois précédent")
+
+    def handle(self, *args, **options):
+        if options['mois']:
+            try:
+                periode = periode_depuis_texte(options['mois'])
+            except ValueError:
+                raise CommandError("Format de mois attendu : AAAA-MM")
+        else:
+            periode = mois_precedent()
+
+        total = acquerir_conges(periode)
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} acquisition(s) de congés enregistrée(s) pour {periode:%m/%Y}."
+        ))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from gestion_Horraire.feuilles_temps import periode_depuis_texte, mois_precedent
+from rh.paie import CalculPaieEnCours, calculer_paie
+
+
+class Command(BaseCommand):
+    help = "Calculer les fiches de paie mensuelles de tous les employés actifs"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mois', help="Mois à calculer (AAAA-MM), par défaut le mois précédent")
+        parser.add_argument('--processus', type=int, help="Nombre de processus (par défaut le nombre de CPU)")
+        parser.add_argument('--forcer', action='store_true', help="Recalculer aussi les fiches inchangées")
+
+    def handle(self, *args, **options):
+        if options['mois']:
+            try:
+                periode = periode_depuis_texte(options['mois'])
+            except ValueError:
+                raise CommandError("Format de mois attendu : AAAA-MM")
+        else:
+            periode = mois_precedent()
+
+        try:
+            run = calculer_paie(periode, processus=options['processus'], forcer=options['forcer'])
+        except CalculPaieEnCours as erreur:
+            raise CommandError(str(erreur))
+        self.stdout.write(self.style.SUCCESS(
+            f"Paie {periode:%m/%Y} : {run.computed_count} fiche(s) calculée(s), "
+            f"{run.unchanged_count} inchangée(s) sur {run.employee_count} employé(s)."
+        ))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from gestion_Horraire.feuilles_temps import periode_depuis_texte, mois_precedent
+from rh.bulletins import generer_bulletins
+from rh.models import Payroll
+
+
+class Command(BaseCommand):
+    help = "Générer (ou compléter en cache) les bulletins de paie DOCX d'un mois"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mois', help="Mois des fiches (AAAA-MM), par défaut le mois précédent")
+        parser.add_argument('--processus', type=int, help="Nombre de processus (par défaut le nombre de CPU)")
+
+    def handle(self, *args, **options):
+        if options['mois']:
+            try:
+                periode = periode_depuis_texte(options['mois'])
+            except ValueError:
+                raise CommandError("Format de mois attendu : AAAA-MM")
+        else:
+            periode = mois_precedent()
+
+        fiches = Payroll.objects.select_related('employee__employee_profile__department').filter(month=periode)
+        bulletins = generer_bulletins(fiches.iterator(chunk_size=500), processus=options['processus'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(bulletins)} bulletin(s) de paie disponible(s) pour {periode:%m/%Y}."
+        ))
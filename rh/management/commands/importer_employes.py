@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from rh.import_employes import importer_employes, lire_lignes, TAILLE_LOT
+
+
+class Command(BaseCommand):
+    help = "Importer des employés en masse depuis un fichier CSV ou XLSX"
+
+    def add_arguments(self, parser):
+        parser.add_argument('fichier', help="Fichier CSV (séparateur , ou ;) ou XLSX avec une ligne d'en-tête")
+        parser.add_argument('--processus', type=int, help="Processus de hachage des mots de passe (par défaut : nombre de processeurs)")
+        parser.add_argument('--taille-lot', type=int, default=TAILLE_LOT, help="Nombre d'employés créés par transaction")
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['fichier'], 'rb') as fichier:
+                rapport = importer_employes(
+                    lire_lignes(fichier, options['fichier']),
+                    processus=options['processus'],
+                    taille_lot=options['taille_lot'],
+                )
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Lecture du fichier impossible : {e}")
+
+        for erreur in rapport['erreurs']:
+            self.stdout.write(self.style.WARNING(f"Ligne {erreur['ligne']} ({erreur['username'] or '-'}) : {erreur['erreur']}"))
+        self.stdout.write(self.style.SUCCESS(
+            f"{rapport['crees']} employé(s) créé(s), {len(rapport['erreurs'])} ligne(s) en erreur."
+        ))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from rh.cache_dashboard import rafraichir_widget
+from rh.views import DASHBOARD_WIDGETS
+
+
+class Command(BaseCommand):
+    help = "Précalculer les widgets du tableau de bord RH dans le cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument('widgets', nargs='*', help="Widgets à recalculer (par défaut tous)")
+
+    def handle(self, *args, **options):
+        noms = options['widgets'] or list(DASHBOARD_WIDGETS)
+        inconnus = set(noms) - set(DASHBOARD_WIDGETS)
+        if inconnus:
+            raise CommandError(
+                f"Widget(s) inconnu(s) : {', '.join(sorted(inconnus))}. Choix : {', '.join(DASHBOARD_WIDGETS)}"
+            )
+        for nom in noms:
+            rafraichir_widget(nom, DASHBOARD_WIDGETS[nom])
+        self.stdout.write(self.style.SUCCESS(f"{len(noms)} widget(s) du tableau de bord RH en cache."))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand, CommandError
+from rh.recherche import index_disponible, reconstruire_index
+
+
+class Command(BaseCommand):
+    help = "Reconstruire l'index de recherche plein texte des employés (SQLite FTS5)"
+
+    def handle(self, *args, **options):
+        if not index_disponible():
+            raise CommandError("L'index plein texte n'est disponible que sur SQLite.")
+        total = reconstruire_index()
+        self.stdout.write(self.style.SUCCESS(f"{total} employé(s) indexé(s)."))
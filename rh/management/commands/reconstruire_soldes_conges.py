@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from rh.soldes_conges import reconstruire_soldes
+
+
+class Command(BaseCommand):
+    help = "Recalculer les soldes de congés depuis le compte de mouvements"
+
+    def handle(self, *args, **options):
+        total = reconstruire_soldes()
+        self.stdout.write(self.style.SUCCESS(f"{total} solde(s) de congés reconstruit(s)."))
@@ -0,0 +1,102 @@
+# Generated by Django 5.2.5 on 2026-10-18 08:06
+
+from datetime import datetime, time
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def remplir_activites(apps, schema_editor):
+    """Reprend l'historique existant pour que le fil ne démarre pas vide"""
+    ActivityEvent = apps.get_model('rh', 'ActivityEvent')
+    PointageHoraire = apps.get_model('gestion_Horraire', 'PointageHoraire')
+    LeaveRequest = apps.get_model('rh', 'LeaveRequest')
+    PerformanceReview = apps.get_model('rh', 'PerformanceReview')
+    Payroll = apps.get_model('rh', 'Payroll')
+
+    def a_la_date(jour, heure=time.min):
+        return timezone.make_aware(datetime.combine(jour, heure))
+
+    def evenement(employe, **champs):
+        return ActivityEvent(
+            employee_id=employe.id, department_id=employe.department_id, site_id=employe.site_id, **champs
+        )
+
+    statuts_conge = {'pending': 'En attente', 'approved': 'Approuvé', 'rejected': 'Rejeté'}
+    types_conge = {
+        'paid': 'Congé payé', 'unpaid': 'Congé sans solde', 'sick': 'Congé maladie',
+        'maternity': 'Congé maternité', 'paternity': 'Congé paternité',
+    }
+
+    def evenements():
+        for pointage in PointageHoraire.objects.select_related('employe').iterator(chunk_size=2000):
+            if pointage.heure_arrivee:
+                yield evenement(
+                    pointage.employe, timestamp=a_la_date(pointage.date, pointage.heure_arrivee),
+                    event_type='pointage', action='Pointage arrivée', status=pointage.status,
+                )
+            if pointage.heure_depart:
+                yield evenement(
+                    pointage.employe, timestamp=a_la_date(pointage.date, pointage.heure_depart),
+                    event_type='pointage', action='Pointage départ', status=pointage.status,
+                )
+        for conge in LeaveRequest.objects.select_related('employee').iterator(chunk_size=2000):
+            yield evenement(
+                conge.employee, timestamp=conge.created_at, event_type='conge',
+                action=f"Demande de congé ({types_conge.get(conge.leave_type, conge.leave_type)})",
+                status=statuts_conge.get(conge.status, conge.status),
+            )
+        for evaluation in PerformanceReview.objects.select_related('employee').iterator(chunk_size=2000):
+            yield evenement(
+                evaluation.employee, timestamp=a_la_date(evaluation.review_date), event_type='performance',
+                action='Évaluation de performance', status=f'Note: {evaluation.overall_rating}/5',
+            )
+        for paie in Payroll.objects.select_related('employee').iterator(chunk_size=2000):
+            yield evenement(
+                paie.employee, timestamp=a_la_date(paie.month), event_type='paie',
+                action='Paiement de paie', status=f'{paie.total_salary} €',
+            )
+
+    lot = []
+    for ligne in evenements():
+        lot.append(ligne)
+        if len(lot) >= 1000:
+            ActivityEvent.objects.bulk_create(lot)
+            lot = []
+    ActivityEvent.objects.bulk_create(lot)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_userpermission'),
+        ('gestion_Horraire', '0010_timesheet'),
+        ('rh', '0003_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Date/Heure')),
+                ('event_type', models.CharField(choices=[('pointage', 'Pointage'), ('conge', 'Congé'), ('performance', 'Performance'), ('paie', 'Paie')], max_length=20, verbose_name='Type')),
+                ('action', models.CharField(max_length=255, verbose_name='Action')),
+                ('status', models.CharField(blank=True, default='', max_length=100, verbose_name='Statut')),
+                ('department', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='accounts.department')),
+                ('employee', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='activity_events', to=settings.AUTH_USER_MODEL)),
+                ('site', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='accounts.site')),
+            ],
+            options={
+                'verbose_name': "Événement d'activité",
+                'verbose_name_plural': "Événements d'activité",
+                'ordering': ['-timestamp', '-id'],
+                'indexes': [models.Index(fields=['timestamp', 'id'], name='rh_activity_timesta_d289f4_idx'), models.Index(fields=['department', 'timestamp'], name='rh_activity_departm_8d58db_idx'), models.Index(fields=['site', 'timestamp'], name='rh_activity_site_id_525ff1_idx'), models.Index(fields=['event_type', 'timestamp'], name='rh_activity_event_t_2945b7_idx')],
+            },
+        ),
+        migrations.RunPython(remplir_activites, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:30
+
+import re
+import unicodedata
+
+from django.db import migrations
+
+# Copie figée de rh/recherche.py à la date de la migration : la migration
+# ne dépend pas du code applicatif, qui pourra évoluer.
+TAILLE_LOT = 500
+
+
+def normaliser(texte):
+    texte = unicodedata.normalize('NFKD', str(texte or ''))
+    return ''.join(c for c in texte if not unicodedata.combining(c)).lower().strip()
+
+
+def ligne_index(user):
+    profil = getattr(user, 'detailed_profile', None)
+    profil_rh = getattr(user, 'employee_profile', None)
+    telephones = [t for t in ([profil.phone_number, profil.secondary_phone] if profil else []) if t]
+    return (
+        user.id,
+        normaliser(user.username),
+        normaliser(' '.join(filter(None, [user.first_name, user.last_name, profil.full_name if profil else None]))),
+        normaliser(profil_rh.employee_id if profil_rh else ''),
+        normaliser(user.email),
+        ' '.join(telephones + [re.sub(r'\D', '', t) for t in telephones]),
+        normaliser(profil.id_number if profil else ''),
+        normaliser(profil_rh.position if profil_rh else ''),
+    )
+
+
+def creer_index(apps, schema_editor):
+    # Table virtuelle FTS5 : SQLite uniquement (ailleurs, la recherche se replie sur l'ORM)
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS rh_recherche_employes USING fts5("
+        "user_id UNINDEXED, username, nom, matricule, email, telephone, piece_identite, poste, "
+        "tokenize='trigram')"
+    )
+    CustomUser = apps.get_model('accounts', 'CustomUser')
+    utilisateurs = CustomUser.objects.select_related('detailed_profile', 'employee_profile').order_by('id')
+    with schema_editor.connection.cursor() as curseur:
+        curseur.execute("DELETE FROM rh_recherche_employes")
+        lot = []
+        for user in utilisateurs.iterator(chunk_size=TAILLE_LOT):
+            lot.append(ligne_index(user))
+            if len(lot) >= TAILLE_LOT:
+                curseur.executemany("INSERT INTO rh_recherche_employes VALUES (%s, %s, %s, %s, %s, %s, %s, %s)", lot)
+                lot = []
+        if lot:
+            curseur.executemany("INSERT INTO rh_recherche_employes VALUES (%s, %s, %s, %s, %s, %s, %s, %s)", lot)
+
+
+def supprimer_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS rh_recherche_employes")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_userpermission'),
+        ('rh', '0004_activityevent'),
+    ]
+
+    operations = [
+        migrations.RunPython(creer_index, supprimer_index),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.5 on 2026-10-18 08:16
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rh', '0005_recherche_employes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PayrollRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(unique=True, verbose_name='Mois')),
+                ('status', models.CharField(choices=[('running', 'En cours'), ('done', 'Terminé'), ('failed', 'Échec')], default='running', max_length=20, verbose_name='Statut')),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Début')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Fin')),
+                ('employee_count', models.IntegerField(default=0, verbose_name='Employés')),
+                ('computed_count', models.IntegerField(default=0, verbose_name='Fiches recalculées')),
+                ('unchanged_count', models.IntegerField(default=0, verbose_name='Fiches inchangées')),
+                ('error', models.TextField(blank=True, null=True, verbose_name='Erreur')),
+            ],
+            options={
+                'verbose_name': 'Calcul de paie',
+                'verbose_name_plural': 'Calculs de paie',
+                'ordering': ['-month'],
+            },
+        ),
+        migrations.AddField(
+            model_name='payroll',
+            name='details',
+            field=models.JSONField(blank=True, default=dict, verbose_name='Détail du calcul'),
+        ),
+        migrations.AddField(
+            model_name='payroll',
+            name='inputs_hash',
+            field=models.CharField(blank=True, default='', max_length=64, verbose_name='Empreinte des données'),
+        ),
+        migrations.AddField(
+            model_name='payroll',
+            name='run',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='payrolls', to='rh.payrollrun'),
+        ),
+        migrations.AddIndex(
+            model_name='payroll',
+            index=models.Index(fields=['month', 'employee'], name='rh_payroll_month_b15535_idx'),
+        ),
+    ]
@@ -0,0 +1,112 @@
+# Generated by Django 5.2.5 on 2026-10-18 08:21
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def remplir_soldes(apps, schema_editor):
+    """Consommation des demandes déjà approuvées des types décomptés, puis soldes agrégés depuis le compte"""
+    types_decomptes = getattr(settings, 'RH_CONGES_DECOMPTES', None)
+    if types_decomptes is None:
+        types_decomptes = getattr(settings, 'RH_CONGES_ACQUIS_PAR_MOIS', {'paid': '2.5'}).keys()
+    LeaveRequest = apps.get_model('rh', 'LeaveRequest')
+    LeaveLedgerEntry = apps.get_model('rh', 'LeaveLedgerEntry')
+    LeaveBalance = apps.get_model('rh', 'LeaveBalance')
+
+    def consommations():
+        for demande in LeaveRequest.objects.filter(
+            status='approved', leave_type__in=list(types_decomptes)
+        ).iterator(chunk_size=1000):
+            yield LeaveLedgerEntry(
+                employee_id=demande.employee_id, leave_type=demande.leave_type, kind='consumption',
+                days=-((demande.end_date - demande.start_date).days + 1), leave_request_id=demande.id,
+                created_at=demande.updated_at,
+            )
+
+    lot = []
+    for entree in consommations():
+        lot.append(entree)
+        if len(lot) >= 1000:
+            LeaveLedgerEntry.objects.bulk_create(lot)
+            lot = []
+    LeaveLedgerEntry.objects.bulk_create(lot)
+
+    LeaveBalance.objects.bulk_create([
+        LeaveBalance(employee_id=ligne['employee_id'], leave_type=ligne['leave_type'], balance=ligne['total'])
+        for ligne in LeaveLedgerEntry.objects.values('employee_id', 'leave_type').annotate(total=Sum('days'))
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('rh', '0006_payrollrun'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaveBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('leave_type', models.CharField(choices=[('paid', 'Congé payé'), ('unpaid', 'Congé sans solde'), ('sick', 'Congé maladie'), ('maternity', 'Congé maternité'), ('paternity', 'Congé paternité')], max_length=20, verbose_name='Type de congé')),
+                ('balance', models.DecimalField(decimal_places=2, default=0, max_digits=8, verbose_name='Solde (jours)')),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Mis à jour le')),
+            ],
+            options={
+                'verbose_name': 'Solde de congés',
+                'verbose_name_plural': 'Soldes de congés',
+            },
+        ),
+        migrations.CreateModel(
+            name='LeaveLedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('leave_type', models.CharField(choices=[('paid', 'Congé payé'), ('unpaid', 'Congé sans solde'), ('sick', 'Congé maladie'), ('maternity', 'Congé maternité'), ('paternity', 'Congé paternité')], max_length=20, verbose_name='Type de congé')),
+                ('kind', models.CharField(choices=[('accrual', 'Acquisition'), ('consumption', 'Consommation'), ('adjustment', 'Régularisation')], max_length=20, verbose_name='Mouvement')),
+                ('days', models.DecimalField(decimal_places=2, max_digits=6, verbose_name='Jours')),
+                ('period', models.DateField(blank=True, null=True, verbose_name="Période d'acquisition")),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Date')),
+            ],
+            options={
+                'verbose_name': 'Mouvement de congés',
+                'verbose_name_plural': 'Mouvements de congés',
+                'ordering': ['-created_at', '-id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='leaverequest',
+            index=models.Index(fields=['employee', 'start_date', 'end_date'], name='rh_leavereq_employe_c1a1cd_idx'),
+        ),
+        migrations.AddField(
+            model_name='leavebalance',
+            name='employee',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leave_balances', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='leaveledgerentry',
+            name='employee',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leave_ledger', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='leaveledgerentry',
+            name='leave_request',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ledger_entries', to='rh.leaverequest'),
+        ),
+        migrations.AddConstraint(
+            model_name='leavebalance',
+            constraint=models.UniqueConstraint(fields=('employee', 'leave_type'), name='rh_solde_conges_unique'),
+        ),
+        migrations.AddIndex(
+            model_name='leaveledgerentry',
+            index=models.Index(fields=['employee', 'leave_type', 'created_at'], name='rh_leaveled_employe_3f37de_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='leaveledgerentry',
+            constraint=models.UniqueConstraint(condition=models.Q(('kind', 'accrual')), fields=('employee', 'leave_type', 'period'), name='rh_acquisition_conges_unique'),
+        ),
+        migrations.RunPython(remplir_soldes, migrations.RunPython.noop),
+    ]
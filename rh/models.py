@@ -3,12 +3,16 @@
 Modèles RH de base :
 - EmployeeProfile : informations RH rattachées à un utilisateur
 - LeaveRequest : demande de congé simple
+- LeaveLedgerEntry / LeaveBalance : mouvements et solde matérialisé des congés
+- PayrollRun : calcul de paie mensuel de tous les employés actifs
+- ActivityEvent : journal d'activité (append-only) du tableau de bord RH
 """
 
 from django.db import models
 from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.utils import timezone
-from accounts.models import CustomUser, Department
+from accounts.models import CustomUser, Department, Site
 
 class EmployeeProfile(models.Model):
     """Profil RH étendu pour un employé."""
@@ -32,6 +36,21 @@ class EmployeeProfile(models.Model):
     def __str__(self):
         return f"{self.user.get_full_name() or self.user.username} - {self.employee_id}"
 
+class LeaveRequestManager(models.Manager):
+    def chevauchements(self, employee_id, start_date, end_date, exclude_id=None):
+        """
+        Demandes en attente ou approuvées de l'employé qui chevauchent la
+        période (index employee, start_date, end_date).
+        """
+        demandes = self.filter(
+            employee_id=employee_id, start_date__lte=end_date, end_date__gte=start_date,
+            status__in=['pending', 'approved'],
+        )
+        if exclude_id is not None:
+            demandes = demandes.exclude(pk=exclude_id)
+        return demandes
+
+
 class LeaveRequest(models.Model):
     """Demande de congé."""
     REQUEST_TYPES = [
@@ -56,7 +75,27 @@ class LeaveRequest(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', verbose_name="Statut")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Date de création")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Date de mise à jour")
+
+    objects = LeaveRequestManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['employee', 'start_date', 'end_date']),
+        ]
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Statut lu en base : permet aux signaux de détecter un changement de statut
+        instance._status_initial = instance.__dict__.get('status')
+        # Période lue en base : les pointages CONGE sont alignés sur le changement
+        instance._periode_initiale = instance.periode_conge()
+        return instance
+
+    def periode_conge(self):
+        """(employee_id, status, start_date, end_date) : ce qui détermine les jours CONGE"""
+        return tuple(self.__dict__.get(champ) for champ in ('employee_id', 'status', 'start_date', 'end_date'))
+
     def __str__(self):
         return f"{self.employee.username} - {self.leave_type} ({self.start_date} to {self.end_date})"
     
@@ -67,6 +106,102 @@ class LeaveRequest(models.Model):
             return (self.end_date - self.start_date).days + 1
         return 0
 
+    def clean(self):
+        if self.start_date and self.end_date:
+            if self.end_date < self.start_date:
+                raise ValidationError("La date de fin précède la date de début.")
+            if self.employee_id and self.status != 'rejected':
+                autre = LeaveRequest.objects.chevauchements(
+                    self.employee_id, self.start_date, self.end_date, exclude_id=self.pk
+                ).first()
+                if autre:
+                    raise ValidationError(
+                        f"Cette demande chevauche une autre demande du {autre.start_date:%d/%m/%Y} "
+                        f"au {autre.end_date:%d/%m/%Y} ({autre.get_status_display()})."
+                    )
+
+class LeaveLedgerEntry(models.Model):
+    """
+    Mouvement du compte de congés (voir rh/soldes_conges.py) : acquisition
+    mensuelle, consommation d'une demande approuvée ou régularisation.
+    Jours positifs = crédit, négatifs = débit.
+    """
+    KIND_CHOICES = [
+        ('accrual', 'Acquisition'),
+        ('consumption', 'Consommation'),
+        ('adjustment', 'Régularisation'),
+    ]
+
+    employee = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='leave_ledger')
+    leave_type = models.CharField(max_length=20, choices=LeaveRequest.REQUEST_TYPES, verbose_name="Type de congé")
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, verbose_name="Mouvement")
+    days = models.DecimalField(max_digits=6, decimal_places=2, verbose_name="Jours")
+    period = models.DateField(null=True, blank=True, verbose_name="Période d'acquisition")
+    leave_request = models.ForeignKey(
+        LeaveRequest, on_delete=models.SET_NULL, null=True, blank=True, related_name='ledger_entries'
+    )
+    created_at = models.DateTimeField(default=timezone.now, verbose_name="Date")
+
+    class Meta:
+        verbose_name = "Mouvement de congés"
+        verbose_name_plural = "Mouvements de congés"
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['employee', 'leave_type', 'created_at']),
+        ]
+        constraints = [
+            # Une seule acquisition par employé, type et période
+            models.UniqueConstraint(
+                fields=['employee', 'leave_type', 'period'], condition=models.Q(kind='accrual'),
+                name='rh_acquisition_conges_unique',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.employee.username} - {self.get_kind_display()} {self.days} j ({self.leave_type})"
+
+class LeaveBalance(models.Model):
+    """Solde de congés matérialisé, tenu à jour à chaque mouvement du compte."""
+    employee = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='leave_balances')
+    leave_type = models.CharField(max_length=20, choices=LeaveRequest.REQUEST_TYPES, verbose_name="Type de congé")
+    balance = models.DecimalField(max_digits=8, decimal_places=2, default=0, verbose_name="Solde (jours)")
+    updated_at = models.DateTimeField(default=timezone.now, verbose_name="Mis à jour le")
+
+    class Meta:
+        verbose_name = "Solde de congés"
+        verbose_name_plural = "Soldes de congés"
+        constraints = [
+            models.UniqueConstraint(fields=['employee', 'leave_type'], name='rh_solde_conges_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.employee.username} - {self.get_leave_type_display()} : {self.balance} j"
+
+class PayrollRun(models.Model):
+    """Calcul de paie d'un mois (voir rh/paie.py)."""
+    STATUS_CHOICES = [
+        ('running', 'En cours'),
+        ('done', 'Terminé'),
+        ('failed', 'Échec'),
+    ]
+
+    month = models.DateField(unique=True, verbose_name="Mois")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='running', verbose_name="Statut")
+    started_at = models.DateTimeField(default=timezone.now, verbose_name="Début")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Fin")
+    employee_count = models.IntegerField(default=0, verbose_name="Employés")
+    computed_count = models.IntegerField(default=0, verbose_name="Fiches recalculées")
+    unchanged_count = models.IntegerField(default=0, verbose_name="Fiches inchangées")
+    error = models.TextField(blank=True, null=True, verbose_name="Erreur")
+
+    class Meta:
+        verbose_name = "Calcul de paie"
+        verbose_name_plural = "Calculs de paie"
+        ordering = ['-month']
+
+    def __str__(self):
+        return f"Paie {self.month.strftime('%m/%Y')} ({self.get_status_display()})"
+
 class Payroll(models.Model):
     """Fiche de paie."""
     employee = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='payrolls')
@@ -76,6 +211,22 @@ class Payroll(models.Model):
     deductions = models.DecimalField(max_digits=10, decimal_places=2, default=0, verbose_name="Déductions")
     total_salary = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Salaire net")
     paid_date = models.DateField(null=True, blank=True, verbose_name="Date de paiement")
+    # Renseignés par le calcul de paie : détail des montants et empreinte des données d'entrée
+    run = models.ForeignKey(PayrollRun, on_delete=models.SET_NULL, null=True, blank=True, related_name='payrolls')
+    details = models.JSONField(default=dict, blank=True, verbose_name="Détail du calcul")
+    inputs_hash = models.CharField(max_length=64, blank=True, default='', verbose_name="Empreinte des données")
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['month', 'employee']),
+        ]
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Date de paiement lue en base : le fil d'activité signale le passage à "payée"
+        instance._paid_date_initial = instance.__dict__.get('paid_date')
+        return instance
     
     def __str__(self):
         return f"{self.employee.username} - {self.month.strftime('%B %Y')}"
@@ -120,4 +271,66 @@ class Recruitment(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='open', verbose_name="Statut")
     
     def __str__(self):
-        return f"{self.title} - {self.department}"
\ No newline at end of file
+        return f"{self.title} - {self.department}"
+
+
+class ActivityEventManager(models.Manager):
+    def construire(self, employee, event_type, action, status='', timestamp=None):
+        """
+        Événement non enregistré (pour bulk_create). `employee` est un
+        CustomUser : son département et son site sont recopiés sur l'événement
+        pour filtrer le fil sans jointure.
+        """
+        return self.model(
+            timestamp=timestamp or timezone.now(),
+            event_type=event_type,
+            employee_id=employee.pk if employee else None,
+            department_id=employee.department_id if employee else None,
+            site_id=employee.site_id if employee else None,
+            action=action,
+            status=status,
+        )
+
+    def enregistrer(self, employee, event_type, action, status='', timestamp=None):
+        evenement = self.construire(employee, event_type, action, status, timestamp)
+        evenement.save()
+        return evenement
+
+
+class ActivityEvent(models.Model):
+    """
+    Événement du fil d'activité RH. Table en ajout seul, alimentée par les
+    signaux de rh/signals.py et par les chemins d'écriture en masse ; le
+    tableau de bord la lit par curseur (timestamp, id).
+    """
+    TYPE_CHOICES = [
+        ('pointage', 'Pointage'),
+        ('conge', 'Congé'),
+        ('performance', 'Performance'),
+        ('paie', 'Paie'),
+    ]
+
+    timestamp = models.DateTimeField(default=timezone.now, verbose_name="Date/Heure")
+    event_type = models.CharField(max_length=20, choices=TYPE_CHOICES, verbose_name="Type")
+    employee = models.ForeignKey(CustomUser, on_delete=models.SET_NULL, null=True, blank=True, related_name='activity_events')
+    # Affectation de l'employé au moment de l'événement (dénormalisée pour le filtrage)
+    department = models.ForeignKey(Department, on_delete=models.SET_NULL, null=True, blank=True)
+    site = models.ForeignKey(Site, on_delete=models.SET_NULL, null=True, blank=True)
+    action = models.CharField(max_length=255, verbose_name="Action")
+    status = models.CharField(max_length=100, blank=True, default='', verbose_name="Statut")
+
+    objects = ActivityEventManager()
+
+    class Meta:
+        verbose_name = "Événement d'activité"
+        verbose_name_plural = "Événements d'activité"
+        ordering = ['-timestamp', '-id']
+        indexes = [
+            models.Index(fields=['timestamp', 'id']),
+            models.Index(fields=['department', 'timestamp']),
+            models.Index(fields=['site', 'timestamp']),
+            models.Index(fields=['event_type', 'timestamp']),
+        ]
+
+    def __str__(self):
+        return f"{self.timestamp:%Y-%m-%d %H:%M} - {self.action}"
@@ -0,0 +1,286 @@
+"""
+Calcul de paie mensuel de tous les employés actifs.
+
+- Données d'entrée lues par quelques requêtes ensemblistes pour tout le mois
+  (profils RH, pointages, congés sans solde, fiches existantes).
+- Calcul des montants par département dans le pool de rh/parallele.py :
+  les processus reçoivent des données simples et n'accèdent pas à la base.
+- Écriture des fiches Payroll dans une seule transaction : la fiche non
+  payée existante d'un employé est mise à jour (bulk_update, son id et le
+  lien de son bulletin sont conservés), les autres sont créées par
+  bulk_create ; les fiches calculées devenues sans objet sont supprimées.
+
+Chaque fiche garde l'empreinte (sha256) de ses données d'entrée : relancer
+le calcul d'un mois ne recalcule que les employés dont l'empreinte a changé.
+Les fiches déjà payées (paid_date renseignée) ne sont jamais recalculées.
+"""
+import hashlib
+import json
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal, ROUND_HALF_UP
+from django.db import transaction
+from django.utils import timezone
+from gestion_Horraire.feuilles_temps import bornes_periode, jours_ouvres_periode, seuils_journee, minutes_du_jour
+from gestion_Horraire.models import PointageHoraire, ParametresHoraires
+from .cache_dashboard import invalider_widgets
+from .models import EmployeeProfile, LeaveRequest, Payroll, PayrollRun
+from .parallele import creer_pool, executer
+
+TAILLE_LOT = 500
+CENTIME = Decimal('0.01')
+# Majoration des heures supplémentaires payées en prime
+MAJORATION_HEURES_SUP = Decimal('1.25')
+# Incrémenter si les règles de calcul changent : toutes les fiches non payées seront recalculées
+VERSION_CALCUL = 2
+# Champs écrits par le calcul sur une fiche non payée
+CHAMPS_CALCULES = ['run', 'inputs_hash', 'details', 'base_salary', 'bonuses', 'deductions', 'total_salary']
+# Un calcul resté "en cours" plus longtemps est considéré comme interrompu
+DUREE_MAX_CALCUL = timedelta(hours=1)
+
+
+class CalculPaieEnCours(Exception):
+    """Un autre calcul du même mois est en cours"""
+
+
+# =============================================================================
+# Calcul pur (exécuté dans le pool de processus)
+# =============================================================================
+def _arrondi(montant):
+    return Decimal(montant).quantize(CENTIME, rounding=ROUND_HALF_UP)
+
+
+def calculer_fiche(entree, minutes_jour):
+    """Montants d'une fiche à partir des données d'entrée d'un employé"""
+    base = entree['salaire']
+    taux_jour = base / entree['jours_ouvres'] if entree['jours_ouvres'] else Decimal(0)
+    taux_minute = taux_jour / minutes_jour if minutes_jour else Decimal(0)
+
+    details = {
+        'taux_journalier': _arrondi(taux_jour),
+        # Nombres de jours repris tels quels sur le bulletin
+        'jours_absence': entree['jours_absence'],
+        'jours_sans_solde': entree['jours_sans_solde'],
+        'jours_hors_contrat': entree['jours_hors_contrat'],
+        'deduction_absences': _arrondi(taux_jour * entree['jours_absence']),
+        'deduction_conges_sans_solde': _arrondi(taux_jour * entree['jours_sans_solde']),
+        'deduction_hors_contrat': _arrondi(taux_jour * entree['jours_hors_contrat']),
+        'deduction_retards': _arrondi(taux_minute * entree['minutes_retard']),
+        'prime_heures_supplementaires': _arrondi(
+            taux_minute * entree['minutes_supplementaires'] * MAJORATION_HEURES_SUP
+        ),
+    }
+    # Les retenues ne dépassent pas le salaire de base
+    deductions = min(_arrondi(base), sum(v for k, v in details.items() if k.startswith('deduction_')))
+    primes = details['prime_heures_supplementaires']
+    return {
+        'employee_id': entree['employee_id'],
+        'base_salary': _arrondi(base),
+        'bonuses': primes,
+        'deductions': deductions,
+        'total_salary': _arrondi(base) + primes - deductions,
+        'details': details,
+    }
+
+
+def calculer_departement(lot):
+    """lot : (minutes_jour, [entrées d'un département]) ; retourne la liste des montants"""
+    minutes_jour, entrees = lot
+    return [calculer_fiche(entree, minutes_jour) for entree in entrees]
+
+
+# =============================================================================
+# Lecture des données d'entrée
+# =============================================================================
+def empreinte(entree):
+    valeurs = {cle: entree[cle] for cle in sorted(entree) if cle not in ('employee_id', 'department_id')}
+    valeurs['version'] = VERSION_CALCUL
+    return hashlib.sha256(json.dumps(valeurs, default=str, sort_keys=True).encode()).hexdigest()
+
+
+def collecter_entrees(mois):
+    """
+    Données d'entrée de chaque employé actif avec un salaire, par requêtes
+    ensemblistes sur le mois. Retourne (entrées par employé, minutes d'une journée standard).
+    Les absences ne portent que sur les jours écoulés, hors aujourd'hui (la
+    journée n'est pas close : un employé pas encore arrivé n'est pas absent) ;
+    les congés sans solde approuvés sur tout le mois.
+    """
+    parametres = ParametresHoraires.get_actifs(creer=True)
+    debut, fin = bornes_periode(mois)
+    fin_comptee = min(fin, timezone.localdate() - timedelta(days=1))
+    jours_ouvres = jours_ouvres_periode(parametres, debut, fin)
+    seuil_retard, duree_standard = seuils_journee(parametres)
+
+    profils = EmployeeProfile.objects.filter(
+        is_active=True, user__is_active=True, salary__isnull=False,
+    )
+    entrees = {}
+    embauches = {}
+    for user_id, department_id, salaire, date_embauche in profils.values_list(
+        'user_id', 'department_id', 'salary', 'hire_date'
+    ):
+        hors_contrat = {j for j in jours_ouvres if date_embauche and j < date_embauche}
+        embauches[user_id] = hors_contrat
+        entrees[user_id] = {
+            'employee_id': user_id,
+            'department_id': department_id,
+            'salaire': salaire,
+            'jours_ouvres': len(jours_ouvres),
+            'jours_hors_contrat': len(hors_contrat),
+            'jours_absence': 0,
+            'jours_sans_solde': 0,
+            'minutes_retard': 0,
+            'minutes_supplementaires': 0,
+        }
+    # Sous-requête plutôt qu'une liste d'ids : pas de limite de paramètres SQL
+    ids = profils.values('user_id')
+    jours_presents = defaultdict(set)
+    jours_conge = defaultdict(set)
+
+    # Requête : pointages du mois
+    pointages = PointageHoraire.objects.filter(
+        employe_id__in=ids, date__range=(debut, fin_comptee)
+    ).values_list('employe_id', 'date', 'status', 'heure_arrivee', 'duree_travail_minutes')
+    for employe_id, jour, status, heure_arrivee, duree in pointages.iterator(chunk_size=2000):
+        entree = entrees[employe_id]
+        if status == 'CONGE':
+            jours_conge[employe_id].add(jour)
+            continue
+        if not heure_arrivee:
+            continue
+        jours_presents[employe_id].add(jour)
+        entree['minutes_supplementaires'] += max(0, duree - duree_standard)
+        entree['minutes_retard'] += max(0, int(minutes_du_jour(heure_arrivee) - seuil_retard))
+
+    # Requête : congés approuvés qui chevauchent le mois
+    jours_sans_solde = defaultdict(set)
+    conges = LeaveRequest.objects.filter(
+        employee_id__in=ids, status='approved', start_date__lte=fin, end_date__gte=debut
+    ).values_list('employee_id', 'leave_type', 'start_date', 'end_date')
+    for employe_id, leave_type, date_debut, date_fin in conges.iterator(chunk_size=2000):
+        jour = max(date_debut, debut)
+        while jour <= min(date_fin, fin):
+            if jour in jours_ouvres:
+                jours_conge[employe_id].add(jour)
+                if leave_type == 'unpaid':
+                    jours_sans_solde[employe_id].add(jour)
+            jour += timedelta(days=1)
+
+    jours_ecoules = {j for j in jours_ouvres if j <= fin_comptee}
+    for employe_id, entree in entrees.items():
+        presents = jours_presents[employe_id]
+        hors_contrat = embauches[employe_id]
+        entree['jours_sans_solde'] = len(jours_sans_solde[employe_id] - presents - hors_contrat)
+        entree['jours_absence'] = len(jours_ecoules - presents - jours_conge[employe_id] - hors_contrat)
+    return entrees, duree_standard
+
+
+# =============================================================================
+# Calcul d'un mois
+# =============================================================================
+def _demarrer(debut):
+    """Crée ou reprend le PayrollRun du mois ; refuse un calcul déjà en cours"""
+    with transaction.atomic():
+        run, cree = PayrollRun.objects.select_for_update().get_or_create(month=debut)
+        if not cree:
+            if run.status == 'running' and timezone.now() - run.started_at < DUREE_MAX_CALCUL:
+                raise CalculPaieEnCours(f"Un calcul de la paie {debut:%m/%Y} est déjà en cours.")
+            run.status = 'running'
+            run.started_at = timezone.now()
+            run.finished_at = None
+            run.error = None
+            run.save(update_fields=['status', 'started_at', 'finished_at', 'error'])
+    return run
+
+
+def calculer_paie(mois, processus=None, forcer=False):
+    """
+    Calcule les fiches de paie du mois de `mois` ; retourne le PayrollRun.
+    processus : nombre de processus du pool (par défaut le nombre de CPU).
+    forcer : recalcule aussi les fiches dont les données n'ont pas changé.
+    """
+    debut, _ = bornes_periode(mois)
+    run = _demarrer(debut)
+    try:
+        entrees, minutes_jour = collecter_entrees(debut)
+        # Fiches du mois : employés déjà payés, et fiche non payée (la plus ancienne) de chaque employé
+        payes = set()
+        existantes = {}
+        obsoletes = []
+        for fiche_id, employe_id, empreinte_existante, paye in Payroll.objects.filter(
+            month=debut
+        ).order_by('id').values_list('id', 'employee_id', 'inputs_hash', 'paid_date'):
+            if paye:
+                payes.add(employe_id)
+            elif employe_id not in existantes:
+                existantes[employe_id] = (fiche_id, empreinte_existante)
+            elif empreinte_existante:
+                obsoletes.append(fiche_id)
+        empreintes = {}
+        departements = defaultdict(list)
+        for employe_id, entree in entrees.items():
+            if employe_id in payes:
+                continue
+            empreintes[employe_id] = empreinte(entree)
+            if forcer or empreintes[employe_id] != existantes.get(employe_id, (None, None))[1]:
+                departements[entree['department_id']].append(entree)
+        # Fiches calculées d'employés sortis du calcul (inactifs, sans salaire, déjà payés) ;
+        # les fiches saisies à la main (sans empreinte) sont laissées telles quelles
+        obsoletes += [
+            fiche_id for employe_id, (fiche_id, empreinte_existante) in existantes.items()
+            if empreinte_existante and employe_id not in empreintes
+        ]
+
+        pool = creer_pool(processus)
+        try:
+            resultats = executer(pool, calculer_departement, [(minutes_jour, e) for e in departements.values()])
+        finally:
+            if pool is not None:
+                pool.shutdown()
+
+        fiches = [
+            Payroll(
+                month=debut, run=run, inputs_hash=empreintes[montants['employee_id']],
+                details={cle: str(valeur) for cle, valeur in montants.pop('details').items()},
+                **montants,
+            )
+            for departement in resultats for montants in departement
+        ]
+        a_mettre_a_jour = []
+        a_creer = []
+        for fiche in fiches:
+            if fiche.employee_id in existantes:
+                fiche.pk = existantes[fiche.employee_id][0]
+                a_mettre_a_jour.append(fiche)
+            else:
+                a_creer.append(fiche)
+
+        with transaction.atomic():
+            for i in range(0, len(obsoletes), TAILLE_LOT):
+                Payroll.objects.filter(pk__in=obsoletes[i:i + TAILLE_LOT], paid_date__isnull=True).delete()
+            # Une fiche payée entre la lecture et l'écriture n'est pas écrasée
+            ids = [fiche.pk for fiche in a_mettre_a_jour]
+            payees = set()
+            for i in range(0, len(ids), TAILLE_LOT):
+                payees.update(Payroll.objects.select_for_update().filter(
+                    pk__in=ids[i:i + TAILLE_LOT], paid_date__isnull=False
+                ).values_list('pk', flat=True))
+            a_mettre_a_jour = [fiche for fiche in a_mettre_a_jour if fiche.pk not in payees]
+            Payroll.objects.bulk_update(a_mettre_a_jour, CHAMPS_CALCULES, batch_size=TAILLE_LOT)
+            Payroll.objects.bulk_create(a_creer, batch_size=TAILLE_LOT)
+            # Pas d'événement "Paiement de paie" : le calcul ne paie rien (voir rh/signals.py)
+            run.status = 'done'
+            run.finished_at = timezone.now()
+            run.employee_count = len(entrees)
+            run.computed_count = len(a_mettre_a_jour) + len(a_creer)
+            run.unchanged_count = len(empreintes) - len(fiches)
+            run.save()
+            invalider_widgets('payroll_this_month')
+    except Exception as erreur:
+        run.status = 'failed'
+        run.finished_at = timezone.now()
+        run.error = str(erreur)
+        run.save(update_fields=['status', 'finished_at', 'error'])
+        raise
+    return run
@@ -0,0 +1,45 @@
+"""
+Pool de processus pour les traitements RH en masse (hachage des mots de passe
+à l'import, calcul de paie par département, rendu des bulletins).
+
+Ce module n'importe aucun modèle : il peut être chargé par un processus
+fils démarré en mode "spawn" avant que Django ne soit initialisé.
+Les fonctions exécutées dans le pool reçoivent et retournent des données
+simples et n'accèdent pas à la base : lectures et écritures restent dans
+le processus principal (une connexion héritée d'un fork ne se partage pas).
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+
+def initialiser_processus():
+    """Initialise Django dans un processus fils (sans effet après un fork)"""
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'entreprise.settings')
+        django.setup()
+
+
+def nombre_processus(demande=None):
+    return max(1, demande or os.cpu_count() or 1)
+
+
+def creer_pool(processus=None):
+    """Pool de processus initialisés pour Django, ou None si un seul processus est demandé"""
+    processus = nombre_processus(processus)
+    if processus == 1:
+        return None
+    return ProcessPoolExecutor(max_workers=processus, initializer=initialiser_processus)
+
+
+def executer(pool, fonction, elements, taille_morceau=1):
+    """map() sur le pool s'il existe, sinon dans le processus courant ; résultats dans l'ordre"""
+    if pool is None:
+        return list(map(fonction, elements))
+    return list(pool.map(fonction, elements, chunksize=taille_morceau))
+
+
+def hacher_mot_de_passe(mot_de_passe):
+    from django.contrib.auth.hashers import make_password
+    return make_password(mot_de_passe)
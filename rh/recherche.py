@@ -0,0 +1,190 @@
+"""
+Index de recherche plein texte des employés (SQLite FTS5).
+
+Une ligne par utilisateur regroupe les champs dispersés dans CustomUser,
+Profile et EmployeeProfile. Le tokenizer trigram trouve les candidats même
+avec une faute de frappe (trigrammes communs), classés par bm25 puis
+reclassés par similarité de chaîne. L'index est tenu à jour par les signaux
+de rh/signals.py et se reconstruit avec : python manage.py reconstruire_index_recherche
+
+Sur une autre base que SQLite, la recherche retombe sur un filtre par préfixe.
+"""
+import difflib
+import re
+import unicodedata
+from django.db import connection, transaction
+from django.db.models import Q
+from accounts.models import CustomUser
+
+TABLE_INDEX = 'rh_recherche_employes'
+# Colonnes indexées, avec leur poids bm25 (user_id n'est pas indexée)
+COLONNES = {
+    'username': 5.0,
+    'nom': 4.0,
+    'matricule': 5.0,
+    'email': 2.0,
+    'telephone': 2.0,
+    'piece_identite': 3.0,
+    'poste': 1.0,
+}
+MAX_CANDIDATS = 100
+SCORE_MINIMUM = 0.6
+# Résultats approchés écartés s'ils sont trop loin du meilleur (ex. annu3 ne ramène pas annu0..annu9)
+ECART_MAX_SCORE = 0.15
+TAILLE_LOT = 500
+
+
+def index_disponible():
+    return connection.vendor == 'sqlite'
+
+
+def normaliser(texte):
+    """Minuscules sans accents : la requête et l'index sont normalisés de la même façon"""
+    texte = unicodedata.normalize('NFKD', str(texte or ''))
+    return ''.join(c for c in texte if not unicodedata.combining(c)).lower().strip()
+
+
+def _ligne_index(user):
+    profil = getattr(user, 'detailed_profile', None)
+    profil_rh = getattr(user, 'employee_profile', None)
+    telephones = [profil.phone_number, profil.secondary_phone] if profil else []
+    telephones = [t for t in telephones if t]
+    return (
+        user.id,
+        normaliser(user.username),
+        normaliser(' '.join(filter(None, [user.first_name, user.last_name, profil.full_name if profil else None]))),
+        normaliser(profil_rh.employee_id if profil_rh else ''),
+        normaliser(user.email),
+        # Numéros avec et sans séparateurs
+        ' '.join(telephones + [re.sub(r'\D', '', t) for t in telephones]),
+        normaliser(profil.id_number if profil else ''),
+        normaliser(profil_rh.position if profil_rh else ''),
+    )
+
+
+def _utilisateurs(ids=None):
+    utilisateurs = CustomUser.objects.select_related('detailed_profile', 'employee_profile')
+    if ids is not None:
+        utilisateurs = utilisateurs.filter(id__in=ids)
+    return utilisateurs.order_by('id')
+
+
+def _inserer(curseur, utilisateurs):
+    marques = ', '.join(['%s'] * (len(COLONNES) + 1))
+    lot = []
+    for user in utilisateurs.iterator(chunk_size=TAILLE_LOT):
+        lot.append(_ligne_index(user))
+        if len(lot) >= TAILLE_LOT:
+            curseur.executemany(f"INSERT INTO {TABLE_INDEX} VALUES ({marques})", lot)
+            lot = []
+    if lot:
+        curseur.executemany(f"INSERT INTO {TABLE_INDEX} VALUES ({marques})", lot)
+
+
+def indexer_utilisateurs(ids):
+    """Réindexe les utilisateurs donnés (supprimés de l'index s'ils n'existent plus)"""
+    ids = list(ids)
+    if not ids or not index_disponible():
+        return
+    with transaction.atomic(), connection.cursor() as curseur:
+        for debut in range(0, len(ids), TAILLE_LOT):
+            lot = ids[debut:debut + TAILLE_LOT]
+            curseur.execute(
+                f"DELETE FROM {TABLE_INDEX} WHERE user_id IN ({', '.join(['%s'] * len(lot))})", lot
+            )
+            _inserer(curseur, _utilisateurs(lot))
+
+
+def reindexer_apres_commit(*ids):
+    transaction.on_commit(lambda: indexer_utilisateurs(ids))
+
+
+def reconstruire_index():
+    """Vide et reconstruit tout l'index ; retourne le nombre de lignes indexées"""
+    if not index_disponible():
+        return 0
+    with transaction.atomic(), connection.cursor() as curseur:
+        curseur.execute(f"DELETE FROM {TABLE_INDEX}")
+        _inserer(curseur, _utilisateurs())
+        curseur.execute(f"SELECT COUNT(*) FROM {TABLE_INDEX}")
+        return curseur.fetchone()[0]
+
+
+def _trigrammes(terme):
+    return {terme[i:i + 3] for i in range(len(terme) - 2)}
+
+
+def _similarite(terme, mots):
+    """Meilleure similarité entre un terme de la requête et les mots d'un document"""
+    meilleure = 0.0
+    for mot in mots:
+        if mot.startswith(terme):
+            return 1.0
+        meilleure = max(meilleure, difflib.SequenceMatcher(None, terme, mot[:len(terme) + 2]).ratio())
+    return meilleure
+
+
+def rechercher_employes(texte, limite=20):
+    """
+    Recherche classée et tolérante aux fautes de frappe.
+    Retourne une liste de (user_id, score) du plus pertinent au moins pertinent.
+    """
+    termes = [t for t in re.split(r'[\s,;]+', normaliser(texte)) if t]
+    if not termes:
+        return []
+    if not index_disponible():
+        # Repli sans index : préfixe sur le nom d'utilisateur, le nom et le matricule
+        filtre = Q()
+        for terme in termes:
+            filtre |= (Q(username__istartswith=terme) | Q(last_name__istartswith=terme)
+                       | Q(first_name__istartswith=terme) | Q(employee_profile__employee_id__istartswith=terme))
+        return [(id_, 1.0) for id_ in CustomUser.objects.filter(filtre).values_list('id', flat=True)[:limite]]
+
+    trigrammes = set().union(*(_trigrammes(t) for t in termes))
+    poids = ', '.join(['0.0', *(str(p) for p in COLONNES.values())])
+    with connection.cursor() as curseur:
+        if trigrammes:
+            requete = ' OR '.join('"{}"'.format(t.replace('"', '""')) for t in sorted(trigrammes))
+            curseur.execute(
+                f"SELECT * FROM {TABLE_INDEX} WHERE {TABLE_INDEX} MATCH %s "
+                f"ORDER BY bm25({TABLE_INDEX}, {poids}) LIMIT %s",
+                [requete, MAX_CANDIDATS],
+            )
+        else:
+            # Termes de moins de trois lettres : pas de trigramme, début de mot par LIKE
+            curseur.execute(
+                f"SELECT * FROM {TABLE_INDEX} "
+                f"WHERE (' ' || username || ' ' || nom || ' ' || matricule) LIKE %s LIMIT %s",
+                [f"% {termes[0]}%", MAX_CANDIDATS],
+            )
+        candidats = curseur.fetchall()
+
+    resultats = []
+    for rang, (user_id, *colonnes) in enumerate(candidats):
+        texte_document = ' '.join(colonnes)
+        # Mots entiers et leurs parties (jean-etienne -> jean, etienne)
+        mots = texte_document.split() + re.split(r'[\W_]+', texte_document)
+        score = sum(_similarite(terme, mots) for terme in termes) / len(termes)
+        if score >= SCORE_MINIMUM:
+            resultats.append((score, -rang, user_id))
+    resultats.sort(reverse=True)
+    if resultats:
+        seuil = resultats[0][0] - ECART_MAX_SCORE
+        resultats = [r for r in resultats if r[0] >= seuil]
+    return [(user_id, round(score, 3)) for score, _, user_id in resultats[:limite]]
+
+
+class RechercheEmployesAdminMixin:
+    """
+    Recherche d'admin complétée par l'index plein texte : aux résultats de la
+    recherche search_fields habituelle (champs non indexés compris, sans limite)
+    s'ajoutent les utilisateurs trouvés par l'index malgré une faute de frappe.
+    """
+    champ_utilisateur_recherche = 'id'
+
+    def get_search_results(self, request, queryset, search_term):
+        resultats, doublons_possibles = super().get_search_results(request, queryset, search_term)
+        ids = [user_id for user_id, _ in rechercher_employes(search_term, limite=MAX_CANDIDATS)]
+        if ids:
+            resultats = resultats | queryset.filter(**{f'{self.champ_utilisateur_recherche}__in': ids})
+        return resultats, doublons_possibles
@@ -0,0 +1,158 @@
+from datetime import timedelta
+from django.db.models import DEFERRED
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from accounts.models import CustomUser, Profile
+from gestion_Horraire.models import PointageHoraire, DailyAttendanceSummary, resume_presence_modifie
+from gestion_Horraire import conges
+from .cache_dashboard import invalider_widgets
+from .recherche import reindexer_apres_commit
+from .soldes_conges import mouvements_demande, restituer, synchroniser_demande
+from .models import ActivityEvent, EmployeeProfile, LeaveRequest, PerformanceReview, Payroll
+
+
+# =============================================================================
+# Alimentation du fil d'activité du tableau de bord RH
+# =============================================================================
+def action_pointage(anciennes_heures, heure_arrivee, heure_depart):
+    """Libellé de l'événement si un pointage vient d'être posé, sinon None"""
+    ancienne_arrivee, ancien_depart = anciennes_heures
+    if heure_depart not in (None, DEFERRED) and heure_depart != ancien_depart:
+        return 'Pointage départ'
+    if heure_arrivee not in (None, DEFERRED) and heure_arrivee != ancienne_arrivee:
+        return 'Pointage arrivée'
+    return None
+
+
+@receiver(post_save, sender=PointageHoraire)
+def activite_pointage(sender, instance, created, **kwargs):
+    # _heures_initiales contient encore les valeurs lues en base (mises à jour après le post_save)
+    anciennes_heures = (None, None) if created else getattr(instance, '_heures_initiales', (None, None))
+    action = action_pointage(anciennes_heures, *instance._get_heures())
+    if action:
+        ActivityEvent.objects.enregistrer(instance.employe, 'pointage', action, instance.status)
+
+
+@receiver(post_save, sender=LeaveRequest)
+def activite_conge(sender, instance, created, **kwargs):
+    if not created and getattr(instance, '_status_initial', None) == instance.status:
+        return
+    ActivityEvent.objects.enregistrer(
+        instance.employee, 'conge',
+        f'Demande de congé ({instance.get_leave_type_display()})',
+        instance.get_status_display(),
+    )
+    instance._status_initial = instance.status
+
+
+@receiver(post_save, sender=PerformanceReview)
+def activite_evaluation(sender, instance, created, **kwargs):
+    if created:
+        ActivityEvent.objects.enregistrer(
+            instance.employee, 'performance', 'Évaluation de performance', f'Note: {instance.overall_rating}/5'
+        )
+
+
+@receiver(post_save, sender=Payroll)
+def activite_paie(sender, instance, created, **kwargs):
+    # Seulement quand la fiche devient payée (paid_date renseignée), pas à chaque calcul
+    if not instance.paid_date or getattr(instance, '_paid_date_initial', None):
+        return
+    ActivityEvent.objects.enregistrer(instance.employee, 'paie', 'Paiement de paie', f'{instance.total_salary} €')
+    instance._paid_date_initial = instance.paid_date
+
+
+# =============================================================================
+# Invalidation ciblée du cache du tableau de bord RH
+# =============================================================================
+@receiver(post_save, sender=CustomUser)
+def cache_effectif_enregistre(sender, instance, created, **kwargs):
+    if created:
+        invalider_widgets('employee_count')
+
+
+@receiver(post_delete, sender=CustomUser)
+def cache_effectif_supprime(sender, **kwargs):
+    invalider_widgets('employee_count')
+
+
+@receiver(post_save, sender=LeaveRequest)
+@receiver(post_delete, sender=LeaveRequest)
+def cache_conges(sender, **kwargs):
+    invalider_widgets('leave_count')
+
+
+@receiver(post_save, sender=EmployeeProfile)
+@receiver(post_delete, sender=EmployeeProfile)
+def cache_contrats(sender, **kwargs):
+    invalider_widgets('status_stats')
+
+
+@receiver(post_save, sender=Payroll)
+@receiver(post_delete, sender=Payroll)
+def cache_paie(sender, **kwargs):
+    invalider_widgets('payroll_this_month')
+
+
+@receiver(resume_presence_modifie, sender=DailyAttendanceSummary)
+def cache_presences(sender, dates, **kwargs):
+    aujourd_hui = timezone.localdate()
+    if dates is None or aujourd_hui in dates:
+        invalider_widgets('attendance_stats', 'weekly_trend')
+    elif any(aujourd_hui - timedelta(days=6) <= jour <= aujourd_hui for jour in dates):
+        invalider_widgets('weekly_trend')
+
+
+# =============================================================================
+# Synchronisation de l'index de recherche des employés
+# =============================================================================
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def index_utilisateur(sender, instance, **kwargs):
+    reindexer_apres_commit(instance.pk)
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+@receiver(post_save, sender=EmployeeProfile)
+@receiver(post_delete, sender=EmployeeProfile)
+def index_profil(sender, instance, **kwargs):
+    reindexer_apres_commit(instance.user_id)
+
+
+# =============================================================================
+# Compte et soldes de congés
+# =============================================================================
+@receiver(post_save, sender=LeaveRequest)
+def solde_conge_enregistre(sender, instance, **kwargs):
+    synchroniser_demande(instance)
+
+
+@receiver(pre_delete, sender=LeaveRequest)
+def solde_conge_avant_suppression(sender, instance, **kwargs):
+    # Lu avant la suppression : les mouvements perdent ensuite leur lien (SET_NULL)
+    instance._mouvements_conges = mouvements_demande(instance)
+
+
+@receiver(post_delete, sender=LeaveRequest)
+def solde_conge_supprime(sender, instance, **kwargs):
+    # Rien à restituer si l'employé est supprimé avec la demande (son compte disparaît aussi)
+    if CustomUser.objects.filter(pk=instance.employee_id).exists():
+        restituer(instance.employee_id, getattr(instance, '_mouvements_conges', {}))
+
+
+# =============================================================================
+# Report des congés approuvés dans les pointages (statut CONGE)
+# =============================================================================
+@receiver(post_save, sender=LeaveRequest)
+def pointages_conge_enregistre(sender, instance, created, **kwargs):
+    ancienne = None if created else getattr(instance, '_periode_initiale', None)
+    conges.synchroniser_demande(ancienne, instance.periode_conge())
+    instance._periode_initiale = instance.periode_conge()
+
+
+@receiver(post_delete, sender=LeaveRequest)
+def pointages_conge_supprime(sender, instance, **kwargs):
+    if CustomUser.objects.filter(pk=instance.employee_id).exists():
+        conges.synchroniser_demande(getattr(instance, '_periode_initiale', instance.periode_conge()), None)
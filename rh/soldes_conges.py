@@ -0,0 +1,160 @@
+"""
+Compte de congés : mouvements (LeaveLedgerEntry) et solde matérialisé
+(LeaveBalance) par employé et type de congé.
+
+- Acquisition mensuelle par requêtes ensemblistes (python manage.py acquerir_conges).
+- Consommation quand une demande devient approuvée, restitution si elle
+  cesse de l'être ou change de durée (signaux de rh/signals.py). Seuls les
+  types décomptés (RH_CONGES_DECOMPTES, par défaut ceux qui s'acquièrent)
+  sont débités : un congé maladie ne consomme pas de solde.
+- Le solde est mis à jour par UPDATE ... SET balance = balance + n dans la
+  transaction du mouvement : le lire coûte une ligne, sans parcourir l'historique.
+"""
+from decimal import Decimal
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+from gestion_Horraire.feuilles_temps import bornes_periode, jours_ouvres_periode
+from gestion_Horraire.models import ParametresHoraires
+from .models import EmployeeProfile, LeaveBalance, LeaveLedgerEntry, LeaveRequest
+
+TAILLE_LOT = 500
+
+
+def get_acquisition_mensuelle():
+    """Jours acquis par mois et par type de congé (RH_CONGES_ACQUIS_PAR_MOIS)"""
+    acquisition = getattr(settings, 'RH_CONGES_ACQUIS_PAR_MOIS', {'paid': '2.5'})
+    return {leave_type: Decimal(str(jours)) for leave_type, jours in acquisition.items()}
+
+
+def get_types_decomptes():
+    """Types de congé débités du solde à l'approbation (RH_CONGES_DECOMPTES, par défaut les types acquis)"""
+    types = getattr(settings, 'RH_CONGES_DECOMPTES', None)
+    if types is None:
+        types = get_acquisition_mensuelle().keys()
+    return set(types)
+
+
+def _crediter(employee_ids, leave_type, jours):
+    """Ajoute `jours` au solde des employés donnés (même montant pour tous)"""
+    employee_ids = list(employee_ids)
+    LeaveBalance.objects.bulk_create(
+        [LeaveBalance(employee_id=employee_id, leave_type=leave_type) for employee_id in employee_ids],
+        batch_size=TAILLE_LOT, ignore_conflicts=True,
+    )
+    maintenant = timezone.now()
+    for debut in range(0, len(employee_ids), TAILLE_LOT):
+        LeaveBalance.objects.filter(
+            employee_id__in=employee_ids[debut:debut + TAILLE_LOT], leave_type=leave_type
+        ).update(balance=F('balance') + jours, updated_at=maintenant)
+
+
+def mouvements_demande(demande):
+    """{leave_type: jours} déjà passés au compte pour une demande"""
+    return dict(
+        LeaveLedgerEntry.objects.filter(leave_request=demande)
+        .values('leave_type').annotate(total=Sum('days')).values_list('leave_type', 'total')
+    )
+
+
+def synchroniser_demande(demande):
+    """
+    Aligne le compte sur une demande : une demande approuvée d'un type
+    décompté consomme ses jours travaillés (ceux passés en CONGE dans les
+    pointages et payés par la paie, pas sa durée calendaire), sinon rien.
+    L'écart avec les mouvements déjà passés pour elle est enregistré
+    (consommation, ou régularisation si elle a changé).
+    Retourne le mouvement créé ou None.
+    """
+    decompte = (
+        demande.status == 'approved' and demande.leave_type in get_types_decomptes()
+        and demande.start_date and demande.end_date
+    )
+    attendu = Decimal(0)
+    if decompte:
+        parametres = ParametresHoraires.get_actifs(creer=True)
+        attendu = -Decimal(len(jours_ouvres_periode(parametres, demande.start_date, demande.end_date)))
+    with transaction.atomic():
+        # Verrou sur la demande : deux approbations simultanées ne débitent pas deux fois
+        LeaveRequest.objects.select_for_update().filter(pk=demande.pk).first()
+        passes = mouvements_demande(demande)
+        deja = passes.pop(demande.leave_type, 0)
+        mouvement = None
+        # Le type a pu changer : ce qui a été débité sur un autre type est restitué
+        for leave_type, total in passes.items():
+            if total:
+                LeaveLedgerEntry.objects.create(
+                    employee_id=demande.employee_id, leave_type=leave_type, kind='adjustment',
+                    days=-total, leave_request=demande,
+                )
+                _crediter([demande.employee_id], leave_type, -total)
+        if attendu != deja:
+            mouvement = LeaveLedgerEntry.objects.create(
+                employee_id=demande.employee_id, leave_type=demande.leave_type,
+                kind='consumption' if deja == 0 and attendu < 0 else 'adjustment',
+                days=attendu - deja, leave_request=demande,
+            )
+            _crediter([demande.employee_id], demande.leave_type, attendu - deja)
+    return mouvement
+
+
+def restituer(employee_id, mouvements):
+    """Annule les mouvements {leave_type: jours} d'une demande supprimée"""
+    with transaction.atomic():
+        for leave_type, total in mouvements.items():
+            if total:
+                LeaveLedgerEntry.objects.create(
+                    employee_id=employee_id, leave_type=leave_type, kind='adjustment', days=-total,
+                )
+                _crediter([employee_id], leave_type, -total)
+
+
+def acquerir_conges(mois):
+    """
+    Acquisition du mois pour les employés actifs embauchés avant sa fin.
+    Sans effet pour un employé déjà crédité ce mois ; retourne le nombre de mouvements créés.
+    """
+    debut, fin = bornes_periode(mois)
+    eligibles = EmployeeProfile.objects.filter(is_active=True, user__is_active=True).filter(
+        Q(hire_date__isnull=True) | Q(hire_date__lte=fin)
+    )
+    maintenant = timezone.now()
+    total = 0
+    for leave_type, jours in get_acquisition_mensuelle().items():
+        deja = LeaveLedgerEntry.objects.filter(kind='accrual', leave_type=leave_type, period=debut)
+        employee_ids = list(
+            eligibles.exclude(user_id__in=deja.values('employee_id')).values_list('user_id', flat=True)
+        )
+        with transaction.atomic():
+            # La contrainte d'unicité refuse une acquisition concurrente de la même période
+            LeaveLedgerEntry.objects.bulk_create([
+                LeaveLedgerEntry(
+                    employee_id=employee_id, leave_type=leave_type, kind='accrual', days=jours,
+                    period=debut, created_at=maintenant,
+                )
+                for employee_id in employee_ids
+            ], batch_size=TAILLE_LOT)
+            _crediter(employee_ids, leave_type, jours)
+        total += len(employee_ids)
+    return total
+
+
+def soldes(employee_ids):
+    """{(employee_id, leave_type): solde} en une requête"""
+    return {
+        (employee_id, leave_type): balance
+        for employee_id, leave_type, balance in LeaveBalance.objects.filter(
+            employee_id__in=employee_ids
+        ).values_list('employee_id', 'leave_type', 'balance')
+    }
+
+
+def reconstruire_soldes():
+    """Recalcule tous les soldes depuis le compte (réparation) ; retourne le nombre de soldes"""
+    with transaction.atomic():
+        LeaveBalance.objects.all().delete()
+        return len(LeaveBalance.objects.bulk_create([
+            LeaveBalance(employee_id=ligne['employee_id'], leave_type=ligne['leave_type'], balance=ligne['total'])
+            for ligne in LeaveLedgerEntry.objects.values('employee_id', 'leave_type').annotate(total=Sum('days'))
+        ], batch_size=TAILLE_LOT))
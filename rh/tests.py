@@ -0,0 +1,202 @@
+import io
+from datetime import date, datetime
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib import admin
+from django.test import RequestFactory, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import CustomUser, Department
+from gestion_Horraire.models import PointageHoraire
+from . import recherche
+from . import paie, views
+from .import_employes import importer_employes, lire_lignes
+from .models import ActivityEvent, EmployeeProfile, LeaveRequest
+from .soldes_conges import mouvements_demande, soldes
+
+
+# =============================================================================
+# Recherche plein texte des employés
+# =============================================================================
+class RechercheEmployesTests(TestCase):
+    def setUp(self):
+        self.logistique = Department.objects.create(name="Logistique", code='LOG')
+        self.employes = {}
+        for username, matricule in (('logisticien', 'E001'), ('dupont', 'E002'), ('martin', 'E003')):
+            user = CustomUser.objects.create_user(username, password='x', department=self.logistique)
+            EmployeeProfile.objects.create(user=user, employee_id=matricule, department=self.logistique)
+            self.employes[username] = user
+        recherche.reconstruire_index()
+
+    def ids(self, resultats):
+        return [user_id for user_id, _ in resultats]
+
+    def test_faute_de_frappe_trouvee_par_l_index(self):
+        self.assertEqual(self.ids(recherche.rechercher_employes('duppont')), [self.employes['dupont'].pk])
+
+    def test_repli_sans_index_par_prefixe(self):
+        with mock.patch.object(recherche, 'index_disponible', return_value=False):
+            self.assertEqual(self.ids(recherche.rechercher_employes('mart')), [self.employes['martin'].pk])
+            self.assertEqual(recherche.rechercher_employes('   '), [])
+
+    def test_admin_ajoute_l_index_a_la_recherche_habituelle(self):
+        # « logistique » est trouvé par l'index pour logisticien, et par search_fields
+        # (department__name, non indexé) pour les trois employés : aucun ne doit disparaître
+        modele_admin = admin.site._registry[EmployeeProfile]
+        requete = RequestFactory().get('/admin/rh/employeeprofile/', {'q': 'logistique'})
+        self.assertTrue(recherche.rechercher_employes('logistique'))
+        resultats, _ = modele_admin.get_search_results(requete, EmployeeProfile.objects.all(), 'logistique')
+        self.assertEqual(
+            sorted(resultats.values_list('user__username', flat=True)), ['dupont', 'logisticien', 'martin']
+        )
+
+    def test_admin_ajoute_les_fautes_de_frappe(self):
+        modele_admin = admin.site._registry[EmployeeProfile]
+        requete = RequestFactory().get('/admin/rh/employeeprofile/', {'q': 'duppont'})
+        resultats, _ = modele_admin.get_search_results(requete, EmployeeProfile.objects.all(), 'duppont')
+        self.assertEqual(list(resultats.values_list('user__username', flat=True)), ['dupont'])
+
+
+# =============================================================================
+# Compte de congés
+# =============================================================================
+class SoldesCongesTests(TestCase):
+    def setUp(self):
+        self.employe = CustomUser.objects.create_user('employe', password='x')
+
+    def solde(self):
+        return soldes([self.employe.pk]).get((self.employe.pk, 'paid'), Decimal(0))
+
+    def test_debit_en_jours_travailles_comme_les_pointages_conge(self):
+        # Du lundi 1er au dimanche 7 janvier 2024 : 7 jours calendaires, 5 travaillés
+        demande = LeaveRequest.objects.create(
+            employee=self.employe, leave_type='paid', status='approved',
+            start_date=date(2024, 1, 1), end_date=date(2024, 1, 7),
+        )
+        self.assertEqual(self.solde(), Decimal(-5))
+        self.assertEqual(
+            PointageHoraire.objects.filter(employe=self.employe, status='CONGE').count(), 5
+        )
+
+        # Prolongée jusqu'au mardi suivant : deux jours travaillés de plus
+        demande.refresh_from_db()
+        demande.end_date = date(2024, 1, 9)
+        demande.save()
+        self.assertEqual(self.solde(), Decimal(-7))
+        self.assertEqual(mouvements_demande(demande), {'paid': Decimal(-7)})
+
+        demande.refresh_from_db()
+        demande.status = 'rejected'
+        demande.save()
+        self.assertEqual(self.solde(), Decimal(0))
+
+
+# =============================================================================
+# Entrées de la paie
+# =============================================================================
+class CollecterEntreesTests(TestCase):
+    def setUp(self):
+        self.employe = CustomUser.objects.create_user('employe', password='x')
+        EmployeeProfile.objects.create(
+            user=self.employe, employee_id='E001', salary=Decimal('3000'), hire_date=date(2020, 1, 1),
+        )
+
+    def test_journee_en_cours_pas_comptee_en_absence(self):
+        # Mercredi 3 janvier 2024, 7 h : lundi et mardi écoulés sans pointage, mercredi pas encore clos
+        with mock.patch.object(paie.timezone, 'localdate', return_value=date(2024, 1, 3)):
+            entrees, _ = paie.collecter_entrees(date(2024, 1, 1))
+        self.assertEqual(entrees[self.employe.pk]['jours_absence'], 2)
+
+    def test_mois_passe_compte_jusqu_au_dernier_jour(self):
+        with mock.patch.object(paie.timezone, 'localdate', return_value=date(2024, 2, 1)):
+            entrees, _ = paie.collecter_entrees(date(2024, 1, 1))
+        self.assertEqual(entrees[self.employe.pk]['jours_absence'], entrees[self.employe.pk]['jours_ouvres'])
+
+
+# =============================================================================
+# Pagination par curseur (annuaire, fil d'activité)
+# =============================================================================
+class PaginationCurseurTests(TestCase):
+    def setUp(self):
+        self.rh = Department.objects.create(name="Ressources humaines", code='RH')
+        self.gestionnaire = CustomUser.objects.create_user('gestionnaire', password='x', department=self.rh)
+        self.client.force_login(self.gestionnaire)
+
+    def parcourir(self, url, cle, params=None):
+        """Suit les curseurs jusqu'à la dernière page ; retourne toutes les lignes lues"""
+        lignes, params = [], dict(params or {})
+        while True:
+            donnees = self.client.get(url, params).json()
+            lignes += donnees[cle]
+            if not donnees['suivant']:
+                return lignes
+            params['apres'] = donnees['suivant']
+
+    def test_annuaire_tri_avec_ex_aequo(self):
+        # Même nom de famille pour tous : le curseur départage par id, sans doublon ni oubli
+        for n in range(views.TAILLE_PAGE_ANNUAIRE * 2 + 1):
+            CustomUser.objects.create_user(f'employe{n:02d}', last_name='Martin')
+        url = reverse('rh:employee_directory')
+        for tri in ('last_name', '-last_name', 'username', '-date_joined'):
+            with self.subTest(tri=tri):
+                ids = [employe['id'] for employe in self.parcourir(url, 'employees', {'tri': tri})]
+                self.assertEqual(len(ids), CustomUser.objects.count())
+                self.assertEqual(len(set(ids)), len(ids))
+
+    def test_annuaire_curseur_invalide_ignore(self):
+        reponse = self.client.get(reverse('rh:employee_directory'), {'apres': 'pas-du-base64'})
+        self.assertEqual([employe['username'] for employe in reponse.json()['employees']], ['gestionnaire'])
+
+    def test_fil_d_activite_evenements_simultanes(self):
+        instant = timezone.make_aware(datetime(2024, 1, 1, 8, 30))
+        ActivityEvent.objects.all().delete()
+        for n in range(views.TAILLE_PAGE_ACTIVITES + 5):
+            ActivityEvent.objects.create(
+                employee=self.gestionnaire, event_type='pointage', action=f"Action {n}", timestamp=instant,
+            )
+        activites = self.parcourir(reverse('rh:activity_feed'), 'activites')
+        self.assertEqual(
+            sorted(activite['action'] for activite in activites),
+            sorted(ActivityEvent.objects.values_list('action', flat=True)),
+        )
+
+
+# =============================================================================
+# Import en masse des employés
+# =============================================================================
+class ImportEmployesTests(TestCase):
+    def setUp(self):
+        Department.objects.create(name="Production", code='PROD')
+        CustomUser.objects.create_user('existant', password='x')
+
+    def importer(self, contenu):
+        return importer_employes(lire_lignes(io.BytesIO(contenu), 'employes.csv'), processus=1)
+
+    def test_lignes_fautives_signalees_sans_interrompre_l_import(self):
+        rapport = self.importer(
+            "username,email,department,employee_id,hire_date,password\n"
+            "alice,alice@example.com,PROD,M001,2024-01-15,\n"
+            ",x@example.com,PROD,M002,,\n"
+            "bob,pas-une-adresse,PROD,M003,,\n"
+            "carole,,INCONNU,M004,,\n"
+            "david,,prod,M005,31/02/2024,\n"
+            "existant,,PROD,M006,,\n"
+            "alice,,PROD,M007,,\n"
+            "emile,,Production,M001,,\n"
+            "fanny,,PROD,M008,,1234\n"
+            "gaston,,PROD,,,\n".encode()
+        )
+        self.assertEqual(rapport['crees'], 2)
+        self.assertEqual([erreur['ligne'] for erreur in rapport['erreurs']], [3, 4, 5, 6, 8, 9, 10, 7])
+        erreurs = {erreur['ligne']: erreur['erreur'] for erreur in rapport['erreurs']}
+        self.assertIn("username", erreurs[3])
+        self.assertIn("date invalide", erreurs[6])
+        self.assertIn("déjà utilisé", erreurs[7])
+        self.assertIn("en double", erreurs[8])
+        self.assertIn("password", erreurs[10])
+        self.assertEqual(
+            sorted(EmployeeProfile.objects.values_list('employee_id', flat=True)), ['M001']
+        )
+        self.assertTrue(CustomUser.objects.filter(username='gaston', department__code='PROD').exists())
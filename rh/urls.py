@@ -7,12 +7,21 @@ app_name = 'rh'
 urlpatterns = [
     path('', views.index, name='index'),
     path('dashboard/', views.dashboard, name='dashboard'),
+    path('dashboard/activites/', views.activity_feed, name='activity_feed'),
     path('employees/', views.employees, name='employees'),
+    path('employees/api/', views.employee_directory, name='employee_directory'),
+    path('employees/autocomplete/', views.employee_autocomplete, name='employee_autocomplete'),
+    path('employees/search/', views.employee_search, name='employee_search'),
+    path('employees/import/', views.import_employees, name='employee_import'),
     path('employees/create/', views.create_employee_profile, name='create_employee_profile'),
     path('employees/<int:user_id>/', views.get_employee_profile, name='get_employee_profile'),
     path('employees/<int:user_id>/delete/', views.delete_employee_profile, name='delete_employee_profile'),
     path('leave-requests/', views.leave_requests, name='leave_requests'),
+    path('leave-requests/availability/', views.team_availability, name='team_availability'),
+    path('leave-requests/<int:leave_id>/decision/', views.decide_leave_request, name='decide_leave_request'),
     path('payroll/', views.payroll, name='payroll'),
+    path('payroll/<int:payroll_id>/bulletin/', views.payslip_download, name='payslip_download'),
+    path('payroll/bulletins/', views.payslips_zip, name='payslips_zip'),
     path('performance/', views.performance, name='performance'),
     path('recruitment/', views.recruitment, name='recruitment'),
 ]
\ No newline at end of file
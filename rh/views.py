@@ -1,7 +1,7 @@
-from django.shortcuts import render, redirect
+from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from accounts.decorators import department_required, user_is_active
-from .models import EmployeeProfile, LeaveRequest, Payroll, PerformanceReview, Recruitment
+from .models import EmployeeProfile, LeaveRequest, Payroll, PerformanceReview, Recruitment, ActivityEvent
 # ============================================================================= 
 # user all get 
 # =============================================================================
@@ -9,26 +9,35 @@ from accounts.models import *
 # =============================================================================
 # recupere le user presence 
 # =============================================================================
-from gestion_Horraire.models import PointageHoraire
+from gestion_Horraire.models import DailyAttendanceSummary
+from gestion_Horraire.feuilles_temps import periode_depuis_texte
+from .cache_dashboard import obtenir_widget
+from .recherche import rechercher_employes
+from .import_employes import importer_employes, lire_lignes
+from .bulletins import bulletin, nom_bulletin, flux_zip
+from .soldes_conges import soldes
+from .disponibilites import matrice_disponibilites
 from django.db.models import Sum, Count
 from django.utils import timezone
 from django.contrib import messages
 from accounts.forms import CustomUserCreationForm 
 
 # Import des fonctions pour les API AJAX
-from django.http import JsonResponse
+from django.core.exceptions import ValidationError
+from django.http import JsonResponse, FileResponse, StreamingHttpResponse, HttpResponseForbidden
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 import json
 
 def get_today_attendance_stats():
-    """Récupère les statistiques de présence pour aujourd'hui"""
-    today = timezone.now().date()
-    present_count = PointageHoraire.objects.filter(status='PRESENT', date=today).count()
-    late_count = PointageHoraire.objects.filter(status='RETARD', date=today).count()
+    """Récupère les statistiques de présence pour aujourd'hui (depuis le résumé journalier)"""
+    today = timezone.localdate()
+    totaux = DailyAttendanceSummary.objects.totaux(date=today)
+    present_count = totaux['presents']
+    late_count = totaux['retards']
     
     # Calcul du taux de présence
-    total_pointages = PointageHoraire.objects.filter(date=today).count()
+    total_pointages = sum(totaux.values())
     presence_percentage = (present_count / total_pointages * 100) if total_pointages > 0 else 0
     
     return {
@@ -39,19 +48,18 @@ def get_today_attendance_stats():
     }
 
 def get_weekly_attendance_trend():
-    """Récupère les tendances de présence sur 7 jours"""
-    today = timezone.now().date()
-    dates = [(today - timezone.timedelta(days=i)).strftime('%a') for i in range(6, -1, -1)]
-    
-    present_data = []
-    absent_data = []
-    
-    for i in range(6, -1, -1):
-        date = today - timezone.timedelta(days=i)
-        present = PointageHoraire.objects.filter(status='PRESENT', date=date).count()
-        absent = PointageHoraire.objects.filter(status='ABSENT', date=date).count()
-        present_data.append(present)
-        absent_data.append(absent)
+    """Récupère les tendances de présence sur 7 jours (une requête groupée sur le résumé)"""
+    today = timezone.localdate()
+    jours = [today - timezone.timedelta(days=i) for i in range(6, -1, -1)]
+    dates = [jour.strftime('%a') for jour in jours]
+    
+    par_jour = {
+        ligne['date']: ligne
+        for ligne in DailyAttendanceSummary.objects.filter(date__range=(jours[0], today))
+        .values('date').annotate(present=Sum('presents'), absent=Sum('absents')).order_by()
+    }
+    present_data = [par_jour.get(jour, {}).get('present') or 0 for jour in jours]
+    absent_data = [par_jour.get(jour, {}).get('absent') or 0 for jour in jours]
     
     return {
         'labels': dates,
@@ -87,83 +95,114 @@ def get_employee_status_stats():
         'labels': labels,
         'data': data
     }
+# =============================================================================
+# Fil d'activité : pagination par curseur (timestamp, id)
+# =============================================================================
+TAILLE_PAGE_ACTIVITES = 10
+
+def _filtres_activite(request):
+    return {
+        'department': request.GET.get('department', ''),
+        'site': request.GET.get('site', ''),
+        'type': request.GET.get('type', ''),
+    }
+
+def _page_activites(request):
+    """
+    Retourne (événements de la page, curseur de la page suivante ou None).
+    Filtres GET : department, site, type. Le curseur "<timestamp ISO>_<id>"
+    désigne le dernier événement affiché.
+    """
+    from datetime import datetime
+    from django.db.models import Q
+
+    evenements = ActivityEvent.objects.select_related('employee')
+    filtres = _filtres_activite(request)
+    if filtres['department'].isdigit():
+        evenements = evenements.filter(department_id=filtres['department'])
+    if filtres['site'].isdigit():
+        evenements = evenements.filter(site_id=filtres['site'])
+    if filtres['type']:
+        evenements = evenements.filter(event_type=filtres['type'])
+
+    curseur = request.GET.get('apres')
+    if curseur:
+        try:
+            horodatage, id_str = curseur.rsplit('_', 1)
+            horodatage = datetime.fromisoformat(horodatage)
+            evenements = evenements.filter(
+                Q(timestamp__lt=horodatage) | Q(timestamp=horodatage, id__lt=int(id_str))
+            )
+        except ValueError:
+            pass
+
+    page = list(evenements.order_by('-timestamp', '-id')[:TAILLE_PAGE_ACTIVITES + 1])
+    suivant = None
+    if len(page) > TAILLE_PAGE_ACTIVITES:
+        page = page[:TAILLE_PAGE_ACTIVITES]
+        suivant = f"{page[-1].timestamp.isoformat()}_{page[-1].id}"
+    return page, suivant
+
+@login_required
+@department_required("RH")
+def activity_feed(request):
+    """Page suivante du fil d'activité en JSON"""
+    page, suivant = _page_activites(request)
+    return JsonResponse({
+        'success': True,
+        'activites': [
+            {
+                'employee': evenement.employee.username if evenement.employee else '',
+                'datetime': timezone.localtime(evenement.timestamp).strftime('%Y-%m-%d %H:%M'),
+                'action': evenement.action,
+                'status': evenement.status,
+                'type': evenement.event_type,
+            }
+            for evenement in page
+        ],
+        'suivant': suivant,
+    })
+
+def get_payroll_this_month():
+    """Nombre de fiches de paie du mois en cours"""
+    current_month = timezone.localdate().replace(day=1)
+    return Payroll.objects.filter(month=current_month).count()
+
+# Calcul de chaque widget du tableau de bord (mis en cache par rh/cache_dashboard.py)
+DASHBOARD_WIDGETS = {
+    'employee_count': lambda: CustomUser.objects.count(),
+    'leave_count': lambda: LeaveRequest.objects.filter(status='pending').count(),
+    'attendance_stats': get_today_attendance_stats,
+    'weekly_trend': get_weekly_attendance_trend,
+    'status_stats': get_employee_status_stats,
+    'payroll_this_month': get_payroll_this_month,
+}
+
+def get_dashboard_widgets():
+    return {nom: obtenir_widget(nom, calcul) for nom, calcul in DASHBOARD_WIDGETS.items()}
+
 @login_required
 @department_required("RH")
 def dashboard(request):
-    # Statistiques de base
-    employeeCount = CustomUser.objects.count()
-    leaveCount = LeaveRequest.objects.filter(status='pending').count()
-    
-    # Statistiques de présence
-    attendance_stats = get_today_attendance_stats()
-    weekly_trend = get_weekly_attendance_trend()
-    status_stats = get_employee_status_stats()
-    
-    # Paie du mois en cours
-    current_month = timezone.now().replace(day=1)
-    payroll_this_month = Payroll.objects.filter(month=current_month).count()
-    
-    # Récupérer les VRAIES activités récentes
-    recent_activities = []
-    
-    # 1. Derniers pointages (5 derniers)
-    recent_pointages = PointageHoraire.objects.select_related('employe').order_by('-date', '-heure_arrivee')[:5]
-    for pointage in recent_pointages:
-        recent_activities.append({
-            'employee': pointage.employe.username,
-            'datetime': f"{pointage.date} {pointage.heure_arrivee.strftime('%H:%M:%S') if pointage.heure_arrivee else ''}",
-            'action': 'Pointage',
-            'status': pointage.status,
-            'type': 'pointage'
-        })
+    # Statistiques (une entrée de cache par widget)
+    widgets = get_dashboard_widgets()
     
-    # 2. Dernières demandes de congé (5 dernières)
-    recent_leaves = LeaveRequest.objects.select_related('employee').order_by('-created_at')[:5]
-    for leave in recent_leaves:
-        recent_activities.append({
-            'employee': leave.employee.username,
-            'datetime': leave.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-            'action': f'Demande de congé ({leave.get_leave_type_display()})',
-            'status': leave.get_status_display(),
-            'type': 'congé'
-        })
-    
-    # 3. Dernières évaluations de performance (5 dernières)
-    recent_reviews = PerformanceReview.objects.select_related('employee').order_by('-review_date')[:5]
-    for review in recent_reviews:
-        recent_activities.append({
-            'employee': review.employee.username,
-            'datetime': review.review_date.strftime('%Y-%m-%d'),
-            'action': 'Évaluation de performance',
-            'status': f'Note: {review.overall_rating}/5',
-            'type': 'performance'
-        })
-    
-    # 4. Derniers paiements de paie (5 derniers)
-    recent_payrolls = Payroll.objects.select_related('employee').order_by('-month')[:5]
-    for payroll in recent_payrolls:
-        recent_activities.append({
-            'employee': payroll.employee.username,
-            'datetime': payroll.month.strftime('%Y-%m'),
-            'action': 'Paiement de paie',
-            'status': f'{payroll.total_salary} €',
-            'type': 'paie'
-        })
-    
-    # Trier toutes les activités par date (du plus récent au plus ancien)
-    recent_activities.sort(key=lambda x: x['datetime'], reverse=True)
-    
-    # Garder seulement les 10 activités les plus récentes
-    recent_activities = recent_activities[:10]
+    # Fil d'activité : première page, lue par l'index (timestamp, id)
+    recent_activities, suivant = _page_activites(request)
     
     context = {
-        'employeeCount': employeeCount,
-        'leaveCount': leaveCount,
-        'payroll_this_month': payroll_this_month,
+        'employeeCount': widgets['employee_count'],
+        'leaveCount': widgets['leave_count'],
+        'payroll_this_month': widgets['payroll_this_month'],
         'recent_activities': recent_activities,
-        **attendance_stats,  # Décompresse toutes les stats de présence
-        'weekly_trend': weekly_trend,
-        'status_stats': status_stats,
+        'activites_suivant': suivant,
+        'filtres_activite': _filtres_activite(request),
+        'departments': Department.objects.all(),
+        'sites': Site.objects.all(),
+        'activity_types': ActivityEvent.TYPE_CHOICES,
+        **widgets['attendance_stats'],  # Décompresse toutes les stats de présence
+        'weekly_trend': widgets['weekly_trend'],
+        'status_stats': widgets['status_stats'],
     }
     
     return render(request, 'rh/dashboard.html', context)
@@ -172,6 +211,104 @@ def dashboard(request):
 
 
 
+# =============================================================================
+# Annuaire des employés : filtres côté serveur et pagination par curseur
+# =============================================================================
+TAILLE_PAGE_ANNUAIRE = 25
+TAILLE_AUTOCOMPLETION = 10
+# Tris autorisés (colonnes non nulles : le curseur (valeur, id) reste exact)
+TRIS_ANNUAIRE = ('username', 'last_name', 'first_name', 'date_joined')
+
+def _filtrer_annuaire(request):
+    """Applique les filtres GET (department, site, contract, active, q) à l'annuaire"""
+    from django.db.models import Q
+
+    employes = CustomUser.objects.select_related('employee_profile', 'department', 'site')
+    department = request.GET.get('department', '')
+    site = request.GET.get('site', '')
+    contract = request.GET.get('contract')
+    active = request.GET.get('active')
+    recherche = request.GET.get('q', '').strip()
+
+    if department.isdigit():
+        employes = employes.filter(department_id=department)
+    if site.isdigit():
+        employes = employes.filter(site_id=site)
+    if contract:
+        employes = employes.filter(employee_profile__contract_type=contract)
+    # Sans profil RH, un employé est affiché comme inactif
+    if active == 'true':
+        employes = employes.filter(employee_profile__is_active=True)
+    elif active == 'false':
+        employes = employes.exclude(employee_profile__is_active=True)
+    if recherche:
+        # Recherche par préfixe : pas de LIKE '%x%'
+        employes = employes.filter(
+            Q(username__istartswith=recherche) | Q(first_name__istartswith=recherche)
+            | Q(last_name__istartswith=recherche) | Q(email__istartswith=recherche)
+            | Q(employee_profile__employee_id__istartswith=recherche)
+        )
+    return employes
+
+def _page_annuaire(request, employes):
+    """
+    Retourne (employés de la page, curseur de la page suivante ou None).
+    Tri GET `tri` parmi TRIS_ANNUAIRE, préfixé de '-' pour l'ordre décroissant.
+    Le curseur encode (valeur du tri, id) de la dernière ligne affichée.
+    """
+    import base64
+    from django.db.models import Q
+
+    tri = request.GET.get('tri') or 'username'
+    decroissant = tri.startswith('-')
+    champ = tri.lstrip('-')
+    if champ not in TRIS_ANNUAIRE:
+        champ, decroissant = 'username', False
+    operateur = 'lt' if decroissant else 'gt'
+
+    curseur = request.GET.get('apres')
+    if curseur:
+        try:
+            valeur, id_curseur = json.loads(base64.urlsafe_b64decode(curseur.encode()))
+            employes = employes.filter(
+                Q(**{f'{champ}__{operateur}': valeur}) | Q(**{champ: valeur, f'id__{operateur}': int(id_curseur)})
+            )
+        except (ValueError, TypeError):
+            pass
+
+    ordre = [f'-{champ}', '-id'] if decroissant else [champ, 'id']
+    page = list(employes.order_by(*ordre)[:TAILLE_PAGE_ANNUAIRE + 1])
+    suivant = None
+    if len(page) > TAILLE_PAGE_ANNUAIRE:
+        page = page[:TAILLE_PAGE_ANNUAIRE]
+        valeur = getattr(page[-1], champ)
+        # isoformat() complet : DjangoJSONEncoder tronque aux millisecondes et le curseur sauterait des lignes
+        dernier = json.dumps([valeur.isoformat() if hasattr(valeur, 'isoformat') else valeur, page[-1].id])
+        suivant = base64.urlsafe_b64encode(dernier.encode()).decode()
+    return page, suivant
+
+def _profil_employe(user):
+    try:
+        return user.employee_profile
+    except EmployeeProfile.DoesNotExist:
+        return None
+
+def _employe_json(user):
+    profil = _profil_employe(user)
+    return {
+        'id': user.id,
+        'username': user.username,
+        'full_name': user.get_full_name() or user.username,
+        'email': user.email or '',
+        'employee_id': profil.employee_id if profil else None,
+        'position': profil.position if profil else None,
+        'department': user.department.name if user.department else None,
+        'site': user.site.name if user.site else None,
+        'contract_type': profil.contract_type if profil else None,
+        'salary': str(profil.salary) if profil and profil.salary else None,
+        'is_active': bool(profil and profil.is_active),
+    }
+
 @login_required
 @department_required("RH")
 def employees(request):
@@ -189,24 +326,103 @@ def employees(request):
     else:
         form = CustomUserCreationForm()
     
-    # Récupérer les utilisateurs avec leurs profils RH
-    employees = CustomUser.objects.select_related('employee_profile', 'department').all()
-    
-    # Récupérer tous les utilisateurs et départements pour le modal
-    all_users = CustomUser.objects.all()
-    all_departments = Department.objects.all()
-    
-    # Identifier les utilisateurs sans profil employé
-    users_without_profile = CustomUser.objects.filter(employee_profile__isnull=True)
+    # Premier écran seulement : la suite est chargée par employee_directory,
+    # les listes d'utilisateurs et de départements par employee_autocomplete
+    employees, suivant = _page_annuaire(request, _filtrer_annuaire(request))
     
     return render(request, 'rh/employees.html', {
         'employees': employees, 
+        'employees_suivant': suivant,
         'form': form,
-        'users': all_users,  # Pour le select des utilisateurs
-        'departments': all_departments,  # Pour le select des départements
-        'users_without_profile': users_without_profile  # Pour le bouton de création de profil
+        'departments': Department.objects.all(),  # Pour les filtres
+        'sites': Site.objects.all(),
+        'contract_types': EmployeeProfile.CONTRACT_TYPES,
+        'filtres': {cle: request.GET.get(cle, '') for cle in ('department', 'site', 'contract', 'active', 'q', 'tri')},
+        'has_users_without_profile': CustomUser.objects.filter(employee_profile__isnull=True).exists(),
     })
 
+@require_http_methods(["GET"])
+@login_required
+@department_required("RH")
+def employee_directory(request):
+    """Annuaire des employés en JSON : filtres, tri et pagination par curseur"""
+    page, suivant = _page_annuaire(request, _filtrer_annuaire(request))
+    return JsonResponse({
+        'success': True,
+        'employees': [_employe_json(user) for user in page],
+        'suivant': suivant,
+    })
+
+@require_http_methods(["GET"])
+@login_required
+@department_required("RH")
+def employee_autocomplete(request):
+    """
+    Suggestions par préfixe pour les sélecteurs du formulaire.
+    kind=user (option sans_profil=1) ou kind=department ; q : début du nom.
+    """
+    from django.db.models import Q
+
+    recherche = request.GET.get('q', '').strip()
+    if request.GET.get('kind') == 'department':
+        departements = Department.objects.all()
+        if recherche:
+            departements = departements.filter(Q(name__istartswith=recherche) | Q(code__istartswith=recherche))
+        resultats = [
+            {'id': d['id'], 'label': d['name']}
+            for d in departements.order_by('name').values('id', 'name')[:TAILLE_AUTOCOMPLETION]
+        ]
+        return JsonResponse({'success': True, 'results': resultats})
+
+    utilisateurs = CustomUser.objects.all()
+    if request.GET.get('sans_profil') == '1':
+        utilisateurs = utilisateurs.filter(employee_profile__isnull=True)
+    if recherche:
+        utilisateurs = utilisateurs.filter(
+            Q(username__istartswith=recherche) | Q(first_name__istartswith=recherche)
+            | Q(last_name__istartswith=recherche)
+        )
+    resultats = [
+        {'id': u['id'], 'label': f"{' '.join(filter(None, [u['first_name'], u['last_name']])) or u['username']} ({u['username']})"}
+        for u in utilisateurs.order_by('username').values('id', 'username', 'first_name', 'last_name')[:TAILLE_AUTOCOMPLETION]
+    ]
+    return JsonResponse({'success': True, 'results': resultats})
+
+@require_http_methods(["GET"])
+@login_required
+@department_required("RH")
+def employee_search(request):
+    """Recherche plein texte classée et tolérante aux fautes (index rh/recherche.py)"""
+    classement = rechercher_employes(request.GET.get('q', ''), limite=TAILLE_AUTOCOMPLETION * 2)
+    utilisateurs = CustomUser.objects.select_related('employee_profile', 'department', 'site').in_bulk(
+        [user_id for user_id, _ in classement]
+    )
+    return JsonResponse({
+        'success': True,
+        'results': [
+            {**_employe_json(utilisateurs[user_id]), 'score': score}
+            for user_id, score in classement if user_id in utilisateurs
+        ],
+    })
+
+@login_required
+@department_required("RH")
+def import_employees(request):
+    """Import en masse d'employés (CSV/XLSX) avec rapport d'erreurs par ligne"""
+    rapport = None
+    if request.method == 'POST':
+        fichier = request.FILES.get('fichier')
+        if not fichier:
+            messages.error(request, 'Veuillez choisir un fichier CSV ou XLSX.')
+        else:
+            try:
+                rapport = importer_employes(lire_lignes(fichier, fichier.name))
+            except ValueError as e:
+                messages.error(request, f'Lecture du fichier impossible : {e}')
+            else:
+                messages.success(request, f"{rapport['crees']} employé(s) créé(s), {len(rapport['erreurs'])} ligne(s) en erreur.")
+    return render(request, 'rh/employee_import.html', {'rapport': rapport})
+
 @csrf_exempt
 @require_http_methods(["POST"])
 @login_required
@@ -264,12 +480,14 @@ def create_employee_profile(request):
 def get_employee_profile(request, user_id):
     """Récupérer les données d'un profil employé via AJAX"""
     try:
-        employee_profile = EmployeeProfile.objects.get(user_id=user_id)
+        employee_profile = EmployeeProfile.objects.select_related('user', 'department').get(user_id=user_id)
         
         data = {
             'employee_id': employee_profile.employee_id,
             'position': employee_profile.position or '',
             'department_id': employee_profile.department_id if employee_profile.department else '',
+            'department_name': employee_profile.department.name if employee_profile.department else '',
+            'user_label': f"{employee_profile.user.get_full_name() or employee_profile.user.username} ({employee_profile.user.username})",
             'hire_date': employee_profile.hire_date.strftime('%Y-%m-%d') if employee_profile.hire_date else '',
             'contract_type': employee_profile.contract_type or '',
             'salary': str(employee_profile.salary) if employee_profile.salary else '',
@@ -317,7 +535,70 @@ def leave_requests(request):
     if leave_type:
         leaves = leaves.filter(leave_type=leave_type)
     
-    return render(request, 'rh/leave_requests.html', {'leaves': leaves})
+    # Soldes matérialisés : une requête pour tous les employés de la liste
+    leaves = list(leaves)
+    soldes_employes = soldes({leave.employee_id for leave in leaves})
+    for leave in leaves:
+        leave.solde = soldes_employes.get((leave.employee_id, leave.leave_type), 0)
+    
+    return render(request, 'rh/leave_requests.html', {
+        'leaves': leaves,
+        'departments': Department.objects.order_by('name'),
+        'current_month': timezone.localdate().strftime('%Y-%m'),
+    })
+
+def _peut_voir_disponibilites(user, department_id):
+    """RH : tous les départements ; responsable : départements où il est administrateur"""
+    if user.department is not None and user.department.code == 'RH':
+        return True
+    return UserPermission.objects.filter(user=user, department_id=department_id, is_admin=True).exists()
+
+@require_http_methods(["GET"])
+@login_required
+def team_availability(request):
+    """Matrice de disponibilité d'un département (?department=<id>&month=AAAA-MM)"""
+    try:
+        department_id = int(request.GET.get('department', ''))
+        mois = periode_depuis_texte(request.GET.get('month') or timezone.localdate().strftime('%Y-%m'))
+    except ValueError:
+        return JsonResponse({'error': "Paramètres attendus : department=<id>, month=AAAA-MM"}, status=400)
+    if not _peut_voir_disponibilites(request.user, department_id):
+        return HttpResponseForbidden("⛔ Vous n'avez pas accès à ce département.")
+    return JsonResponse(matrice_disponibilites(department_id, mois))
+
+@require_http_methods(["POST"])
+@login_required
+@department_required("RH")
+def decide_leave_request(request, leave_id):
+    """Approuver ou rejeter une demande de congé via AJAX ; retourne le solde mis à jour"""
+    try:
+        data = json.loads(request.body or '{}')
+        status = data.get('status')
+        if status not in ('approved', 'rejected'):
+            return JsonResponse({'success': False, 'error': 'Décision attendue : approved ou rejected'})
+        
+        leave = LeaveRequest.objects.get(pk=leave_id)
+        if status == 'approved':
+            autre = LeaveRequest.objects.chevauchements(
+                leave.employee_id, leave.start_date, leave.end_date, exclude_id=leave.pk
+            ).filter(status='approved').first()
+            if autre:
+                return JsonResponse({
+                    'success': False,
+                    'error': f"Chevauche un congé déjà approuvé du {autre.start_date:%d/%m/%Y} au {autre.end_date:%d/%m/%Y}",
+                })
+        leave.status = status
+        leave.save()
+        
+        solde = soldes([leave.employee_id]).get((leave.employee_id, leave.leave_type), 0)
+        return JsonResponse({'success': True, 'status': leave.status, 'balance': float(solde)})
+        
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'error': 'Requête invalide'}, status=400)
+    except LeaveRequest.DoesNotExist:
+        return JsonResponse({'success': False, 'error': 'Demande de congé non trouvée'})
+    except ValidationError as e:
+        return JsonResponse({'success': False, 'error': ' '.join(e.messages)})
 
 @login_required
 @department_required("RH")
@@ -342,6 +623,42 @@ def payroll(request):
     
     return render(request, 'rh/payroll.html', {'payrolls': payrolls})
 
+def _fiches_bulletins():
+    return Payroll.objects.select_related('employee__employee_profile__department')
+
+@login_required
+@department_required("RH")
+def payslip_download(request, payroll_id):
+    """Bulletin DOCX d'une fiche (rendu s'il n'est pas déjà en cache)"""
+    payroll = get_object_or_404(_fiches_bulletins(), pk=payroll_id)
+    return FileResponse(open(bulletin(payroll), 'rb'), as_attachment=True, filename=nom_bulletin(payroll))
+
+@login_required
+@department_required("RH")
+def payslips_zip(request):
+    """Bulletins d'un mois (?month=AAAA-MM) en une archive ZIP envoyée en flux"""
+    try:
+        mois = periode_depuis_texte(request.GET.get('month', ''))
+    except ValueError:
+        return JsonResponse({'error': "Paramètre month attendu au format AAAA-MM"}, status=400)
+    fiches = _fiches_bulletins().filter(month=mois).order_by('employee__username', 'id')
+    if not fiches.exists():
+        return JsonResponse({'error': "Aucune fiche de paie pour ce mois"}, status=404)
+
+    def fichiers():
+        # Parcouru pendant l'envoi : les bulletins manquants sont rendus un à un, au fil de l'archive
+        noms = set()
+        for payroll in fiches.iterator(chunk_size=500):
+            nom = nom_bulletin(payroll)
+            if nom in noms:
+                nom = nom.replace('.docx', f'_{payroll.pk}.docx')
+            noms.add(nom)
+            yield nom, bulletin(payroll)
+
+    response = StreamingHttpResponse(flux_zip(fichiers()), content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="bulletins_{mois:%Y-%m}.zip"'
+    return response
+
 @login_required
 @department_required("RH")
 def performance(request):
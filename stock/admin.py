@@ -1,7 +1,7 @@
 # stock/admin.py
 from unfold.admin import ModelAdmin
 from django.contrib import admin
-from .models import StockItem, StockMovement
+from .models import StockItem, StockMovement, StockSnapshot, StockLocationSummary, StockDailyMovement
 
 @admin.register(StockItem)
 class StockItemAdmin(ModelAdmin):
@@ -11,6 +11,13 @@ class StockItemAdmin(ModelAdmin):
     readonly_fields = ('created_at', 'updated_at')
     ordering = ('name',)
     list_per_page = 20
+
+    def get_readonly_fields(self, request, obj=None):
+        # La quantité d'un article existant ne change que par des mouvements de stock
+        if obj is not None:
+            return self.readonly_fields + ('quantity',)
+        return self.readonly_fields
+
     fieldsets = (
         (None, {
             'fields': ('name', 'sku', 'description', 'location', 'is_active')
@@ -30,3 +37,52 @@ class StockMovementAdmin(ModelAdmin):
     list_filter = ('movement_type', 'created_at')
     readonly_fields = ('created_at',)
     list_per_page = 20
+
+    # Un mouvement enregistré a déjà modifié la quantité, les agrégats et les instantanés :
+    # on le corrige par un mouvement inverse, jamais en le modifiant ou en le supprimant
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(StockSnapshot)
+class StockSnapshotAdmin(ModelAdmin):
+    list_display = ('item', 'date', 'quantity', 'value', 'created_at')
+    search_fields = ('item__name', 'item__sku')
+    list_filter = ('date',)
+    list_per_page = 20
+
+    # Écrits par python manage.py prendre_instantanes_stock
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+# Agrégats du tableau de bord : maintenus par les mouvements (python manage.py reconstruire_agregats_stock)
+@admin.register(StockLocationSummary)
+class StockLocationSummaryAdmin(ModelAdmin):
+    list_display = ('location', 'item_count', 'total_quantity', 'total_value', 'out_of_stock_count', 'updated_at')
+    search_fields = ('location',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(StockDailyMovement)
+class StockDailyMovementAdmin(ModelAdmin):
+    list_display = ('date', 'item', 'quantity_in', 'quantity_out', 'movement_count')
+    search_fields = ('item__name', 'item__sku')
+    list_filter = ('date',)
+    list_per_page = 20
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
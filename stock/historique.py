@@ -0,0 +1,141 @@
+"""
+Quantité et valeur du stock à une date passée.
+
+Sans historique, la quantité d'un article à une date s'obtient en rejouant à
+rebours tous ses mouvements depuis aujourd'hui : le coût croît avec
+l'historique. Les instantanés de fin de journée (StockSnapshot, écrits par
+python manage.py prendre_instantanes_stock) bornent ce rejeu :
+
+    quantité à t = instantané le plus récent avant t + mouvements depuis
+
+Les mouvements depuis l'instantané sont sommés par une agrégation servie par
+l'index (item, created_at) ; un article sans instantané est rejoué à rebours
+depuis sa quantité actuelle. Une valorisation de fin de mois dont
+l'instantané existe ne lit aucun mouvement.
+
+La valeur est calculée au prix unitaire actuel de l'article (le prix n'est
+pas historisé).
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from django.db import transaction
+from django.db.models import Case, F, OuterRef, Subquery, Sum, When
+from django.utils import timezone
+from .models import StockItem, StockMovement, StockSnapshot
+
+TAILLE_LOT = 500
+
+
+def fin_journee(jour):
+    """Instant qui clôt la journée `jour` (minuit suivant, heure locale)"""
+    return timezone.make_aware(datetime.combine(jour + timedelta(days=1), time.min))
+
+
+def _variations(debut, fin, item_ids):
+    """{item_id: variation de quantité} des mouvements créés dans [debut, fin[ (fin facultative)"""
+    mouvements = StockMovement.objects.filter(created_at__gte=debut)
+    if fin is not None:
+        mouvements = mouvements.filter(created_at__lt=fin)
+    # Peu d'articles : filtre sur l'index (item, created_at) ; sinon un seul parcours de la période
+    if len(item_ids) <= TAILLE_LOT:
+        mouvements = mouvements.filter(item_id__in=item_ids)
+    variations = mouvements.values('item_id').annotate(variation=Sum(Case(
+        When(movement_type=StockMovement.IN, then=F('quantity')), default=-F('quantity'),
+    ))).values_list('item_id', 'variation')
+    return {item_id: variation for item_id, variation in variations if item_id in item_ids}
+
+
+def etat_au(moment, articles=None):
+    """
+    {item_id: (quantité, prix unitaire)} des articles existant à `moment`
+    (mouvements créés avant `moment`). articles : queryset de StockItem à restreindre.
+    """
+    articles = StockItem.objects.all() if articles is None else articles
+    instantanes = StockSnapshot.objects.filter(
+        item=OuterRef('pk'), date__lt=timezone.localtime(moment).date(),
+    ).order_by('-date')
+    lignes = articles.filter(created_at__lt=moment).annotate(
+        date_instantane=Subquery(instantanes.values('date')[:1]),
+        quantite_instantane=Subquery(instantanes.values('quantity')[:1]),
+    ).values_list('id', 'quantity', 'unit_price', 'date_instantane', 'quantite_instantane')
+
+    etat = {}
+    par_instantane = defaultdict(set)
+    for item_id, quantite, prix, date_instantane, quantite_instantane in lignes:
+        if date_instantane is None:
+            # Pas d'instantané : quantité actuelle moins les mouvements postérieurs à `moment`
+            etat[item_id] = (quantite, prix)
+            par_instantane[None].add(item_id)
+        else:
+            etat[item_id] = (quantite_instantane, prix)
+            par_instantane[date_instantane].add(item_id)
+
+    for date_instantane, item_ids in par_instantane.items():
+        if date_instantane is None:
+            variations = {i: -v for i, v in _variations(moment, None, item_ids).items()}
+        elif fin_journee(date_instantane) < moment:
+            variations = _variations(fin_journee(date_instantane), moment, item_ids)
+        else:
+            continue
+        for item_id, variation in variations.items():
+            quantite, prix = etat[item_id]
+            etat[item_id] = (quantite + variation, prix)
+    return etat
+
+
+def quantites_au(moment, articles=None):
+    """{item_id: quantité} à `moment`"""
+    return {item_id: quantite for item_id, (quantite, _) in etat_au(moment, articles).items()}
+
+
+def _valeur(quantite, prix):
+    return quantite * prix if prix is not None else None
+
+
+def valorisation(jour):
+    """
+    Stock en fin de journée `jour`, sérialisable en JSON :
+    {'date', 'total_quantity', 'total_value', 'items': [{'id', 'sku', 'name', 'quantity', 'unit_price', 'value'}]}
+    """
+    etat = etat_au(fin_journee(jour))
+    articles = []
+    total_quantite = 0
+    total_valeur = 0
+    for item_id, sku, nom in StockItem.objects.filter(id__in=list(etat)).values_list('id', 'sku', 'name'):
+        quantite, prix = etat[item_id]
+        valeur = _valeur(quantite, prix)
+        total_quantite += quantite
+        total_valeur += valeur or 0
+        articles.append({
+            'id': item_id, 'sku': sku, 'name': nom, 'quantity': quantite,
+            'unit_price': str(prix) if prix is not None else None,
+            'value': str(valeur) if valeur is not None else None,
+        })
+    return {
+        'date': jour.isoformat(),
+        'total_quantity': total_quantite,
+        'total_value': str(total_valeur),
+        'items': articles,
+    }
+
+
+def prendre_instantanes(jour):
+    """
+    Écrit (ou réécrit) l'instantané de fin de journée `jour` de chaque article.
+    Seules les journées terminées sont acceptées ; retourne le nombre d'instantanés.
+    """
+    if jour >= timezone.localdate():
+        raise ValueError(f"La journée du {jour:%d/%m/%Y} n'est pas terminée.")
+    maintenant = timezone.now()
+    instantanes = [
+        StockSnapshot(
+            item_id=item_id, date=jour, quantity=quantite, value=_valeur(quantite, prix), created_at=maintenant,
+        )
+        for item_id, (quantite, prix) in etat_au(fin_journee(jour)).items()
+    ]
+    with transaction.atomic():
+        StockSnapshot.objects.bulk_create(
+            instantanes, batch_size=TAILLE_LOT,
+            update_conflicts=True, unique_fields=['item', 'date'], update_fields=['quantity', 'value', 'created_at'],
+        )
+    return len(instantanes)
@@ -0,0 +1,168 @@
+"""
+Import en masse de mouvements de stock depuis les exports CSV des scanners
+(réceptions, préparations de commandes).
+
+Le fichier est lu au fil de l'eau et traité par lots : une requête IN
+résout les SKU du lot, les mouvements sont insérés par bulk_create et les
+variations de quantité cumulées par article sont appliquées par UPDATE avec
+F() (stock/mouvements.py), dans une transaction par lot. Une ligne invalide
+(SKU inconnu, quantité illisible...) est signalée dans le rapport sans
+interrompre l'import.
+
+Colonnes reconnues (en-tête) : sku, quantity, movement_type (IN/OUT,
+entree/sortie, E/S ; facultatif), note, date (AAAA-MM-JJ[ HH:MM[:SS]] ou
+JJ/MM/AAAA[ HH:MM[:SS]] ; facultatif). Sans type, une quantité négative
+vaut une sortie, une quantité positive le type par défaut de l'import (IN sinon).
+"""
+import csv
+import io
+from datetime import datetime
+from django.utils import timezone
+from .models import StockItem, StockMovement, StockInsuffisant, ArticleIntrouvable
+from .mouvements import poster_mouvements
+
+TAILLE_LOT = 1000
+# Clé des valeurs d'une ligne plus longue que l'en-tête
+COLONNES_EN_TROP = '__en_trop__'
+FORMATS_DATE = (
+    '%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d',
+    '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%d/%m/%Y',
+)
+TYPES_MOUVEMENT = {
+    'in': StockMovement.IN, 'entree': StockMovement.IN, 'entrée': StockMovement.IN, 'e': StockMovement.IN,
+    'out': StockMovement.OUT, 'sortie': StockMovement.OUT, 's': StockMovement.OUT,
+}
+
+
+def lire_csv(fichier):
+    """
+    Itère sur (numéro de ligne, dict des colonnes) d'un fichier CSV binaire (séparateur , ; ou tabulation).
+    Les valeurs au-delà de l'en-tête sont rangées sous COLONNES_EN_TROP (refusées par valider_ligne).
+    """
+    texte = io.TextIOWrapper(fichier, encoding='utf-8-sig', newline='')
+    debut = texte.read(4096)
+    texte.seek(0)
+    try:
+        dialecte = csv.Sniffer().sniff(debut, delimiters=',;\t')
+    except csv.Error:
+        dialecte = csv.excel
+    lecteur = csv.DictReader(texte, dialect=dialecte, restkey=COLONNES_EN_TROP)
+    for numero, ligne in enumerate(lecteur, start=2):
+        # Séparateurs finaux vides (exports de tableur) tolérés
+        en_trop = [valeur.strip() for valeur in ligne.pop(COLONNES_EN_TROP, []) if valeur.strip()]
+        ligne = {str(cle or '').strip().lower(): (valeur or '').strip() for cle, valeur in ligne.items()}
+        if en_trop:
+            ligne[COLONNES_EN_TROP] = en_trop
+        yield numero, ligne
+
+
+def _date(texte):
+    for format_date in FORMATS_DATE:
+        try:
+            return timezone.make_aware(datetime.strptime(texte, format_date))
+        except ValueError:
+            continue
+    raise ValueError(f"Date invalide : {texte} (attendu AAAA-MM-JJ ou JJ/MM/AAAA, heure facultative)")
+
+
+def valider_ligne(ligne, type_defaut=None):
+    """Champs du mouvement d'une ligne (sans l'article) ; lève ValueError si la ligne est invalide"""
+    if ligne.get(COLONNES_EN_TROP):
+        raise ValueError(f"Colonnes en trop : {', '.join(ligne[COLONNES_EN_TROP])}")
+    if not ligne.get('sku'):
+        raise ValueError("SKU manquant")
+    try:
+        quantite = int(ligne.get('quantity', '').replace(' ', ''))
+    except ValueError:
+        raise ValueError(f"Quantité invalide : {ligne.get('quantity') or '(vide)'}")
+
+    texte_type = ligne.get('movement_type', '').lower()
+    if texte_type:
+        if texte_type not in TYPES_MOUVEMENT:
+            raise ValueError(f"Type de mouvement inconnu : {ligne['movement_type']}")
+        movement_type = TYPES_MOUVEMENT[texte_type]
+    elif quantite < 0:
+        movement_type = StockMovement.OUT
+    else:
+        movement_type = type_defaut or StockMovement.IN
+    if quantite == 0 or (quantite < 0 and texte_type):
+        raise ValueError(f"Quantité invalide : {quantite}")
+
+    champs = {'quantity': abs(quantite), 'movement_type': movement_type, 'note': ligne.get('note', '')[:255]}
+    if ligne.get('date'):
+        champs['created_at'] = _date(ligne['date'])
+    return champs
+
+
+def _erreur(rapport, numero, ligne, message):
+    rapport['erreurs'].append({'ligne': numero, 'sku': ligne.get('sku'), 'erreur': message})
+
+
+def _poster_lot(lot, performed_by, refuser_negatif, rapport):
+    """Résout les SKU du lot en une requête et enregistre les mouvements valides"""
+    articles = {
+        sku: (id_, actif)
+        for sku, id_, actif in StockItem.objects.filter(
+            sku__in={ligne['sku'] for _, ligne, _ in lot}
+        ).values_list('sku', 'id', 'is_active')
+    }
+    mouvements = []
+    for numero, ligne, champs in lot:
+        if ligne['sku'] not in articles:
+            _erreur(rapport, numero, ligne, f"SKU inconnu : {ligne['sku']}")
+        elif not articles[ligne['sku']][1]:
+            _erreur(rapport, numero, ligne, f"Article inactif : {ligne['sku']}")
+        else:
+            mouvements.append((numero, ligne, StockMovement(
+                item_id=articles[ligne['sku']][0], performed_by=performed_by, **champs,
+            )))
+
+    while mouvements:
+        try:
+            poster_mouvements([mouvement for _, _, mouvement in mouvements], refuser_negatif)
+        except StockInsuffisant as e:
+            # Lot rejeté en entier : on écarte les articles en défaut et on réessaie le reste
+            insuffisants, erreur = set(e.skus), str(e)
+            en_defaut = [m for m in mouvements if m[1]['sku'] in insuffisants]
+            message = "Stock insuffisant : {sku}"
+        except ArticleIntrouvable as e:
+            # Article supprimé depuis la résolution des SKU du lot
+            introuvables, erreur = set(e.ids), str(e)
+            en_defaut = [m for m in mouvements if m[2].item_id in introuvables]
+            message = "Article supprimé pendant l'import : {sku}"
+        else:
+            rapport['importes'] += len(mouvements)
+            return
+        if not en_defaut:
+            # Erreur qui ne désigne aucune ligne du lot : le reste du lot est rejeté plutôt que réessayé sans fin
+            en_defaut = mouvements
+            message = "Lot rejeté : {erreur}"
+        for numero, ligne, _ in en_defaut:
+            _erreur(rapport, numero, ligne, message.format(sku=ligne['sku'], erreur=erreur))
+        retires = {id(m) for m in en_defaut}
+        mouvements = [m for m in mouvements if id(m) not in retires]
+
+
+def importer_mouvements(lignes, performed_by=None, type_defaut=None, refuser_negatif=False, taille_lot=TAILLE_LOT):
+    """
+    Importe les mouvements des lignes (itérable de (numéro, dict)).
+    type_defaut : IN ou OUT pour les fichiers sans colonne movement_type.
+    refuser_negatif : écarte (avec erreur) les lignes des articles dont le stock passerait sous zéro.
+    Retourne {'importes': nombre, 'erreurs': [{ligne, sku, erreur}]}.
+    """
+    rapport = {'importes': 0, 'erreurs': []}
+    lot = []
+    for numero, ligne in lignes:
+        try:
+            champs = valider_ligne(ligne, type_defaut)
+        except ValueError as e:
+            _erreur(rapport, numero, ligne, str(e))
+            continue
+        lot.append((numero, ligne, champs))
+        if len(lot) >= taille_lot:
+            _poster_lot(lot, performed_by, refuser_negatif, rapport)
+            lot = []
+    if lot:
+        _poster_lot(lot, performed_by, refuser_negatif, rapport)
+    rapport['erreurs'].sort(key=lambda erreur: erreur['ligne'])
+    return rapport
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from accounts.models import CustomUser
+from stock.import_mouvements import importer_mouvements, lire_csv, TAILLE_LOT
+from stock.models import StockMovement
+
+
+class Command(BaseCommand):
+    help = "Importer des mouvements de stock en masse depuis un export CSV de scanner"
+
+    def add_arguments(self, parser):
+        parser.add_argument('fichier', help="Fichier CSV (séparateur , ; ou tabulation) avec une ligne d'en-tête")
+        parser.add_argument('--type', choices=[StockMovement.IN, StockMovement.OUT], help="Type des lignes sans colonne movement_type")
+        parser.add_argument('--utilisateur', help="Nom d'utilisateur enregistré comme auteur des mouvements")
+        parser.add_argument('--taille-lot', type=int, default=TAILLE_LOT, help="Nombre de lignes traitées par transaction")
+        parser.add_argument('--refuser-negatif', action='store_true', help="Rejeter les lignes qui rendraient un stock négatif")
+
+    def handle(self, *args, **options):
+        auteur = None
+        if options['utilisateur']:
+            auteur = CustomUser.objects.filter(username=options['utilisateur']).first()
+            if auteur is None:
+                raise CommandError(f"Utilisateur inconnu : {options['utilisateur']}")
+        try:
+            with open(options['fichier'], 'rb') as fichier:
+                rapport = importer_mouvements(
+                    lire_csv(fichier),
+                    performed_by=auteur,
+                    type_defaut=options['type'],
+                    refuser_negatif=options['refuser_negatif'],
+                    taille_lot=options['taille_lot'],
+                )
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Lecture du fichier impossible : {e}")
+
+        for erreur in rapport['erreurs']:
+            self.stdout.write(self.style.WARNING(f"Ligne {erreur['ligne']} ({erreur['sku'] or '-'}) : {erreur['erreur']}"))
+        self.stdout.write(self.style.SUCCESS(
+            f"{rapport['importes']} mouvement(s) importé(s), {len(rapport['erreurs'])} ligne(s) en erreur."
+        ))
@@ -0,0 +1,34 @@
+from datetime import date, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from stock.historique import prendre_instantanes
+
+
+class Command(BaseCommand):
+    help = "Enregistrer la quantité et la valeur de chaque article en fin de journée (à planifier chaque nuit)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help="Journée terminée (AAAA-MM-JJ), par défaut la veille")
+        parser.add_argument('--depuis', help="Première journée à (re)calculer (AAAA-MM-JJ), pour combler un historique")
+
+    def handle(self, *args, **options):
+        try:
+            fin = date.fromisoformat(options['date']) if options['date'] else timezone.localdate() - timedelta(days=1)
+            debut = date.fromisoformat(options['depuis']) if options['depuis'] else fin
+        except ValueError:
+            raise CommandError("Format de date attendu : AAAA-MM-JJ")
+        if debut > fin:
+            raise CommandError("--depuis doit précéder --date")
+
+        total = 0
+        jour = debut
+        try:
+            # Dans l'ordre : chaque journée part de l'instantané de la veille
+            while jour <= fin:
+                total += prendre_instantanes(jour)
+                jour += timedelta(days=1)
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} instantané(s) enregistré(s) du {debut:%d/%m/%Y} au {fin:%d/%m/%Y}."
+        ))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from stock.tableau_de_bord import reconstruire_agregats
+
+
+class Command(BaseCommand):
+    help = "Reconstruire les agrégats du tableau de bord stock à partir des articles et des mouvements"
+
+    def handle(self, *args, **options):
+        emplacements, journees = reconstruire_agregats()
+        self.stdout.write(self.style.SUCCESS(
+            f"{emplacements} emplacement(s) et {journees} ligne(s) journalière(s) reconstruits."
+        ))
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.5 on 2026-10-18 08:28
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('quantity', models.IntegerField(verbose_name='Quantité')),
+                ('value', models.DecimalField(blank=True, decimal_places=2, max_digits=14, null=True, verbose_name='Valeur')),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Calculé le')),
+            ],
+            options={
+                'verbose_name': 'Instantané de stock',
+                'verbose_name_plural': 'Instantanés de stock',
+                'ordering': ['-date', 'item'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['item', 'created_at'], name='stock_stock_item_id_29a1d7_idx'),
+        ),
+        migrations.AddField(
+            model_name='stocksnapshot',
+            name='item',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='stock.stockitem'),
+        ),
+        migrations.AddConstraint(
+            model_name='stocksnapshot',
+            constraint=models.UniqueConstraint(fields=('item', 'date'), name='stock_instantane_unique'),
+        ),
+    ]
@@ -0,0 +1,101 @@
+# Generated by Django 5.2.5 on 2026-10-18 08:31
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Case, Count, DecimalField, F, Q, Sum, When
+
+
+def remplir_agregats(apps, schema_editor):
+    """Agrégats par emplacement et par jour depuis les articles et les mouvements existants"""
+    StockItem = apps.get_model('stock', 'StockItem')
+    StockMovement = apps.get_model('stock', 'StockMovement')
+    StockLocationSummary = apps.get_model('stock', 'StockLocationSummary')
+    StockDailyMovement = apps.get_model('stock', 'StockDailyMovement')
+
+    StockLocationSummary.objects.bulk_create([
+        StockLocationSummary(
+            location=ligne['location'], item_count=ligne['nombre'], total_quantity=ligne['quantite'] or 0,
+            total_value=ligne['valeur'] or 0, out_of_stock_count=ligne['ruptures'],
+        )
+        for ligne in StockItem.objects.filter(is_active=True).values('location').annotate(
+            nombre=Count('id'),
+            quantite=Sum('quantity'),
+            valeur=Sum(
+                F('quantity') * F('unit_price'), filter=Q(unit_price__isnull=False),
+                output_field=DecimalField(max_digits=16, decimal_places=2),
+            ),
+            ruptures=Count('id', filter=Q(quantity__lte=0)),
+        ).order_by()
+    ], batch_size=1000)
+
+    StockDailyMovement.objects.bulk_create(
+        (
+            StockDailyMovement(
+                date=ligne['created_at__date'], item_id=ligne['item_id'], quantity_in=ligne['entrees'],
+                quantity_out=ligne['sorties'], movement_count=ligne['nombre'],
+            )
+            for ligne in StockMovement.objects.values('created_at__date', 'item_id').annotate(
+                entrees=Sum(Case(When(movement_type='IN', then=F('quantity')), default=0)),
+                sorties=Sum(Case(When(movement_type='OUT', then=F('quantity')), default=0)),
+                nombre=Count('id'),
+            ).order_by().iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock', '0002_stockmovement_index_stocksnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockDailyMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Date')),
+                ('quantity_in', models.IntegerField(default=0, verbose_name='Entrées')),
+                ('quantity_out', models.IntegerField(default=0, verbose_name='Sorties')),
+                ('movement_count', models.IntegerField(default=0, verbose_name='Mouvements')),
+            ],
+            options={
+                'verbose_name': 'Mouvements du jour',
+                'verbose_name_plural': 'Mouvements par jour',
+                'ordering': ['-date', 'item'],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockLocationSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('location', models.CharField(max_length=255, unique=True, verbose_name='Emplacement')),
+                ('item_count', models.IntegerField(default=0, verbose_name='Articles')),
+                ('total_quantity', models.IntegerField(default=0, verbose_name='Quantité totale')),
+                ('total_value', models.DecimalField(decimal_places=2, default=0, max_digits=16, verbose_name='Valeur totale')),
+                ('out_of_stock_count', models.IntegerField(default=0, verbose_name='Articles en rupture')),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Mis à jour le')),
+            ],
+            options={
+                'verbose_name': 'Stock par emplacement',
+                'verbose_name_plural': 'Stock par emplacement',
+                'ordering': ['location'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='stockitem',
+            index=models.Index(fields=['is_active', 'quantity'], name='stock_stock_is_acti_0cc132_idx'),
+        ),
+        migrations.AddField(
+            model_name='stockdailymovement',
+            name='item',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_movements', to='stock.stockitem'),
+        ),
+        migrations.AddConstraint(
+            model_name='stockdailymovement',
+            constraint=models.UniqueConstraint(fields=('date', 'item'), name='stock_mouvements_jour_unique'),
+        ),
+        migrations.RunPython(remplir_agregats, migrations.RunPython.noop),
+    ]
@@ -3,12 +3,134 @@
 Modèles liés au stock :
 - StockItem : articles stockés
 - StockMovement : historique des entrées/sorties (met à jour la quantité sur save())
+- StockSnapshot : quantité et valeur de chaque article en fin de journée (stock/historique.py)
+- StockLocationSummary, StockDailyMovement : agrégats du tableau de bord stock,
+  maintenus au fil des mouvements (stock/tableau_de_bord.py)
+
+Les quantités ne sont jamais lues puis réécrites en Python : elles sont
+modifiées par UPDATE ... SET quantity = quantity + n (voir stock/mouvements.py).
 """
 
-from django.db import models
+from collections import Counter, defaultdict
+from decimal import Decimal
+from django.db import models, transaction
+from django.db.models import F
 from django.conf import settings
+from django.dispatch import Signal
 from django.utils import timezone
 
+# Émis après chaque mise à jour des agrégats du tableau de bord (stock/signals.py vide le cache)
+agregats_stock_modifies = Signal()
+
+TAILLE_LOT = 500
+
+
+def contribution_article(location, quantity, unit_price, is_active):
+    """Part d'un article dans les agrégats par emplacement : {(location, champ): valeur}"""
+    if not is_active:
+        return Counter()
+    return Counter({
+        (location, 'item_count'): 1,
+        (location, 'total_quantity'): quantity,
+        (location, 'total_value'): quantity * Decimal(str(unit_price or 0)),
+        (location, 'out_of_stock_count'): int(quantity <= 0),
+    })
+
+
+class StockInsuffisant(Exception):
+    """Un mouvement rendrait le stock négatif ; `skus` liste les références concernées"""
+
+    def __init__(self, skus):
+        self.skus = sorted(skus)
+        super().__init__(f"Stock insuffisant pour : {', '.join(self.skus)}")
+
+
+class ArticleIntrouvable(Exception):
+    """Un mouvement porte sur un article qui n'existe plus ; `ids` liste les articles concernés"""
+
+    def __init__(self, ids):
+        self.ids = sorted(ids)
+        super().__init__(f"Article(s) introuvable(s) : {', '.join(map(str, self.ids))}")
+
+
+class ArticleInactif(Exception):
+    """Un mouvement porte sur un article désactivé ; `skus` liste les références concernées"""
+
+    def __init__(self, skus):
+        self.skus = sorted(skus)
+        super().__init__(f"Article(s) inactif(s) : {', '.join(self.skus)}")
+
+
+class _MiseAJourIncomplete(Exception):
+    """UPDATE gardé qui n'a pas touché toutes ses lignes (interne à appliquer_deltas)"""
+
+    def __init__(self, ids, delta):
+        self.ids, self.delta = ids, delta
+        super().__init__()
+
+
+class StockItemManager(models.Manager):
+    def appliquer_deltas(self, deltas, refuser_negatif=False, actifs_seulement=False):
+        """
+        Ajoute les variations {item_id: delta} aux quantités par des UPDATE
+        avec F() (un par valeur de delta), dans une transaction.
+        refuser_negatif : lève StockInsuffisant (et annule tout) si une quantité passerait sous zéro.
+        Lève ArticleIntrouvable si un article a été supprimé entre-temps.
+        actifs_seulement : lève ArticleInactif si un article est désactivé.
+        Les conditions (stock suffisant, article actif) sont dans le WHERE de l'UPDATE
+        lui-même : deux lots concurrents ne peuvent pas passer tous deux un contrôle
+        préalable puis décrémenter. Retourne {item_id: nouvelle quantité}.
+        """
+        deltas = {item_id: int(delta) for item_id, delta in deltas.items()}
+        par_delta = defaultdict(list)
+        for item_id, delta in deltas.items():
+            if delta:
+                par_delta[delta].append(item_id)
+        maintenant = timezone.now()
+        try:
+            with transaction.atomic():
+                # Ordre fixe des UPDATE : deux lots concurrents ne s'attendent pas mutuellement
+                for delta, ids in sorted(par_delta.items()):
+                    articles = self.filter(id__in=ids)
+                    if actifs_seulement:
+                        articles = articles.filter(is_active=True)
+                    if refuser_negatif and delta < 0:
+                        articles = articles.filter(quantity__gte=-delta)
+                    if articles.update(quantity=F('quantity') + delta, updated_at=maintenant) != len(ids):
+                        raise _MiseAJourIncomplete(ids, delta)
+                # Lu dans la même transaction, après les UPDATE qui verrouillent les lignes
+                quantites = {}
+                variations = Counter()
+                for item_id, quantite, location, prix, actif in self.filter(id__in=list(deltas)).values_list(
+                    'id', 'quantity', 'location', 'unit_price', 'is_active'
+                ):
+                    quantites[item_id] = quantite
+                    if deltas[item_id]:
+                        variations.update(contribution_article(location, quantite, prix, actif))
+                        variations.subtract(contribution_article(location, quantite - deltas[item_id], prix, actif))
+                StockLocationSummary.objects.appliquer(variations)
+                return quantites
+        except _MiseAJourIncomplete as e:
+            raise self._erreur_mise_a_jour(e.ids, e.delta, actifs_seulement) from None
+
+    def _erreur_mise_a_jour(self, ids, delta, actifs_seulement):
+        """
+        Cause d'un UPDATE incomplet, lue après l'annulation (les lignes déjà
+        décrémentées par le lot ont retrouvé leur quantité).
+        """
+        articles = self.filter(id__in=ids)
+        existants = set(articles.values_list('id', flat=True))
+        if len(existants) != len(ids):
+            return ArticleIntrouvable(set(ids) - existants)
+        if actifs_seulement:
+            inactifs = list(articles.filter(is_active=False).values_list('sku', flat=True))
+            if inactifs:
+                return ArticleInactif(inactifs)
+        insuffisants = list(articles.filter(quantity__lt=-delta).values_list('sku', flat=True))
+        # Stock réapprovisionné entre l'UPDATE et cette lecture : tout le groupe est signalé
+        return StockInsuffisant(insuffisants or articles.values_list('sku', flat=True))
+
+
 class StockItem(models.Model):
     name = models.CharField("Nom", max_length=255)
     sku = models.CharField("Référence (SKU)", max_length=100, unique=True)
@@ -20,22 +142,47 @@ class StockItem(models.Model):
     created_at = models.DateTimeField("Créé le", default=timezone.now, editable=False)
     updated_at = models.DateTimeField("Mis à jour le", auto_now=True)
 
+    objects = StockItemManager()
+
     class Meta:
         ordering = ['name']
+        indexes = [
+            # Articles en rupture (tableau de bord)
+            models.Index(fields=['is_active', 'quantity']),
+        ]
         verbose_name = "Article"
         verbose_name_plural = "Articles"
 
+    CHAMPS_AGREGATS = ('location', 'quantity', 'unit_price', 'is_active')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Valeurs lues en base : les signaux en déduisent la variation des agrégats par emplacement
+        instance._agregat_initial = instance._get_agregat()
+        return instance
+
+    def _get_agregat(self):
+        # Lecture via __dict__ pour ne pas charger un champ différé
+        return tuple(self.__dict__.get(champ, models.DEFERRED) for champ in self.CHAMPS_AGREGATS)
+
+    def _recopier_quantite(self, quantite):
+        """Recopie une quantité déjà écrite en base (UPDATE avec F()) sans la compter deux fois"""
+        self.quantity = quantite
+        if hasattr(self, '_agregat_initial'):
+            self._agregat_initial = self._agregat_initial[:1] + (quantite,) + self._agregat_initial[2:]
+
     def __str__(self):
         return f"{self.name} ({self.sku})"
 
-    def adjust_quantity(self, delta):
+    def adjust_quantity(self, delta, refuser_negatif=False):
         """
-        Ajuste la quantité en mémoire et sauvegarde.
+        Ajuste la quantité en base (UPDATE avec F(), sans réécrire les autres champs).
         Usage : item.adjust_quantity(+10) ou item.adjust_quantity(-5)
-        Ne gère volontairement pas la logique métier complexe (réserves, validations).
+        Retourne la nouvelle quantité, recopiée sur l'instance.
         """
-        self.quantity += int(delta)
-        self.save(update_fields=['quantity'])
+        self._recopier_quantite(StockItem.objects.appliquer_deltas({self.pk: delta}, refuser_negatif)[self.pk])
+        return self.quantity
 
 
 class StockMovement(models.Model):
@@ -55,6 +202,10 @@ class StockMovement(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Mouvements d'un article depuis une date (quantité à une date passée)
+            models.Index(fields=['item', 'created_at']),
+        ]
         verbose_name = "Mouvement de stock"
         verbose_name_plural = "Mouvements de stock"
 
@@ -62,17 +213,170 @@ class StockMovement(models.Model):
         actor = self.performed_by.username if self.performed_by else "système"
         return f"{self.get_movement_type_display()} {self.quantity} x {self.item.sku} ({actor})"
 
+    @property
+    def delta(self):
+        """Variation de quantité de l'article : positive pour une entrée, négative pour une sortie"""
+        return self.quantity if self.movement_type == self.IN else -self.quantity
+
     def save(self, *args, **kwargs):
         """
-        Lors de la création d'un mouvement on met à jour la quantité de l'article.
+        Lors de la création d'un mouvement on met à jour la quantité de l'article
+        (UPDATE avec F(), dans la même transaction que le mouvement).
         ATTENTION : cette implémentation met à jour la quantité uniquement pour les nouveaux enregistrements.
         Si tu autorises l'édition des mouvements, il faudra gérer la correction (diff entre ancien et nouveau).
+        Pour refuser un stock négatif ou poster un lot : stock/mouvements.py.
         """
         is_new = self._state.adding
-        super().save(*args, **kwargs)
-        if is_new:
-            if self.movement_type == self.IN:
-                self.item.quantity += self.quantity
-            else:
-                self.item.quantity -= self.quantity
-            self.item.save()
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if is_new:
+                quantites = StockItem.objects.appliquer_deltas({self.item_id: self.delta})
+                # Recopie sur l'article déjà chargé, sans le relire
+                if self._meta.get_field('item').is_cached(self):
+                    self.item._recopier_quantite(quantites[self.item_id])
+                StockDailyMovement.objects.enregistrer([self])
+                jour = timezone.localdate(self.created_at)
+                if jour < timezone.localdate():
+                    # Mouvement antidaté : les instantanés à partir de sa date sont faux
+                    StockSnapshot.objects.invalider({self.item_id: jour})
+
+
+class StockSnapshotManager(models.Manager):
+    def invalider(self, jours_par_article):
+        """
+        Supprime les instantanés devenus faux après un mouvement antidaté :
+        {item_id: date du mouvement le plus ancien} -> instantanés de cette date et après.
+        """
+        if not jours_par_article:
+            return 0
+        condition = models.Q()
+        for item_id, jour in jours_par_article.items():
+            condition |= models.Q(item_id=item_id, date__gte=jour)
+        return self.filter(condition).delete()[0]
+
+
+class StockSnapshot(models.Model):
+    """Quantité d'un article à la fin d'une journée (mouvements créés avant minuit inclus)"""
+    item = models.ForeignKey(StockItem, on_delete=models.CASCADE, related_name='snapshots')
+    date = models.DateField("Date")
+    quantity = models.IntegerField("Quantité")
+    value = models.DecimalField("Valeur", max_digits=14, decimal_places=2, null=True, blank=True)
+    created_at = models.DateTimeField("Calculé le", default=timezone.now, editable=False)
+
+    objects = StockSnapshotManager()
+
+    class Meta:
+        ordering = ['-date', 'item']
+        constraints = [
+            models.UniqueConstraint(fields=['item', 'date'], name='stock_instantane_unique'),
+        ]
+        verbose_name = "Instantané de stock"
+        verbose_name_plural = "Instantanés de stock"
+
+    def __str__(self):
+        return f"{self.item.sku} au {self.date:%d/%m/%Y} : {self.quantity}"
+
+
+# =============================================================================
+# Agrégats du tableau de bord
+# =============================================================================
+class StockLocationSummaryManager(models.Manager):
+    CHAMPS = ('item_count', 'total_quantity', 'total_value', 'out_of_stock_count')
+
+    def appliquer(self, variations):
+        """
+        Applique des variations {(location, champ): delta}, un UPDATE par emplacement
+        (dans un ordre fixe : deux lots concurrents ne s'attendent pas mutuellement).
+        """
+        groupes = defaultdict(dict)
+        for (location, champ), delta in variations.items():
+            if delta:
+                groupes[location][champ] = delta
+        if not groupes:
+            return
+        maintenant = timezone.now()
+        with transaction.atomic():
+            self.bulk_create([self.model(location=location) for location in groupes], ignore_conflicts=True)
+            for location, deltas in sorted(groupes.items()):
+                self.filter(location=location).update(
+                    updated_at=maintenant, **{champ: F(champ) + delta for champ, delta in deltas.items()}
+                )
+        agregats_stock_modifies.send(sender=self.model)
+
+
+class StockLocationSummary(models.Model):
+    """
+    Totaux des articles actifs par emplacement, maintenus au fil des mouvements
+    et des modifications d'articles. Réparation : python manage.py reconstruire_agregats_stock
+    """
+    location = models.CharField("Emplacement", max_length=255, unique=True)
+    item_count = models.IntegerField("Articles", default=0)
+    total_quantity = models.IntegerField("Quantité totale", default=0)
+    total_value = models.DecimalField("Valeur totale", max_digits=16, decimal_places=2, default=0)
+    out_of_stock_count = models.IntegerField("Articles en rupture", default=0)
+    updated_at = models.DateTimeField("Mis à jour le", default=timezone.now)
+
+    objects = StockLocationSummaryManager()
+
+    class Meta:
+        ordering = ['location']
+        verbose_name = "Stock par emplacement"
+        verbose_name_plural = "Stock par emplacement"
+
+    def __str__(self):
+        return self.location or "Sans emplacement"
+
+
+class StockDailyMovementManager(models.Manager):
+    def enregistrer(self, mouvements):
+        """
+        Cumule des mouvements enregistrés dans les lignes (jour, article) :
+        un UPDATE par groupe d'articles de mêmes variations.
+        """
+        cumuls = defaultdict(lambda: [0, 0, 0])
+        for mouvement in mouvements:
+            cumul = cumuls[(timezone.localdate(mouvement.created_at), mouvement.item_id)]
+            cumul[0 if mouvement.movement_type == StockMovement.IN else 1] += mouvement.quantity
+            cumul[2] += 1
+        if not cumuls:
+            return
+        groupes = defaultdict(list)
+        for (jour, item_id), (entrees, sorties, nombre) in cumuls.items():
+            groupes[(jour, entrees, sorties, nombre)].append(item_id)
+        with transaction.atomic():
+            self.bulk_create(
+                [self.model(date=jour, item_id=item_id) for jour, item_id in cumuls],
+                batch_size=TAILLE_LOT, ignore_conflicts=True,
+            )
+            for (jour, entrees, sorties, nombre), item_ids in sorted(groupes.items()):
+                self.filter(date=jour, item_id__in=sorted(item_ids)).update(
+                    quantity_in=F('quantity_in') + entrees,
+                    quantity_out=F('quantity_out') + sorties,
+                    movement_count=F('movement_count') + nombre,
+                )
+        agregats_stock_modifies.send(sender=self.model)
+
+
+class StockDailyMovement(models.Model):
+    """
+    Entrées et sorties cumulées par jour et par article (articles les plus mouvementés).
+    Réparation : python manage.py reconstruire_agregats_stock
+    """
+    date = models.DateField("Date")
+    item = models.ForeignKey(StockItem, on_delete=models.CASCADE, related_name='daily_movements')
+    quantity_in = models.IntegerField("Entrées", default=0)
+    quantity_out = models.IntegerField("Sorties", default=0)
+    movement_count = models.IntegerField("Mouvements", default=0)
+
+    objects = StockDailyMovementManager()
+
+    class Meta:
+        ordering = ['-date', 'item']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'item'], name='stock_mouvements_jour_unique'),
+        ]
+        verbose_name = "Mouvements du jour"
+        verbose_name_plural = "Mouvements par jour"
+
+    def __str__(self):
+        return f"{self.item.sku} le {self.date:%d/%m/%Y} : +{self.quantity_in} / -{self.quantity_out}"
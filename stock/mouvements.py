@@ -0,0 +1,65 @@
+"""
+Service de comptabilisation des mouvements de stock.
+
+Les variations de quantité sont additionnées par article puis appliquées
+par UPDATE ... SET quantity = quantity + n (StockItemManager.appliquer_deltas),
+dans la même transaction que l'insertion des mouvements : pas de mise à
+jour perdue entre deux mouvements concurrents sur le même SKU, et aucune
+réécriture des autres colonnes de l'article.
+
+Un mouvement antidaté (import d'un export de scanner) invalide les
+instantanés de stock de son article à partir de sa date (stock/historique.py).
+Les agrégats du tableau de bord (par emplacement, par jour) sont mis à jour
+dans la même transaction.
+"""
+from collections import Counter
+from django.db import transaction
+from django.utils import timezone
+from .models import (
+    StockItem, StockMovement, StockSnapshot, StockDailyMovement,
+    StockInsuffisant, ArticleIntrouvable, ArticleInactif,  # noqa: F401 (réexportées)
+)
+
+TAILLE_LOT = 500
+
+
+def poster_mouvements(mouvements, refuser_negatif=False, actifs_seulement=False):
+    """
+    Enregistre un lot de StockMovement non sauvegardés et met à jour les stocks.
+    Les variations d'un même article sont cumulées : un UPDATE par article
+    (ou par groupe d'articles de même variation), quel que soit le nombre de mouvements.
+    refuser_negatif : lève StockInsuffisant et n'enregistre rien si un stock passerait sous zéro.
+    actifs_seulement : lève ArticleInactif et n'enregistre rien si un article est désactivé.
+    Retourne {item_id: nouvelle quantité}.
+    """
+    mouvements = list(mouvements)
+    for mouvement in mouvements:
+        if mouvement.quantity is None or mouvement.quantity <= 0:
+            raise ValueError(f"Quantité invalide pour un mouvement de stock : {mouvement.quantity}")
+        if mouvement.movement_type not in (StockMovement.IN, StockMovement.OUT):
+            raise ValueError(f"Type de mouvement inconnu : {mouvement.movement_type}")
+
+    deltas = Counter()
+    antidates = {}
+    aujourd_hui = timezone.localdate()
+    for mouvement in mouvements:
+        deltas[mouvement.item_id] += mouvement.delta
+        jour = timezone.localdate(mouvement.created_at)
+        if jour < antidates.get(mouvement.item_id, aujourd_hui):
+            antidates[mouvement.item_id] = jour
+    with transaction.atomic():
+        quantites = StockItem.objects.appliquer_deltas(deltas, refuser_negatif, actifs_seulement)
+        # bulk_create ne passe pas par StockMovement.save() : les stocks ne sont pas modifiés deux fois
+        StockMovement.objects.bulk_create(mouvements, batch_size=TAILLE_LOT)
+        StockSnapshot.objects.invalider(antidates)
+        StockDailyMovement.objects.enregistrer(mouvements)
+    return quantites
+
+
+def poster_mouvement(item, quantity, movement_type, performed_by=None, note='', refuser_negatif=False):
+    """Enregistre un mouvement sur `item` ; retourne la nouvelle quantité (recopiée sur item)"""
+    mouvement = StockMovement(
+        item=item, quantity=quantity, movement_type=movement_type, performed_by=performed_by, note=note,
+    )
+    item._recopier_quantite(poster_mouvements([mouvement], refuser_negatif)[item.pk])
+    return item.quantity
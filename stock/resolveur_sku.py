@@ -0,0 +1,143 @@
+"""
+Résolution SKU -> article en mémoire pour les scanners.
+
+Chaque scan porte un SKU : plutôt qu'un StockItem.objects.get(sku=...) par
+scan, l'index de tous les articles (id, nom, actif, prix) est chargé une fois
+par processus, à la première lecture, puis tenu à jour par les signaux
+d'enregistrement et de suppression des articles (stock/signals.py).
+
+Les autres processus apprennent qu'un article a changé par un numéro de
+version dans le cache, consulté au plus toutes les VERIFICATION secondes :
+l'index est alors rechargé. Cela suppose un cache partagé entre processus ;
+avec un cache local, l'index d'un autre processus peut rester périmé. Il ne
+sert donc qu'à trouver l'article : l'enregistrement du mouvement revérifie
+l'article actif dans son UPDATE (poster_mouvements(actifs_seulement=True)).
+Un SKU absent de l'index, ou vu inactif, est relu en base (relire()).
+En régime établi, une résolution ne fait aucune requête.
+"""
+import threading
+import time
+from collections import namedtuple
+from django.core.cache import cache
+from django.db import transaction
+from .models import StockItem
+
+ArticleScanne = namedtuple('ArticleScanne', ['id', 'sku', 'name', 'is_active', 'unit_price'])
+
+CLE_VERSION = 'stock:sku:version'
+VERIFICATION = 5  # secondes entre deux lectures de la version partagée
+
+_verrou = threading.Lock()
+_par_sku = None
+_sku_par_id = {}
+_version = None
+_verifie_le = 0.0
+
+
+def _lignes(articles):
+    return articles.values_list('id', 'sku', 'name', 'is_active', 'unit_price')
+
+
+def _charger():
+    """(Re)charge l'index complet ; appelé sous le verrou"""
+    global _par_sku, _sku_par_id, _version, _verifie_le
+    cache.add(CLE_VERSION, 0, None)
+    _version = cache.get(CLE_VERSION)
+    par_sku = {}
+    for ligne in _lignes(StockItem.objects.all()).iterator(chunk_size=2000):
+        par_sku[ligne[1]] = ArticleScanne(*ligne)
+    _par_sku = par_sku
+    _sku_par_id = {article.id: sku for sku, article in par_sku.items()}
+    _verifie_le = time.monotonic()
+
+
+def _index():
+    """Index à jour : chargé au premier appel, rechargé si un autre processus a modifié un article"""
+    global _verifie_le
+    with _verrou:
+        if _par_sku is None:
+            _charger()
+        elif time.monotonic() - _verifie_le > VERIFICATION:
+            _verifie_le = time.monotonic()
+            if cache.get(CLE_VERSION) != _version:
+                _charger()
+        return _par_sku
+
+
+def resoudre(sku):
+    """ArticleScanne du SKU, ou None s'il n'existe pas"""
+    sku = (sku or '').strip()
+    article = _index().get(sku)
+    if article is None and sku:
+        # Article peut-être créé par un autre processus depuis le chargement
+        article = relire(sku)
+    return article
+
+
+def relire(sku):
+    """Relit un article en base et met l'index à jour ; None s'il n'existe pas"""
+    ligne = _lignes(StockItem.objects.filter(sku=sku)).first()
+    if ligne is None:
+        return None
+    article = ArticleScanne(*ligne)
+    _enregistrer(article)
+    return article
+
+
+def _enregistrer(article):
+    with _verrou:
+        if _par_sku is None:
+            return
+        ancien_sku = _sku_par_id.get(article.id)
+        if ancien_sku is not None and ancien_sku != article.sku:
+            _par_sku.pop(ancien_sku, None)
+        _par_sku[article.sku] = article
+        _sku_par_id[article.id] = article.sku
+
+
+def _retirer(item_id):
+    with _verrou:
+        if _par_sku is None:
+            return
+        sku = _sku_par_id.pop(item_id, None)
+        if sku is not None:
+            _par_sku.pop(sku, None)
+
+
+def _publier_version():
+    """Signale la modification aux autres processus ; l'index local est déjà à jour"""
+    global _version
+    cache.add(CLE_VERSION, 0, None)
+    try:
+        version = cache.incr(CLE_VERSION)
+    except ValueError:
+        return
+    with _verrou:
+        # Une autre modification publiée entre-temps n'est pas connue ici : rechargement au prochain contrôle
+        if _version is not None and version == _version + 1:
+            _version = version
+
+
+def article_modifie(item):
+    """Appelé par les signaux : met l'index à jour après le commit"""
+    article = ArticleScanne(item.pk, item.sku, item.name, item.is_active, item.unit_price)
+
+    def appliquer():
+        _enregistrer(article)
+        _publier_version()
+    transaction.on_commit(appliquer)
+
+
+def article_supprime(item_id):
+    def appliquer():
+        _retirer(item_id)
+        _publier_version()
+    transaction.on_commit(appliquer)
+
+
+def vider():
+    """Oublie l'index (rechargé à la prochaine résolution)"""
+    global _par_sku, _sku_par_id
+    with _verrou:
+        _par_sku = None
+        _sku_par_id = {}
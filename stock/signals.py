@@ -0,0 +1,56 @@
+from collections import Counter
+from django.db.models import DEFERRED
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import StockItem, StockLocationSummary, agregats_stock_modifies, contribution_article
+from .resolveur_sku import article_modifie, article_supprime
+from .tableau_de_bord import invalider_dashboard
+
+
+# =============================================================================
+# Agrégats par emplacement : création, modification et suppression d'articles
+# (les variations de quantité sont comptées par StockItemManager.appliquer_deltas)
+# =============================================================================
+@receiver(post_save, sender=StockItem)
+def agregats_article_enregistre(sender, instance, created, **kwargs):
+    actuel = tuple(getattr(instance, champ) for champ in StockItem.CHAMPS_AGREGATS)
+    variations = Counter(contribution_article(*actuel))
+    if not created:
+        # Un champ différé n'a pas été enregistré : sa valeur en base est inchangée
+        initial = getattr(instance, '_agregat_initial', actuel)
+        initial = tuple(valeur if ancienne is DEFERRED else ancienne for ancienne, valeur in zip(initial, actuel))
+        variations.subtract(contribution_article(*initial))
+    StockLocationSummary.objects.appliquer(variations)
+    instance._agregat_initial = actuel
+
+
+@receiver(post_delete, sender=StockItem)
+def agregats_article_supprime(sender, instance, **kwargs):
+    actuel = instance._get_agregat()
+    initial = getattr(instance, '_agregat_initial', actuel)
+    if DEFERRED in initial:
+        return
+    variations = Counter()
+    variations.subtract(contribution_article(*initial))
+    StockLocationSummary.objects.appliquer(variations)
+
+
+# =============================================================================
+# Index SKU en mémoire des scanners
+# =============================================================================
+@receiver(post_save, sender=StockItem)
+def resolveur_article_enregistre(sender, instance, **kwargs):
+    article_modifie(instance)
+
+
+@receiver(post_delete, sender=StockItem)
+def resolveur_article_supprime(sender, instance, **kwargs):
+    article_supprime(instance.pk)
+
+
+# =============================================================================
+# Cache du tableau de bord
+# =============================================================================
+@receiver(agregats_stock_modifies)
+def invalider_cache_dashboard(sender, **kwargs):
+    invalider_dashboard()
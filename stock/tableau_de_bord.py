@@ -0,0 +1,130 @@
+"""
+Tableau de bord stock : valeur par emplacement, articles les plus mouvementés
+sur 30 jours, articles en rupture.
+
+Les chiffres sont lus dans les agrégats (StockLocationSummary, une ligne par
+emplacement ; StockDailyMovement, une ligne par jour et par article mouvementé),
+tenus à jour dans la transaction de chaque mouvement : aucune agrégation sur
+la table des articles ni sur l'historique des mouvements. Le résultat est mis
+en cache et invalidé à chaque mise à jour des agrégats (stock/signals.py).
+Réparation : python manage.py reconstruire_agregats_stock
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, Q, Sum, When
+from django.utils import timezone
+from .models import StockDailyMovement, StockItem, StockLocationSummary, StockMovement, TAILLE_LOT
+
+JOURS_MOUVEMENTS = 30
+NOMBRE_ARTICLES = 10
+NOMBRE_RUPTURES = 20
+
+
+def get_duree_cache():
+    return getattr(settings, 'STOCK_DASHBOARD_CACHE_TIMEOUT', 300)
+
+
+def cle_dashboard():
+    # Clé datée : la fenêtre des 30 derniers jours change à minuit sans invalidation
+    return f"stock:dashboard:{timezone.localdate():%Y-%m-%d}"
+
+
+def calculer_dashboard():
+    """Données du tableau de bord, sérialisables en JSON"""
+    emplacements = [
+        {
+            'location': resume.location,
+            'item_count': resume.item_count,
+            'total_quantity': resume.total_quantity,
+            'total_value': str(resume.total_value),
+            'out_of_stock_count': resume.out_of_stock_count,
+        }
+        for resume in StockLocationSummary.objects.filter(item_count__gt=0)
+    ]
+
+    depuis = timezone.localdate() - timedelta(days=JOURS_MOUVEMENTS - 1)
+    mouvements = StockDailyMovement.objects.filter(date__gte=depuis).values(
+        'item_id', 'item__sku', 'item__name'
+    ).annotate(
+        entrees=Sum('quantity_in'), sorties=Sum('quantity_out'), nombre=Sum('movement_count'),
+        total=Sum(F('quantity_in') + F('quantity_out')),
+    ).order_by('-total', 'item__sku')[:NOMBRE_ARTICLES]
+
+    # Index (is_active, quantity) : seules les lignes en rupture sont lues
+    ruptures = StockItem.objects.filter(is_active=True, quantity__lte=0).order_by('quantity', 'sku').values(
+        'id', 'sku', 'name', 'location', 'quantity'
+    )[:NOMBRE_RUPTURES]
+
+    return {
+        'total_value': str(sum(StockLocationSummary.objects.values_list('total_value', flat=True))),
+        'out_of_stock_count': sum(e['out_of_stock_count'] for e in emplacements),
+        'locations': emplacements,
+        'top_movers': [
+            {
+                'id': ligne['item_id'], 'sku': ligne['item__sku'], 'name': ligne['item__name'],
+                'quantity_in': ligne['entrees'], 'quantity_out': ligne['sorties'], 'movements': ligne['nombre'],
+            }
+            for ligne in mouvements
+        ],
+        'out_of_stock': list(ruptures),
+        'days': JOURS_MOUVEMENTS,
+        'generated_at': timezone.now().isoformat(),
+    }
+
+
+def donnees_dashboard():
+    """Données du tableau de bord depuis le cache, recalculées après invalidation ou expiration"""
+    cle = cle_dashboard()
+    donnees = cache.get(cle)
+    if donnees is None:
+        donnees = calculer_dashboard()
+        cache.set(cle, donnees, get_duree_cache())
+    return donnees
+
+
+def invalider_dashboard():
+    """Supprime l'entrée du cache, après le commit de la transaction en cours"""
+    cle = cle_dashboard()
+    transaction.on_commit(lambda: cache.delete(cle))
+
+
+def reconstruire_agregats():
+    """Recalcule les agrégats depuis les articles et les mouvements ; retourne (emplacements, lignes journalières)"""
+    emplacements = StockItem.objects.filter(is_active=True).values('location').annotate(
+        nombre=Count('id'),
+        quantite=Sum('quantity'),
+        valeur=Sum(
+            F('quantity') * F('unit_price'), filter=Q(unit_price__isnull=False),
+            output_field=DecimalField(max_digits=16, decimal_places=2),
+        ),
+        ruptures=Count('id', filter=Q(quantity__lte=0)),
+    ).order_by()
+    journees = StockMovement.objects.values('created_at__date', 'item_id').annotate(
+        entrees=Sum(Case(When(movement_type=StockMovement.IN, then=F('quantity')), default=0)),
+        sorties=Sum(Case(When(movement_type=StockMovement.OUT, then=F('quantity')), default=0)),
+        nombre=Count('id'),
+    ).order_by()
+    with transaction.atomic():
+        StockLocationSummary.objects.all().delete()
+        StockDailyMovement.objects.all().delete()
+        resumes = StockLocationSummary.objects.bulk_create([
+            StockLocationSummary(
+                location=ligne['location'], item_count=ligne['nombre'], total_quantity=ligne['quantite'] or 0,
+                total_value=ligne['valeur'] or 0, out_of_stock_count=ligne['ruptures'],
+            )
+            for ligne in emplacements
+        ], batch_size=TAILLE_LOT)
+        lignes = StockDailyMovement.objects.bulk_create(
+            (
+                StockDailyMovement(
+                    date=ligne['created_at__date'], item_id=ligne['item_id'], quantity_in=ligne['entrees'],
+                    quantity_out=ligne['sorties'], movement_count=ligne['nombre'],
+                )
+                for ligne in journees.iterator()
+            ),
+            batch_size=TAILLE_LOT,
+        )
+        invalider_dashboard()
+    return len(resumes), len(lignes)
@@ -0,0 +1,135 @@
+import io
+import json
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from accounts.models import CustomUser, Department
+
+from .import_mouvements import importer_mouvements, lire_csv
+from .models import ArticleInactif, ArticleIntrouvable, StockInsuffisant, StockItem, StockMovement
+from .mouvements import poster_mouvements
+
+
+# =============================================================================
+# Variations de quantité (UPDATE gardés)
+# =============================================================================
+class AppliquerDeltasTests(TestCase):
+    def setUp(self):
+        self.a1 = StockItem.objects.create(name="Article 1", sku='A1', quantity=8)
+        self.a2 = StockItem.objects.create(name="Article 2", sku='A2', quantity=2)
+
+    def quantites(self):
+        return dict(StockItem.objects.values_list('sku', 'quantity'))
+
+    def test_seul_l_article_en_defaut_est_signale_et_rien_n_est_applique(self):
+        with self.assertRaises(StockInsuffisant) as erreur:
+            StockItem.objects.appliquer_deltas({self.a1.pk: -5, self.a2.pk: -5}, refuser_negatif=True)
+        self.assertEqual(erreur.exception.skus, ['A2'])
+        self.assertEqual(self.quantites(), {'A1': 8, 'A2': 2})
+
+    def test_controle_du_stock_dans_le_where_de_l_update(self):
+        # Un contrôle par SELECT préalable laisserait deux lots concurrents décrémenter tous les deux
+        with CaptureQueriesContext(connection) as requetes:
+            StockItem.objects.appliquer_deltas({self.a1.pk: -5}, refuser_negatif=True)
+        updates = [q['sql'] for q in requetes.captured_queries if q['sql'].startswith('UPDATE "stock_stockitem"')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"quantity" >= 5', updates[0])
+        self.assertEqual(self.quantites()['A1'], 3)
+
+    def test_stock_negatif_accepte_sans_refuser_negatif(self):
+        StockItem.objects.appliquer_deltas({self.a2.pk: -5})
+        self.assertEqual(self.quantites()['A2'], -3)
+
+    def test_article_supprime_ou_inactif(self):
+        with self.assertRaises(ArticleIntrouvable):
+            StockItem.objects.appliquer_deltas({self.a1.pk: 1, 999999: 1})
+        StockItem.objects.filter(pk=self.a2.pk).update(is_active=False)
+        with self.assertRaises(ArticleInactif) as erreur:
+            StockItem.objects.appliquer_deltas({self.a2.pk: 1}, actifs_seulement=True)
+        self.assertEqual(erreur.exception.skus, ['A2'])
+        self.assertEqual(self.quantites(), {'A1': 8, 'A2': 2})
+
+    def test_lot_de_mouvements_annule_en_entier(self):
+        mouvements = [
+            StockMovement(item=self.a1, quantity=5, movement_type=StockMovement.OUT),
+            StockMovement(item=self.a2, quantity=5, movement_type=StockMovement.OUT),
+        ]
+        with self.assertRaises(StockInsuffisant):
+            poster_mouvements(mouvements, refuser_negatif=True)
+        self.assertFalse(StockMovement.objects.exists())
+        self.assertEqual(self.quantites(), {'A1': 8, 'A2': 2})
+
+
+# =============================================================================
+# Import CSV des mouvements
+# =============================================================================
+class ImportMouvementsTests(TestCase):
+    def setUp(self):
+        self.a1 = StockItem.objects.create(name="Article 1", sku='A1', quantity=10)
+        self.a2 = StockItem.objects.create(name="Article 2", sku='A2', quantity=10)
+
+    def importer(self, contenu, **options):
+        return importer_mouvements(lire_csv(io.BytesIO(contenu)), **options)
+
+    def test_colonnes_en_trop_signalees_sans_interrompre_l_import(self):
+        rapport = self.importer(b"sku,quantity\nA1,5\nA2,3,extra\nA2,2\n")
+        self.assertEqual(rapport['importes'], 2)
+        self.assertEqual(len(rapport['erreurs']), 1)
+        self.assertEqual(rapport['erreurs'][0]['ligne'], 3)
+        self.assertIn("Colonnes en trop", rapport['erreurs'][0]['erreur'])
+        self.a1.refresh_from_db()
+        self.a2.refresh_from_db()
+        self.assertEqual((self.a1.quantity, self.a2.quantity), (15, 12))
+
+    def test_separateurs_finaux_vides_toleres(self):
+        rapport = self.importer(b"sku,quantity\nA1,5,,\n")
+        self.assertEqual((rapport['importes'], rapport['erreurs']), (1, []))
+
+    def test_lignes_invalides_et_sku_inconnu(self):
+        rapport = self.importer(b"sku,quantity\nA1,abc\nZZ,1\n,4\nA1,0\n")
+        self.assertEqual(rapport['importes'], 0)
+        self.assertEqual([erreur['ligne'] for erreur in rapport['erreurs']], [2, 3, 4, 5])
+
+    def test_sortie_refusee_si_stock_insuffisant_sans_rejeter_le_lot(self):
+        self.a2.quantity = 2
+        self.a2.save()
+        rapport = self.importer(b"sku,quantity\nA1,-5\nA2,-5\n", refuser_negatif=True)
+        self.assertEqual(rapport['importes'], 1)
+        self.assertEqual([erreur['sku'] for erreur in rapport['erreurs']], ['A2'])
+        self.a1.refresh_from_db()
+        self.a2.refresh_from_db()
+        self.assertEqual((self.a1.quantity, self.a2.quantity), (5, 2))
+
+
+# =============================================================================
+# Scan d'un mouvement (AJAX)
+# =============================================================================
+class ScanMouvementTests(TestCase):
+    def setUp(self):
+        stock = Department.objects.create(name="Stock", code='STOCK')
+        self.magasinier = CustomUser.objects.create_user('magasinier', password='x', department=stock)
+        self.article = StockItem.objects.create(name="Article 1", sku='A1', quantity=10)
+        self.client.force_login(self.magasinier)
+
+    def scanner(self, **donnees):
+        donnees = {'sku': 'A1', 'movement_type': StockMovement.IN, **donnees}
+        return self.client.post(reverse('stock:scan'), json.dumps(donnees), content_type='application/json')
+
+    def test_quantite_absente_vaut_un(self):
+        reponse = self.scanner()
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual(reponse.json()['quantity'], 11)
+        self.assertEqual(self.scanner(quantity='3').json()['quantity'], 14)
+
+    def test_quantite_invalide_refusee(self):
+        for quantite in (0, -2, None, '', 'abc', 2.5, True, [3]):
+            with self.subTest(quantite=quantite):
+                reponse = self.scanner(quantity=quantite)
+                self.assertEqual(reponse.status_code, 400)
+                self.assertFalse(reponse.json()['success'])
+        self.assertFalse(StockMovement.objects.exists())
+        self.article.refresh_from_db()
+        self.assertEqual(self.article.quantity, 10)
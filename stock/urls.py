@@ -3,4 +3,8 @@ from . import views
 
 urlpatterns = [
     path('dashboard/', views.dashboard, name='dashboard'),
+    path('dashboard/donnees/', views.dashboard_data, name='dashboard_data'),
+    path('mouvements/import/', views.import_movements, name='movement_import'),
+    path('etat/', views.stock_as_of, name='as_of'),
+    path('scan/', views.scan_movement, name='scan'),
 ]
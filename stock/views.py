@@ -1,5 +1,22 @@
+import json
+import logging
+from datetime import date
+from django.contrib import messages
+from django.http import JsonResponse
 from django.shortcuts import render
+from django.utils import timezone
+from django.views.decorators.csrf import ensure_csrf_cookie
+from django.views.decorators.http import require_http_methods
 from django.contrib.auth.decorators import login_required, user_passes_test
+from .historique import valorisation
+from .tableau_de_bord import donnees_dashboard
+from .import_mouvements import importer_mouvements, lire_csv
+from .models import StockMovement, StockInsuffisant, ArticleInactif, ArticleIntrouvable
+from .mouvements import poster_mouvements
+from .resolveur_sku import relire, resoudre
+
+logger = logging.getLogger(__name__)
+
 
 def is_stock(user):
     return user.department and user.department.code == 'STOCK'
@@ -9,8 +26,120 @@ from accounts.decorators import department_required
 
 
 
+@ensure_csrf_cookie
 @login_required
 @department_required("STOCK")
 @user_passes_test(is_stock)
 def dashboard(request):
-    return render(request, 'stock/dashboard.html')
+    # Cookie CSRF posé pour les appels AJAX des scanners (scan_movement)
+    return render(request, 'stock/dashboard.html', {'donnees': donnees_dashboard()})
+
+
+@require_http_methods(["GET"])
+@login_required
+@department_required("STOCK")
+@user_passes_test(is_stock)
+def dashboard_data(request):
+    """Données du tableau de bord stock (agrégats en cache)"""
+    return JsonResponse(donnees_dashboard())
+
+
+@login_required
+@department_required("STOCK")
+@user_passes_test(is_stock)
+def import_movements(request):
+    """Import en masse de mouvements de stock (CSV des scanners) avec rapport d'erreurs par ligne"""
+    rapport = None
+    if request.method == 'POST':
+        fichier = request.FILES.get('fichier')
+        type_defaut = request.POST.get('type_defaut')
+        if not fichier:
+            messages.error(request, 'Veuillez choisir un fichier CSV.')
+        else:
+            try:
+                rapport = importer_mouvements(
+                    lire_csv(fichier),
+                    performed_by=request.user,
+                    type_defaut=type_defaut if type_defaut in (StockMovement.IN, StockMovement.OUT) else None,
+                    refuser_negatif=bool(request.POST.get('refuser_negatif')),
+                )
+            except ValueError as e:
+                messages.error(request, f'Lecture du fichier impossible : {e}')
+            else:
+                messages.success(request, f"{rapport['importes']} mouvement(s) importé(s), {len(rapport['erreurs'])} ligne(s) en erreur.")
+    return render(request, 'stock/movement_import.html', {
+        'rapport': rapport,
+        'types': StockMovement.MOVEMENT_CHOICES,
+    })
+
+
+@require_http_methods(["GET"])
+@login_required
+@department_required("STOCK")
+@user_passes_test(is_stock)
+def stock_as_of(request):
+    """Quantités et valeur du stock en fin de journée (?date=AAAA-MM-JJ, par défaut aujourd'hui)"""
+    try:
+        jour = date.fromisoformat(request.GET.get('date') or timezone.localdate().isoformat())
+    except ValueError:
+        return JsonResponse({'error': "Paramètre attendu : date=AAAA-MM-JJ"}, status=400)
+    return JsonResponse(valorisation(jour))
+
+
+@require_http_methods(["POST"])
+@login_required
+@department_required("STOCK")
+@user_passes_test(is_stock)
+def scan_movement(request):
+    """
+    Enregistre le mouvement d'un scan via AJAX (jeton CSRF dans l'en-tête X-CSRFToken) :
+    {sku, movement_type: IN|OUT, quantity (1 par défaut), note} -> nouvelle quantité de l'article.
+    Le SKU est résolu en mémoire (stock/resolveur_sku.py), sans requête.
+    """
+    try:
+        data = json.loads(request.body or '{}')
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Corps JSON invalide'}, status=400)
+    movement_type = data.get('movement_type')
+    if movement_type not in (StockMovement.IN, StockMovement.OUT):
+        return JsonResponse({'success': False, 'error': 'Type attendu : IN ou OUT'})
+    # 1 seulement si la clé est absente : 0, null, 2.5 ou "abc" sont refusés, pas remplacés par 1
+    quantity = data.get('quantity', 1)
+    if isinstance(quantity, str):
+        try:
+            quantity = int(quantity.strip())
+        except ValueError:
+            pass
+    if isinstance(quantity, bool) or not isinstance(quantity, int) or quantity <= 0:
+        return JsonResponse({'success': False, 'error': 'La quantité doit être un entier positif'}, status=400)
+
+    article = resoudre(data.get('sku'))
+    if article is not None and not article.is_active:
+        # L'index peut être périmé (article réactivé dans un autre processus) : relecture
+        article = relire(article.sku)
+    if article is None:
+        return JsonResponse({'success': False, 'error': f"SKU inconnu : {data.get('sku') or '(vide)'}"})
+    if not article.is_active:
+        return JsonResponse({'success': False, 'error': f"Article inactif : {article.sku}"})
+
+    try:
+        # actifs_seulement : l'UPDATE revérifie l'article actif, l'index pouvant être périmé
+        quantites = poster_mouvements([StockMovement(
+            item_id=article.id, quantity=quantity, movement_type=movement_type,
+            performed_by=request.user, note=str(data.get('note') or '')[:255],
+        )], refuser_negatif=True, actifs_seulement=True)
+    except StockInsuffisant:
+        return JsonResponse({'success': False, 'error': 'Stock insuffisant pour cette sortie'})
+    except ArticleInactif:
+        relire(article.sku)
+        return JsonResponse({'success': False, 'error': f"Article inactif : {article.sku}"})
+    except ArticleIntrouvable:
+        return JsonResponse({'success': False, 'error': f"SKU inconnu : {article.sku}"})
+    except Exception:
+        logger.exception("Échec de l'enregistrement du scan %s", article.sku)
+        return JsonResponse({'success': False, 'error': "Erreur lors de l'enregistrement du mouvement"}, status=500)
+    return JsonResponse({
+        'success': True,
+        'item': {'id': article.id, 'sku': article.sku, 'name': article.name},
+        'quantity': quantites[article.id],
+    })